@@ -2,6 +2,7 @@ from __future__ import absolute_import
 
 import re
 import logging
+from django.conf import settings
 from django.db import IntegrityError, transaction
 from six import BytesIO
 from rest_framework.response import Response
@@ -193,4 +194,8 @@ class ProjectReleaseFilesEndpoint(ProjectEndpoint):
             file.delete()
             return Response({'detail': ERR_FILE_EXISTS}, status=409)
 
+        if settings.SENTRY_SOURCEMAP_INDEX and full_name.endswith('.map'):
+            from sentry.tasks.assemble import build_sourcemap_index
+            build_sourcemap_index.delay(file_id=file.id)
+
         return Response(serialize(releasefile, request.user), status=201)
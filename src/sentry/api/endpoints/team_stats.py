@@ -1,7 +1,6 @@
 from __future__ import absolute_import
 
 from rest_framework.response import Response
-from six.moves import range
 
 from sentry import tsdb
 from sentry.api.base import DocSection, EnvironmentMixin, StatsMixin
@@ -67,17 +66,10 @@ class TeamStatsEndpoint(TeamEndpoint, EnvironmentMixin, StatsMixin):
         if not projects:
             return Response([])
 
-        data = list(
-            tsdb.get_range(
-                model=tsdb.models.project,
-                keys=[p.id for p in projects],
-                **self._parse_args(request, environment_id)
-            ).values()
-        )
-
-        summarized = []
-        for n in range(len(data[0])):
-            total = sum(d[n][1] for d in data)
-            summarized.append((data[0][n][0], total))
+        summarized = tsdb.get_range_series(
+            model=tsdb.models.project,
+            keys=[p.id for p in projects],
+            **self._parse_args(request, environment_id)
+        ).sum()
 
         return Response(summarized)
@@ -10,7 +10,7 @@ from django.core.urlresolvers import reverse
 from django.db.models import Q
 from django.utils import timezone
 
-from sentry import tagstore, tsdb
+from sentry import buffer, tagstore, tsdb
 from sentry.api.serializers import Serializer, register, serialize
 from sentry.api.serializers.models.actor import ActorSerializer
 from sentry.api.fields.actor import Actor
@@ -22,6 +22,7 @@ from sentry.models import (
 )
 from sentry.tagstore.snuba.backend import SnubaTagStorage
 from sentry.tsdb.snuba import SnubaTSDB
+from sentry.utils import snuba
 from sentry.utils.db import attach_foreignkey
 from sentry.utils.http import absolute_uri
 from sentry.utils.safe import safe_execute
@@ -42,6 +43,16 @@ disabled = object()
 snuba_tsdb = SnubaTSDB(**settings.SENTRY_TSDB_OPTIONS)
 
 
+def get_pending_times_seen(item_list):
+    """
+    Returns a mapping of group ID to the ``times_seen`` increments which are
+    still held by the buffer (e.g. in counter shards), so that the counts
+    returned include events that have not been flushed to the group yet.
+    """
+    counts = buffer.get_pending_counts(Group, 'times_seen', [{'id': item.id} for item in item_list])
+    return dict(zip([item.id for item in item_list], counts))
+
+
 class GroupSerializerBase(Serializer):
     def _get_seen_stats(self, item_list, user):
         """
@@ -429,10 +440,11 @@ class GroupSerializer(GroupSerializerBase):
                     last_seen[item_id] = value.last_seen
                     times_seen[item_id] = value.times_seen
             else:
+                pending_counts = get_pending_times_seen(item_list)
                 for item in item_list:
                     first_seen[item.id] = item.first_seen
                     last_seen[item.id] = item.last_seen
-                    times_seen[item.id] = item.times_seen
+                    times_seen[item.id] = item.times_seen + pending_counts[item.id]
 
         attrs = {}
         for item in item_list:
@@ -455,20 +467,20 @@ class GroupStatsMixin(object):
     def query_tsdb(self, group_ids, query_params):
         raise NotImplementedError
 
+    def get_stats_query_params(self):
+        # we need to compute stats at 1d (1h resolution), and 14d
+        segments, interval = self.STATS_PERIOD_CHOICES[self.stats_period]
+        now = timezone.now()
+        return {
+            'start': now - ((segments - 1) * interval),
+            'end': now,
+            'rollup': int(interval.total_seconds()),
+        }
+
     def get_stats(self, item_list, user):
         if self.stats_period:
-            # we need to compute stats at 1d (1h resolution), and 14d
             group_ids = [g.id for g in item_list]
-
-            segments, interval = self.STATS_PERIOD_CHOICES[self.stats_period]
-            now = timezone.now()
-            query_params = {
-                'start': now - ((segments - 1) * interval),
-                'end': now,
-                'rollup': int(interval.total_seconds()),
-            }
-
-            return self.query_tsdb(group_ids, query_params)
+            return self.query_tsdb(group_ids, self.get_stats_query_params())
 
 
 class StreamGroupSerializer(GroupSerializer, GroupStatsMixin):
@@ -551,32 +563,55 @@ class GroupSerializerSnuba(GroupSerializerBase):
     def __init__(self, environment_ids=None):
         self.environment_ids = environment_ids
 
-    def _get_seen_stats(self, item_list, user):
+    def get_snuba_queries(self, item_list):
+        """
+        Returns a mapping of name to ``(SnubaQueryParams, callback)`` for the
+        Snuba queries needed to serialize ``item_list``. All of them are sent
+        at once, rather than one after another.
+        """
         tagstore = SnubaTagStorage()
         project_ids = list(set([item.project_id for item in item_list]))
         group_ids = [item.id for item in item_list]
-        user_counts = tagstore.get_groups_user_counts(
-            project_ids,
-            group_ids,
-            environment_ids=self.environment_ids,
-        )
+
+        queries = {
+            'user_counts': tagstore.get_groups_user_counts_query(
+                project_ids,
+                group_ids,
+                environment_ids=self.environment_ids,
+            ),
+        }
+        if self.environment_ids is not None:
+            queries['seen_data'] = tagstore.get_group_seen_values_for_environments_query(
+                project_ids,
+                group_ids,
+                self.environment_ids,
+            )
+        return queries
+
+    def run_snuba_queries(self, queries):
+        names = [name for name, (params, _) in six.iteritems(queries) if params is not None]
+        results = dict(zip(names, snuba.bulk_query([queries[name][0] for name in names])))
+        return {
+            name: callback(results.get(name, {}))
+            for name, (_, callback) in six.iteritems(queries)
+        }
+
+    def _get_seen_stats(self, item_list, user):
+        results = self.run_snuba_queries(self.get_snuba_queries(item_list))
+        user_counts = results['user_counts']
 
         first_seen = {}
         last_seen = {}
         times_seen = {}
         if self.environment_ids is None:
             # use issue fields
+            pending_counts = get_pending_times_seen(item_list)
             for item in item_list:
                 first_seen[item.id] = item.first_seen
                 last_seen[item.id] = item.last_seen
-                times_seen[item.id] = item.times_seen
+                times_seen[item.id] = item.times_seen + pending_counts[item.id]
         else:
-            seen_data = tagstore.get_group_seen_values_for_environments(
-                project_ids,
-                group_ids,
-                self.environment_ids,
-            )
-            for item_id, value in seen_data.items():
+            for item_id, value in results['seen_data'].items():
                 first_seen[item_id] = value['first_seen']
                 last_seen[item_id] = value['last_seen']
                 times_seen[item_id] = value['times_seen']
@@ -590,6 +625,11 @@ class GroupSerializerSnuba(GroupSerializerBase):
                 'user_count': user_counts.get(item.id, 0),
             }
 
+        stats = results.get('stats')
+        if stats is not None:
+            for item in item_list:
+                attrs[item]['stats'] = stats[item.id]
+
         return attrs
 
 
@@ -610,17 +650,20 @@ class StreamGroupSerializerSnuba(GroupSerializerSnuba, GroupStatsMixin):
             **query_params
         )
 
-    def get_attrs(self, item_list, user):
-        attrs = super(StreamGroupSerializerSnuba, self).get_attrs(item_list, user)
+    def get_snuba_queries(self, item_list):
+        queries = super(StreamGroupSerializerSnuba, self).get_snuba_queries(item_list)
 
+        # the stats are fetched together with the seen stats, and added to
+        # the attrs by ``_get_seen_stats``
         if self.stats_period:
-            stats = self.get_stats(item_list, user)
-            for item in item_list:
-                attrs[item].update({
-                    'stats': stats[item.id],
-                })
+            queries['stats'] = snuba_tsdb.get_range_query(
+                model=snuba_tsdb.models.group,
+                keys=[item.id for item in item_list],
+                environment_ids=self.environment_ids,
+                **self.get_stats_query_params()
+            )
 
-        return attrs
+        return queries
 
     def serialize(self, obj, attrs, user):
         result = super(StreamGroupSerializerSnuba, self).serialize(obj, attrs, user)
@@ -10,10 +10,14 @@ from __future__ import absolute_import
 import logging
 import six
 
-from django.db.models import F
+from collections import defaultdict
+from django.db import connections, router, transaction
+from django.db.models import F, Model
 
 from sentry.signals import buffer_incr_complete
 from sentry.tasks.process_buffer import process_incr
+from sentry.utils import metrics
+from sentry.utils.db import is_postgres
 from sentry.utils.services import Service
 
 
@@ -38,7 +42,10 @@ class Buffer(Service):
     This is useful in situations where a single event might be happening so fast that the queue cant
     keep up with the updates.
     """
-    __all__ = ('incr', 'process', 'process_pending', 'validate')
+    __all__ = (
+        'incr', 'incr_multi', 'get_pending_counts', 'process', 'process_batch', 'process_pending',
+        'validate',
+    )
 
     def incr(self, model, columns, filters, extra=None):
         """
@@ -53,6 +60,29 @@ class Buffer(Service):
             }
         )
 
+    def incr_multi(self, items):
+        """
+        Increment several counters at once. ``items`` is a sequence of
+        ``(model, columns, filters, extra)`` tuples as accepted by ``incr``.
+
+        >>> incr_multi([
+        >>>     (Group, {'times_seen': 1}, {'pk': group.pk}, None),
+        >>>     (ReleaseProject, {'new_groups': 1}, {'release_id': 1, 'project_id': 1}, None),
+        >>> ])
+        """
+        for model, columns, filters, extra in items:
+            self.incr(model, columns, filters, extra)
+
+    def get_pending_counts(self, model, column, filters_list):
+        """
+        Returns the increments of ``column`` which have been buffered but not
+        yet written for each of ``filters_list``.
+
+        >>> get_pending_counts(Group, 'times_seen', [{'id': 1}, {'id': 2}])
+        [3, 0]
+        """
+        return [0] * len(filters_list)
+
     def process_pending(self, partition=None):
         return []
 
@@ -83,3 +113,162 @@ class Buffer(Service):
             created=created,
             sender=model,
         )
+
+    def process_batch(self, model, items):
+        """
+        Applies a list of ``(columns, filters, extra)`` increments for
+        ``model``.
+
+        On Postgres, increments which share the same filter, column and extra
+        names are written with a single ``UPDATE ... FROM (VALUES ...)``
+        statement. Increments which did not match an existing row (or which
+        cannot be expressed in a batch) fall back to ``process`` so that rows
+        are still created.
+
+        >>> process_batch(Group, [
+        >>>     ({'times_seen': 1}, {'pk': 1}, {'last_seen': now}),
+        >>>     ({'times_seen': 3}, {'pk': 2}, {'last_seen': now}),
+        >>> ])
+        """
+        using = router.db_for_write(model)
+
+        groups = defaultdict(list)
+        for columns, filters, extra in items:
+            extra = extra or {}
+            signature = (
+                tuple(sorted(filters)),
+                tuple(sorted(columns)),
+                tuple(sorted(extra)),
+            )
+            groups[signature].append((columns, filters, extra))
+
+        for signature, group_items in six.iteritems(groups):
+            if len(group_items) > 1 and is_postgres(using):
+                statement = self._build_batch_update(model, signature, group_items, using)
+            else:
+                statement = None
+
+            if statement is None:
+                for columns, filters, extra in group_items:
+                    Buffer.process(self, model, columns, filters, extra)
+                continue
+
+            sql, params = statement
+            with transaction.atomic(using=using):
+                cursor = connections[using].cursor()
+                cursor.execute(sql, params)
+                matched = set(row[0] for row in cursor.fetchall())
+
+            metrics.timing('buffer.batch-rows', len(group_items), tags={
+                'module': model.__module__,
+                'model': model.__name__,
+            })
+
+            for idx, (columns, filters, extra) in enumerate(group_items):
+                if idx not in matched:
+                    # no existing row, let the generic path create it
+                    Buffer.process(self, model, columns, filters, extra)
+                    continue
+
+                buffer_incr_complete.send_robust(
+                    model=model,
+                    columns=columns,
+                    filters=filters,
+                    extra=extra,
+                    created=False,
+                    sender=model,
+                )
+
+    def _get_batch_field(self, model, name):
+        for field in model._meta.fields:
+            if name in (field.name, field.attname):
+                return field
+        if name == 'pk':
+            return model._meta.pk
+        return None
+
+    def _get_batch_cast_type(self, field, connection):
+        # strip inline constraints (e.g. ``integer CHECK (...)``) and map
+        # serial pseudo-types to their storage type
+        db_type = field.db_type(connection).split(' CHECK', 1)[0]
+        return {
+            'serial': 'integer',
+            'bigserial': 'bigint',
+        }.get(db_type, db_type)
+
+    def _build_batch_update(self, model, signature, items, using):
+        """
+        Returns ``(sql, params)`` for a multi-row update of ``items``, or
+        ``None`` if the increments cannot be expressed as one statement.
+        """
+        from sentry.models import Group
+
+        connection = connections[using]
+        quote_name = connection.ops.quote_name
+        filter_names, column_names, extra_names = signature
+
+        # (values alias, field, kind) for every column of the VALUES list
+        value_columns = []
+        for kind, names in (('f', filter_names), ('i', column_names), ('e', extra_names)):
+            for idx, name in enumerate(names):
+                field = self._get_batch_field(model, name)
+                if field is None:
+                    return None
+                value_columns.append(('%s%d' % (kind, idx), field, kind))
+
+        rows = []
+        params = []
+        for idx, (columns, filters, extra) in enumerate(items):
+            values = {'f': filters, 'i': columns, 'e': extra}
+            placeholders = ['%s']
+            params.append(idx)
+            for (alias, field, kind), name in zip(
+                value_columns, filter_names + column_names + extra_names
+            ):
+                value = values[kind][name]
+                if isinstance(value, Model):
+                    value = value.pk
+                elif kind != 'i':
+                    value = field.get_db_prep_value(value, connection)
+                placeholders.append('CAST(%%s AS %s)' % (self._get_batch_cast_type(field, connection), ))
+                params.append(value)
+            rows.append('(%s)' % (', '.join(placeholders), ))
+
+        assignments = []
+        conditions = []
+        for alias, field, kind in value_columns:
+            column = quote_name(field.column)
+            if kind == 'f':
+                conditions.append('t.%s = v.%s' % (column, alias))
+            elif kind == 'i':
+                assignments.append('%s = t.%s + v.%s' % (column, column, alias))
+            else:
+                assignments.append('%s = v.%s' % (column, alias))
+
+        if not conditions or not assignments:
+            return None
+
+        # HACK: mirrors the ScoreClause computed in ``process``
+        if model is Group and 'times_seen' in column_names and 'last_seen' in extra_names:
+            assignments.append(
+                'score = log(t.times_seen + v.i%d) * 600 + '
+                'extract(epoch from v.e%d)::int' % (
+                    column_names.index('times_seen'),
+                    extra_names.index('last_seen'),
+                )
+            )
+
+        sql = """
+            UPDATE {table} AS t
+            SET {assignments}
+            FROM (VALUES {rows}) AS v (idx, {aliases})
+            WHERE {conditions}
+            RETURNING v.idx
+        """.format(
+            table=quote_name(model._meta.db_table),
+            assignments=', '.join(assignments),
+            rows=', '.join(rows),
+            aliases=', '.join(alias for alias, _, _ in value_columns),
+            conditions=' AND '.join(conditions),
+        )
+        return sql, params
@@ -7,10 +7,12 @@ sentry.buffer.redis
 """
 from __future__ import absolute_import
 
+import random
 import six
 
 from time import time
 from binascii import crc32
+from collections import defaultdict, OrderedDict
 
 from datetime import datetime
 from django.db import models
@@ -25,6 +27,7 @@ from sentry.utils.compat import pickle
 from sentry.utils.hashlib import md5_text
 from sentry.utils.imports import import_string
 from sentry.utils.redis import get_cluster_from_options
+from sentry.utils.writebatch import get_current_batch
 
 
 class PendingBuffer(object):
@@ -58,12 +61,21 @@ class RedisBuffer(Buffer):
     key_expire = 60 * 60  # 1 hour
     pending_key = 'b:p'
 
-    def __init__(self, pending_partitions=1, incr_batch_size=2, **options):
+    def __init__(self, pending_partitions=1, incr_batch_size=2, batch_process=False,
+                 counter_shards=1, **options):
         self.cluster, options = get_cluster_from_options('SENTRY_BUFFER_OPTIONS', options)
         self.pending_partitions = pending_partitions
         self.incr_batch_size = incr_batch_size
+        # when enabled, ``batch_keys`` are read in one pipeline per host and
+        # flushed with one UPDATE per (model, columns) group
+        self.batch_process = batch_process
+        # when greater than one, increments for a row are spread over this
+        # many keys (and therefore hosts), and the shards are folded back
+        # into a single row update when the buffer is processed
+        self.counter_shards = counter_shards
         assert self.pending_partitions > 0
         assert self.incr_batch_size > 0
+        assert self.counter_shards > 0
 
     def validate(self):
         try:
@@ -88,6 +100,24 @@ class RedisBuffer(Buffer):
             ).hexdigest(),
         )
 
+    def _make_incr_key(self, model, filters):
+        """
+        Returns the key increments for the model given filters are written
+        to, which is one of the row's shard keys if sharding is enabled.
+        """
+        key = self._make_key(model, filters)
+        if self.counter_shards > 1:
+            key = '%s:%d' % (key, random.randint(0, self.counter_shards - 1))
+        return key
+
+    def _get_counter_key(self, key):
+        """
+        Returns the unsharded key for a key returned by ``_make_incr_key``.
+        """
+        if key.count(':') > 3:
+            return key.rsplit(':', 1)[0]
+        return key
+
     def _make_pending_key(self, partition=None):
         """
         Returns the key to be used for the pending buffer.
@@ -103,11 +133,13 @@ class RedisBuffer(Buffer):
         """
         Return the pending_key for a given key. This is used
         to route a key into the correct pending buffer. If partitioning
-        is disabled, route into the no partition buffer.
+        is disabled, route into the no partition buffer. All shard keys of
+        a row are routed into the same partition, so they are processed
+        (and folded) together.
         """
         if self.pending_partitions == 1:
             return self.pending_key
-        return self._make_pending_key(crc32(key) % self.pending_partitions)
+        return self._make_pending_key(crc32(self._get_counter_key(key)) % self.pending_partitions)
 
     def _make_lock_key(self, key):
         return 'l:%s' % (key, )
@@ -164,13 +196,67 @@ class RedisBuffer(Buffer):
         """
         # TODO(dcramer): longer term we'd rather not have to serialize values
         # here (unless it's to JSON)
-        key = self._make_key(model, filters)
+        key = self._make_incr_key(model, filters)
+
+        batch = get_current_batch()
+        if batch is not None:
+            self._incr_pipeline(batch.get_client(self.cluster).target_key(key),
+                                key, model, columns, filters, extra)
+        else:
+            # We can't use conn.map() due to wanting to support multiple pending
+            # keys (one per Redis partition)
+            conn = self.cluster.get_local_client_for_key(key)
+
+            pipe = conn.pipeline()
+            self._incr_pipeline(pipe, key, model, columns, filters, extra)
+            pipe.execute()
+
+        metrics.incr('buffer.incr', skip_internal=True, tags={
+            'module': model.__module__,
+            'model': model.__name__,
+        })
+
+    def incr_multi(self, items):
+        """
+        Increment several counters with a single pipeline per Redis host,
+        instead of one pipeline per counter as ``incr`` does. If a write batch
+        is active, the commands are recorded into it instead.
+        """
+        if not items:
+            return
+
+        batch = get_current_batch()
+        if batch is not None:
+            for model, columns, filters, extra in items:
+                self.incr(model, columns, filters, extra)
+            return
+
+        router = self.cluster.get_router()
+        commands = defaultdict(list)
+        for model, columns, filters, extra in items:
+            key = self._make_incr_key(model, filters)
+            commands[router.get_host_for_key(key)].append((key, model, columns, filters, extra))
+
+        command_count = 0
+        for host, host_commands in six.iteritems(commands):
+            pipe = self.cluster.get_local_client(host).pipeline()
+            for key, model, columns, filters, extra in host_commands:
+                self._incr_pipeline(pipe, key, model, columns, filters, extra)
+            command_count += len(pipe)
+            pipe.execute()
+
+        for model, _, _, _ in items:
+            metrics.incr('buffer.incr', skip_internal=True, tags={
+                'module': model.__module__,
+                'model': model.__name__,
+            })
+        metrics.timing('buffer.incr_multi.keys', len(items))
+        metrics.timing('buffer.incr_multi.pipelines', len(commands))
+        metrics.timing('buffer.incr_multi.commands', command_count)
+
+    def _incr_pipeline(self, pipe, key, model, columns, filters, extra=None):
         pending_key = self._make_pending_key_from_key(key)
-        # We can't use conn.map() due to wanting to support multiple pending
-        # keys (one per Redis partition)
-        conn = self.cluster.get_local_client_for_key(key)
 
-        pipe = conn.pipeline()
         pipe.hsetnx(key, 'm', '%s.%s' % (model.__module__, model.__name__))
         # TODO(dcramer): once this goes live in production, we can kill the pickle path
         # (this is to ensure a zero downtime deploy where we can transition event processing)
@@ -190,12 +276,6 @@ class RedisBuffer(Buffer):
                 # pipe.hset(key, 'e+' + column, json.dumps(self._dump_value(value)))
         pipe.expire(key, self.key_expire)
         pipe.zadd(pending_key, time(), key)
-        pipe.execute()
-
-        metrics.incr('buffer.incr', skip_internal=True, tags={
-            'module': model.__module__,
-            'model': model.__name__,
-        })
 
     def process_pending(self, partition=None):
         if partition is None and self.pending_partitions > 1:
@@ -215,6 +295,9 @@ class RedisBuffer(Buffer):
             return
 
         pending_buffer = PendingBuffer(self.incr_batch_size)
+        # shards of the same row live on different hosts, collect them first
+        # so they end up in the same batch and can be folded together
+        sharded_keys = OrderedDict()
 
         try:
             keycount = 0
@@ -227,6 +310,9 @@ class RedisBuffer(Buffer):
                         continue
                     keycount += len(keys)
                     for key in keys:
+                        if self.counter_shards > 1:
+                            sharded_keys.setdefault(self._get_counter_key(key), []).append(key)
+                            continue
                         pending_buffer.append(key)
                         if pending_buffer.full():
                             process_incr.apply_async(
@@ -236,6 +322,19 @@ class RedisBuffer(Buffer):
                             )
                     conn.target([host_id]).zrem(pending_key, *keys)
 
+            batch_keys = []
+            for keys in six.itervalues(sharded_keys):
+                batch_keys.extend(keys)
+                if len(batch_keys) >= self.incr_batch_size:
+                    process_incr.apply_async(kwargs={
+                        'batch_keys': batch_keys,
+                    })
+                    batch_keys = []
+            if batch_keys:
+                process_incr.apply_async(kwargs={
+                    'batch_keys': batch_keys,
+                })
+
             # queue up remainder of pending keys
             if not pending_buffer.empty():
                 process_incr.apply_async(kwargs={
@@ -253,9 +352,98 @@ class RedisBuffer(Buffer):
         if key is not None:
             batch_keys = [key]
 
+        # shards of a row are only folded on the batch path, which reads and
+        # deletes the keys transactionally just like the single key path
+        if (self.batch_process or self.counter_shards > 1) and len(batch_keys) > 1:
+            self._process_batch_incr(batch_keys)
+            return
+
         for key in batch_keys:
             self._process_single_incr(key)
 
+    def _load_incr(self, key, values):
+        """
+        Returns ``(model, columns, filters, extra)`` for the buffered hash
+        ``values`` stored at ``key``, or ``None`` if it is empty.
+        """
+        if not values:
+            metrics.incr('buffer.revoked', tags={'reason': 'empty'}, skip_internal=False)
+            self.logger.debug('buffer.revoked.empty', extra={'redis_key': key})
+            return None
+
+        model = import_string(values.pop('m'))
+        if values['f'].startswith('{'):
+            filters = self._load_values(json.loads(values.pop('f')))
+        else:
+            # TODO(dcramer): legacy pickle support - remove in Sentry 9.1
+            filters = pickle.loads(values.pop('f'))
+
+        incr_values = {}
+        extra_values = {}
+        for k, v in six.iteritems(values):
+            if k.startswith('i+'):
+                incr_values[k[2:]] = int(v)
+            elif k.startswith('e+'):
+                if v.startswith('['):
+                    extra_values[k[2:]] = self._load_value(json.loads(v))
+                else:
+                    # TODO(dcramer): legacy pickle support - remove in Sentry 9.1
+                    extra_values[k[2:]] = pickle.loads(v)
+
+        return model, incr_values, filters, extra_values
+
+    def _fold_incrs(self, loaded):
+        """
+        Merges the increments read from the shard keys of the same row, so
+        each row is only written to once. Counters are summed, extra values
+        are taken from the shard with the most recent ``last_seen`` (if
+        there is one).
+        """
+        folded = OrderedDict()
+        for key, (model, incr_values, filters, extra_values) in loaded:
+            counter_key = self._get_counter_key(key)
+            try:
+                _, folded_incr, _, folded_extra = folded[counter_key]
+            except KeyError:
+                folded[counter_key] = (model, incr_values, filters, extra_values)
+                continue
+
+            for column, amount in six.iteritems(incr_values):
+                folded_incr[column] = folded_incr.get(column, 0) + amount
+
+            last_seen = extra_values.get('last_seen')
+            folded_last_seen = folded_extra.get('last_seen')
+            if last_seen is None or folded_last_seen is None or last_seen >= folded_last_seen:
+                folded_extra.update(extra_values)
+            else:
+                for column, value in six.iteritems(extra_values):
+                    folded_extra.setdefault(column, value)
+
+        metrics.timing('buffer.counter-shards.folded', len(loaded) - len(folded))
+        return list(folded.items())
+
+    def get_pending_counts(self, model, column, filters_list):
+        """
+        Returns the buffered increments of ``column`` for each of
+        ``filters_list``. Only sharded counters are read, unsharded buffers
+        are flushed often enough for the difference not to matter.
+        """
+        if self.counter_shards <= 1 or not filters_list:
+            return super(RedisBuffer, self).get_pending_counts(model, column, filters_list)
+
+        field = 'i+' + column
+        results = []
+        with self.cluster.map() as conn:
+            for filters in filters_list:
+                key = self._make_key(model, filters)
+                # include the unsharded key, which may still hold increments
+                # written before sharding was enabled
+                keys = [key] + ['%s:%d' % (key, i) for i in range(self.counter_shards)]
+                results.append([conn.hget(k, field) for k in keys])
+
+        metrics.timing('buffer.counter-shards.pending-reads', len(filters_list))
+        return [sum(int(p.value or 0) for p in promises) for promises in results]
+
     def _process_single_incr(self, key):
         client = self.cluster.get_routing_client()
         lock_key = self._make_lock_key(key)
@@ -276,30 +464,72 @@ class RedisBuffer(Buffer):
             pipe.delete(key)
             values = pipe.execute()[0]
 
-            if not values:
-                metrics.incr('buffer.revoked', tags={'reason': 'empty'}, skip_internal=False)
-                self.logger.debug('buffer.revoked.empty', extra={'redis_key': key})
+            result = self._load_incr(key, values)
+            if result is None:
                 return
 
-            model = import_string(values.pop('m'))
-            if values['f'].startswith('{'):
-                filters = self._load_values(json.loads(values.pop('f')))
-            else:
-                # TODO(dcramer): legacy pickle support - remove in Sentry 9.1
-                filters = pickle.loads(values.pop('f'))
-
-            incr_values = {}
-            extra_values = {}
-            for k, v in six.iteritems(values):
-                if k.startswith('i+'):
-                    incr_values[k[2:]] = int(v)
-                elif k.startswith('e+'):
-                    if v.startswith('['):
-                        extra_values[k[2:]] = self._load_value(json.loads(v))
-                    else:
-                        # TODO(dcramer): legacy pickle support - remove in Sentry 9.1
-                        extra_values[k[2:]] = pickle.loads(v)
-
+            model, incr_values, filters, extra_values = result
             super(RedisBuffer, self).process(model, incr_values, filters, extra_values)
         finally:
             client.delete(lock_key)
+
+    def _process_batch_incr(self, batch_keys):
+        # acquire every lock up front, the map client sends one pipeline per
+        # host rather than one round trip per key
+        with self.cluster.map() as conn:
+            locks = [(key, conn.set(self._make_lock_key(key), '1', nx=True, ex=10))
+                     for key in batch_keys]
+
+        keys = []
+        for key, acquired in locks:
+            if acquired.value:
+                keys.append(key)
+            else:
+                metrics.incr('buffer.revoked', tags={'reason': 'locked'}, skip_internal=False)
+                self.logger.debug('buffer.revoked.locked', extra={'redis_key': key})
+
+        if not keys:
+            return
+
+        router = self.cluster.get_router()
+        keys_by_host = defaultdict(list)
+        for key in keys:
+            keys_by_host[router.get_host_for_key(key)].append(key)
+
+        try:
+            results = []
+            for host, host_keys in six.iteritems(keys_by_host):
+                # read and delete in a single MULTI/EXEC like
+                # ``_process_single_incr``, otherwise an increment landing
+                # between the HGETALL and the DEL would be lost
+                pipe = self.cluster.get_local_client(host).pipeline(transaction=True)
+                for key in host_keys:
+                    pipe.hgetall(key)
+                    pipe.zrem(self._make_pending_key_from_key(key), key)
+                    pipe.delete(key)
+                results.extend(zip(host_keys, pipe.execute()[::3]))
+
+            loaded = []
+            for key, values in results:
+                result = self._load_incr(key, values)
+                if result is not None:
+                    loaded.append((key, result))
+
+            if self.counter_shards > 1:
+                loaded = self._fold_incrs(loaded)
+
+            if not self.batch_process:
+                for _, (model, incr_values, filters, extra_values) in loaded:
+                    super(RedisBuffer, self).process(model, incr_values, filters, extra_values)
+                return
+
+            items_by_model = defaultdict(list)
+            for _, (model, incr_values, filters, extra_values) in loaded:
+                items_by_model[model].append((incr_values, filters, extra_values))
+
+            for model, items in six.iteritems(items_by_model):
+                self.process_batch(model, items)
+        finally:
+            with self.cluster.map() as conn:
+                for key in keys:
+                    conn.delete(self._make_lock_key(key))
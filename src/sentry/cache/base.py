@@ -8,6 +8,8 @@ sentry.cache.base
 
 from __future__ import absolute_import
 
+import six
+
 from django.conf import settings
 
 from threading import local
@@ -36,3 +38,22 @@ class BaseCache(local):
 
     def get(self, key, version=None, raw=False):
         raise NotImplementedError
+
+    def get_many(self, keys, version=None, raw=False):
+        """
+        Returns a dictionary of the values for ``keys``. Keys which are not
+        in the cache are omitted.
+        """
+        rv = {}
+        for key in keys:
+            value = self.get(key, version=version, raw=raw)
+            if value is not None:
+                rv[key] = value
+        return rv
+
+    def set_many(self, values, timeout, version=None, raw=False):
+        """
+        Stores all items of the ``values`` dictionary.
+        """
+        for key, value in six.iteritems(values):
+            self.set(key, value, timeout, version=version, raw=raw)
@@ -8,6 +8,8 @@ sentry.cache.redis
 
 from __future__ import absolute_import
 
+import six
+
 from sentry.utils import json
 from sentry.utils.redis import get_cluster_from_options, redis_clusters
 
@@ -26,15 +28,21 @@ class CommonRedisCache(BaseCache):
         self.client = client
         BaseCache.__init__(self, **options)
 
-    def set(self, key, value, timeout, version=None, raw=False):
-        key = self.make_key(key, version=version)
+    def _dump(self, key, value, raw):
         v = json.dumps(value) if not raw else value
         if len(v) > self.max_size:
             raise ValueTooLarge('Cache key too large: %r %r' % (key, len(v)))
+        return v
+
+    def _set(self, client, key, v, timeout):
         if timeout:
-            self.client.setex(key, int(timeout), v)
+            client.setex(key, int(timeout), v)
         else:
-            self.client.set(key, v)
+            client.set(key, v)
+
+    def set(self, key, value, timeout, version=None, raw=False):
+        key = self.make_key(key, version=version)
+        self._set(self.client, key, self._dump(key, value, raw), timeout)
 
     def delete(self, key, version=None):
         key = self.make_key(key, version=version)
@@ -47,6 +55,37 @@ class CommonRedisCache(BaseCache):
             result = json.loads(result)
         return result
 
+    def get_many(self, keys, version=None, raw=False):
+        keys = list(keys)
+        if not keys:
+            return {}
+        results = self._get_many([self.make_key(k, version=version) for k in keys])
+        rv = {}
+        for key, result in zip(keys, results):
+            if result is not None:
+                rv[key] = result if raw else json.loads(result)
+        return rv
+
+    def _get_many(self, keys):
+        with self.client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.get(key)
+            return pipe.execute()
+
+    def set_many(self, values, timeout, version=None, raw=False):
+        items = []
+        for key, value in six.iteritems(values):
+            key = self.make_key(key, version=version)
+            items.append((key, self._dump(key, value, raw)))
+        if items:
+            self._set_many(items, timeout)
+
+    def _set_many(self, items, timeout):
+        with self.client.pipeline(transaction=False) as pipe:
+            for key, v in items:
+                self._set(pipe, key, v, timeout)
+            pipe.execute()
+
 
 class RbCache(CommonRedisCache):
 
@@ -56,6 +95,19 @@ class RbCache(CommonRedisCache):
         client = cluster.get_routing_client()
         CommonRedisCache.__init__(self, client, **options)
 
+    # The routing client can't pipeline across hosts, but a mapping client
+    # sends the commands for each host as one batch.
+
+    def _get_many(self, keys):
+        with self.client.map() as client:
+            promises = [client.get(key) for key in keys]
+        return [p.value for p in promises]
+
+    def _set_many(self, items, timeout):
+        with self.client.map() as client:
+            for key, v in items:
+                self._set(client, key, v, timeout)
+
 
 # Confusing legacy name for RbCache.  We don't actually have a pure redis cache
 RedisCache = RbCache
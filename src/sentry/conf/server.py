@@ -1019,10 +1019,32 @@ SENTRY_DEFAULT_MAX_EVENTS_PER_MINUTE = '90%'
 # Snuba configuration
 SENTRY_SNUBA = os.environ.get('SNUBA', 'http://localhost:1218')
 
+# Seconds to cache Snuba query results for, keyed by the query body.
+# Disabled by default.
+SENTRY_SNUBA_CACHE_TTL = 0
+
+# In-process LRU caches in front of the shared cache for hot lookups
+# (projects, project keys and project options). Invalidations are broadcast
+# over pub/sub on the given Redis cluster; ``ttl`` (in seconds) bounds
+# staleness if a message is lost.
+SENTRY_LOCAL_CACHE_OPTIONS = {
+    'cluster': 'default',
+    'max_size': 10000,
+    'ttl': 30,
+}
+
 # Node storage backend
 SENTRY_NODESTORE = 'sentry.nodestore.django.DjangoNodeStorage'
 SENTRY_NODESTORE_OPTIONS = {}
 
+# Node payload encoding, see ``sentry.nodestore.codec.NodeCodec``. By default
+# JSON and zlib are used; msgpack and zstd can be enabled with
+# ``{'serializer': 'msgpack', 'compressor': 'zstd'}`` once the msgpack-python
+# and zstandard packages are installed on every host. Per-platform trained
+# zstd dictionaries can be configured with
+# ``{'dictionaries': {'python': '/path/to/python.zdict'}}``.
+SENTRY_NODESTORE_CODEC_OPTIONS = {}
+
 # Tag storage backend
 _SENTRY_TAGSTORE_DEFAULT_MULTI_OPTIONS = {
     'backends': [
@@ -1091,12 +1113,28 @@ SENTRY_MAX_HTTP_BODY_SIZE = 4096 * 4  # 16kb
 SENTRY_MAX_DICTIONARY_ITEMS = 50
 
 SENTRY_MAX_MESSAGE_LENGTH = 1024 * 8
+
+# Maximum size in bytes of an event request body as sent by the client
+# (possibly compressed), and of the JSON document once decoded. Payloads over
+# either limit are rejected with a 413 while they are being read.
+SENTRY_MAX_EVENT_BODY_SIZE = 1024 * 1024 * 20  # 20mb
+SENTRY_MAX_EVENT_SIZE = 1024 * 1024 * 100  # 100mb
 # how many frames are fat
 SENTRY_MAX_STACKTRACE_FRAMES = 50
 # how many frames there can be at all
 SENTRY_STACKTRACE_FRAMES_HARD_LIMIT = 250
 SENTRY_MAX_EXCEPTIONS = 25
 
+# Number of processed stacktrace frames to keep in an in-process cache in
+# front of the shared frame cache (0 disables it.)
+SENTRY_FRAME_CACHE_LOCAL_SIZE = 0
+
+# Maximum number of events of one project saved together by a single
+# ``save_event_batch`` task (1 disables batching.) Pending events are queued
+# in the given Redis cluster.
+SENTRY_SAVE_EVENT_BATCH_SIZE = 1
+SENTRY_SAVE_EVENT_BATCH_CLUSTER = 'default'
+
 # Gravatar service base url
 SENTRY_GRAVATAR_BASE_URL = 'https://secure.gravatar.com'
 
@@ -1109,6 +1147,28 @@ SENTRY_SOURCE_FETCH_SOCKET_TIMEOUT = 2
 # Maximum content length for source files before we abort fetching
 SENTRY_SOURCE_FETCH_MAX_SIZE = 40 * 1024 * 1024
 
+# Maximum size (in bytes of the original artifacts) of the parsed release
+# artifacts (sources and sourcemaps) cached by each process
+SENTRY_SOURCEMAP_VIEW_CACHE_SIZE = 256 * 1024 * 1024
+
+# Build binary lookup indexes of sourcemaps when they are uploaded, and
+# resolve frames through them instead of parsing the JSON sourcemap
+SENTRY_SOURCEMAP_INDEX = False
+
+# Limits of the symcaches and cficaches each process keeps open (and memory
+# mapped) for native symbolication: the number of open files and the sum of
+# their sizes in bytes
+SENTRY_DIF_CACHE_MAX_OPEN = 512
+SENTRY_DIF_CACHE_MAX_MAPPED = 4 * 1024 * 1024 * 1024
+
+# How long (in seconds) each process remembers which cache file belongs to a
+# debug id, instead of querying the database for every event
+SENTRY_DIF_CACHE_RESOLVE_TTL = 60
+
+# Number of threads converting debug files to symcaches and cficaches
+# concurrently, when several files need to be converted at once
+SENTRY_DIF_CONVERSION_CONCURRENCY = 1
+
 # List of IP subnets which should not be accessible
 SENTRY_DISALLOWED_IPS = ()
 
@@ -1305,6 +1365,10 @@ SENTRY_MAX_AVATAR_SIZE = 5000000
 # The maximum age of raw events before they are deleted
 SENTRY_RAW_EVENT_MAX_AGE_DAYS = 10
 
+# Number of threads used to delete independent leaf relations (relations that
+# don't cascade any further) concurrently when deleting an object.
+SENTRY_DELETIONS_CONCURRENCY = 1
+
 # statuspage.io support
 STATUS_PAGE_ID = None
 STATUS_PAGE_API_HOST = 'statuspage.io'
@@ -17,6 +17,7 @@ import re
 import six
 import zlib
 
+from django.conf import settings
 from django.core.exceptions import SuspiciousOperation
 from django.utils.crypto import constant_time_compare
 from gzip import GzipFile
@@ -28,7 +29,7 @@ from sentry.cache import default_cache
 from sentry.models import ProjectKey
 from sentry.tasks.store import preprocess_event, \
     preprocess_event_from_reprocessing
-from sentry.utils import json
+from sentry.utils import json, metrics
 from sentry.utils.auth import parse_auth_header
 from sentry.utils.http import origin_from_request
 from sentry.utils.strings import decompress
@@ -64,6 +65,16 @@ class APIForbidden(APIError):
     http_status = 403
 
 
+class APIPayloadTooLarge(APIError):
+    http_status = 413
+    msg = 'Event payload exceeds the maximum allowed size'
+    name = 'too_large'
+
+    def __init__(self, msg=None):
+        if msg:
+            self.msg = msg
+
+
 class APIRateLimited(APIError):
     http_status = 429
     msg = 'Creation of this event was denied due to rate limiting'
@@ -326,9 +337,173 @@ def decode_data(encoded_data):
         raise APIError("Bad data decoding request (%s, %s)" % (type(e).__name__, e))
 
 
-def safely_load_json_string(json_string):
+class EventPayloadDecoder(object):
+    """
+    Incrementally decodes an event payload while it is being read.
+
+    Payloads are either plain JSON, gzip or deflate compressed JSON (as
+    indicated by ``content_encoding``) or base64 encoded (and optionally zlib
+    compressed) JSON. Every chunk is decoded as soon as it is fed in so the
+    compressed body never needs to be held in memory in full, and both the
+    raw and the decoded size are checked while streaming so oversized
+    payloads are rejected before they are fully read.
+
+    >>> decoder = EventPayloadDecoder('gzip', max_size=1024, max_decoded_size=4096)
+    >>> for chunk in iter(lambda: request.read(65536), b''):
+    ...     decoder.feed(chunk)
+    >>> data = decoder.finish()
+    """
+
+    def __init__(self, content_encoding=None, max_size=None, max_decoded_size=None):
+        self.max_size = max_size
+        self.max_decoded_size = max_decoded_size
+        self.size = 0
+        self.decoded_size = 0
+        self._chunks = []
+        self._started = False
+        # pending base64 input that is not yet aligned to 4 bytes, or ``None``
+        # if the payload is not base64 encoded
+        self._b64_buffer = None
+        # ``None`` until we know whether a base64 payload is zlib compressed
+        self._b64_compressed = None
+        self._inflater = None
+
+        if content_encoding == 'gzip':
+            self._inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif content_encoding == 'deflate':
+            self._inflater = zlib.decompressobj()
+
+    def _write(self, data):
+        if not data:
+            return
+        self.decoded_size += len(data)
+        if self.max_decoded_size and self.decoded_size > self.max_decoded_size:
+            raise APIPayloadTooLarge(
+                'Decoded event payload exceeds the maximum allowed size (%d bytes)' %
+                (self.max_decoded_size, )
+            )
+        self._chunks.append(data)
+
+    def _inflate(self, data):
+        # Bound the output of a single call so a small, highly compressed
+        # chunk cannot inflate far past the limit before we notice. If the
+        # output stays below the bound all of the input has been consumed.
+        if self.max_decoded_size:
+            max_length = self.max_decoded_size - self.decoded_size + 1
+        else:
+            max_length = 0
+        self._write(self._inflater.decompress(data, max_length))
+
+    def _decode_b64(self, chunk):
+        data = self._b64_buffer + b''.join(chunk.split())
+        aligned = len(data) - len(data) % 4
+        self._b64_buffer = data[aligned:]
+        return base64.b64decode(data[:aligned])
+
+    def _feed_decoded(self, data):
+        if not data:
+            return
+        if self._b64_buffer is not None and self._b64_compressed is None:
+            self._b64_compressed = data[:1] != b'{'
+            if self._b64_compressed:
+                self._inflater = zlib.decompressobj()
+        if self._inflater is not None:
+            self._inflate(data)
+        else:
+            self._write(data)
+
+    def feed(self, chunk):
+        if not chunk:
+            return
+
+        self.size += len(chunk)
+        if self.max_size and self.size > self.max_size:
+            raise APIPayloadTooLarge(
+                'Event payload exceeds the maximum allowed size (%d bytes)' %
+                (self.max_size, )
+            )
+
+        if not self._started:
+            self._started = True
+            if self._inflater is None and chunk[:1] != b'{':
+                self._b64_buffer = b''
+
+        try:
+            if self._b64_buffer is not None:
+                chunk = self._decode_b64(chunk)
+            self._feed_decoded(chunk)
+        except (TypeError, ValueError, zlib.error) as e:
+            # This error should be caught as it suggests that there's a
+            # bug somewhere in the client's code.
+            logger.debug(six.text_type(e), exc_info=True)
+            raise APIError("Bad data decoding request (%s, %s)" % (type(e).__name__, e))
+
+    def finish(self):
+        """
+        Flushes any pending input and returns the decoded JSON document as
+        UTF-8 encoded bytes.
+        """
+        try:
+            if self._b64_buffer:
+                self._feed_decoded(base64.b64decode(self._b64_buffer))
+                self._b64_buffer = b''
+            if self._inflater is not None:
+                self._write(self._inflater.flush())
+        except (TypeError, ValueError, zlib.error) as e:
+            logger.debug(six.text_type(e), exc_info=True)
+            raise APIError("Bad data decoding request (%s, %s)" % (type(e).__name__, e))
+
+        rv = b''.join(self._chunks)
+        self._chunks = []
+        return rv
+
+
+def read_event_payload(stream, content_encoding=None, max_size=None,
+                       max_decoded_size=None, chunk_size=65536):
+    """
+    Reads, decodes and parses an event payload from ``stream`` (usually the
+    request itself) in chunks, enforcing the configured size limits while
+    reading. Returns ``None`` for an empty body.
+    """
+    if max_size is None:
+        max_size = settings.SENTRY_MAX_EVENT_BODY_SIZE
+    if max_decoded_size is None:
+        max_decoded_size = settings.SENTRY_MAX_EVENT_SIZE
+
+    # Reject early if the client already told us the body is too large
+    content_length = getattr(stream, 'META', {}).get('CONTENT_LENGTH')
+    if max_size and content_length and content_length.isdigit() \
+            and int(content_length) > max_size:
+        raise APIPayloadTooLarge(
+            'Event payload exceeds the maximum allowed size (%d bytes)' % (max_size, )
+        )
+
+    decoder = EventPayloadDecoder(
+        content_encoding=content_encoding,
+        max_size=max_size,
+        max_decoded_size=max_decoded_size,
+    )
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        decoder.feed(chunk)
+
+    if not decoder.size:
+        return None
+
+    payload = decoder.finish()
+    metrics.timing('events.payload.size', decoder.size)
+    metrics.timing('events.payload.decoded_size', decoder.decoded_size)
+
+    # ``json.loads`` takes the UTF-8 bytes as they are which avoids building
+    # an intermediate unicode copy of the whole document.
+    return safely_load_json_string(payload, decode=False)
+
+
+def safely_load_json_string(json_string, decode=True):
     try:
-        if isinstance(json_string, six.binary_type):
+        if decode and isinstance(json_string, six.binary_type):
             json_string = json_string.decode("utf-8")
         obj = json.loads(json_string)
         assert isinstance(obj, dict)
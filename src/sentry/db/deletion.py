@@ -73,10 +73,13 @@ class BulkDeleteQuery(object):
 
     def _continuous_query(self, query):
         results = True
+        deleted = 0
         cursor = connections[self.using].cursor()
         while results:
             cursor.execute(query)
             results = cursor.rowcount > 0
+            deleted += max(cursor.rowcount, 0)
+        return deleted
 
     def execute_generic(self, chunk_size=100):
         qs = self.get_generic_queryset()
@@ -100,17 +103,72 @@ class BulkDeleteQuery(object):
         # XXX: we step through because the deletion collector will pull all
         # relations into memory
         exists = True
+        deleted = 0
         while exists:
             exists = False
             for item in query[:chunk_size].iterator():
                 item.delete()
+                deleted += 1
                 exists = True
+        return deleted
 
     def execute(self, chunk_size=10000):
+        """
+        Deletes all matching rows and returns the number of rows deleted.
+        """
         if db.is_postgres():
-            self.execute_postgres(chunk_size)
+            return self.execute_postgres(chunk_size)
         else:
-            self.execute_generic(chunk_size)
+            return self.execute_generic(chunk_size)
+
+    def get_shards(self, num_shards):
+        """
+        Splits the id space of the matching rows into ``num_shards``
+        contiguous ``(min_id, max_id)`` ranges (exclusive lower bound,
+        inclusive upper bound) that can be processed independently with
+        ``iterator_range``.
+
+        The bounds are estimated from the oldest and newest matching rows, and
+        the first and last shards are left open (``None``) so that rows
+        outside of the estimate are still covered.
+        """
+        qs = self.get_generic_queryset()
+        lower = qs.order_by('id').values_list('id', flat=True)[:1]
+        if not lower:
+            return []
+        lower = lower[0]
+
+        upper = lower
+        if self.dtfield:
+            newest = qs.order_by('-{}'.format(self.dtfield)).values_list('id', flat=True)[:1]
+            if newest:
+                upper = max(upper, newest[0])
+
+        step = max((upper - lower) // num_shards, 1)
+        bounds = [lower - 1 + step * i for i in range(1, num_shards)]
+        bounds = [b for b in bounds if b < upper]
+        return list(zip([None] + bounds, bounds + [None]))
+
+    def iterator_range(self, chunk_size=100, min_id=None, max_id=None):
+        """
+        Yields tuples of ids for matching rows with ``min_id < id <= max_id``
+        in ascending id order, paginating on the id (like
+        ``RangeQuerySetWrapper``) so every query can continue where the last
+        one stopped.
+        """
+        qs = self.get_generic_queryset()
+        if max_id is not None:
+            qs = qs.filter(id__lte=max_id)
+
+        while True:
+            page = qs
+            if min_id is not None:
+                page = page.filter(id__gt=min_id)
+            chunk = tuple(page.order_by('id').values_list('id', flat=True)[:chunk_size])
+            if not chunk:
+                return
+            yield chunk
+            min_id = chunk[-1]
 
     def iterator(self, chunk_size=100):
         if db.is_postgres():
@@ -12,7 +12,9 @@ from base64 import b64encode
 import collections
 import logging
 import six
+import threading
 import warnings
+from contextlib import contextmanager
 from uuid import uuid4
 
 from django.conf import settings
@@ -27,10 +29,12 @@ from sentry.utils.canonical import CANONICAL_TYPES, CanonicalKeyDict
 
 from .gzippeddict import GzippedDictField
 
-__all__ = ('NodeField', )
+__all__ = ('NodeField', 'deferred_node_writes')
 
 logger = logging.getLogger('sentry')
 
+_local = threading.local()
+
 
 class NodeUnpopulated(Exception):
     pass
@@ -163,7 +167,32 @@ class NodeData(collections.MutableMapping):
         if isinstance(to_write, CANONICAL_TYPES):
             to_write = dict(to_write.items())
 
-        nodestore.set(self.id, to_write)
+        pending = getattr(_local, 'pending_writes', None)
+        if pending is not None:
+            pending[self.id] = to_write
+        else:
+            nodestore.set(self.id, to_write)
+
+
+@contextmanager
+def deferred_node_writes():
+    """
+    Collects the node data saved within the block and writes it with a single
+    ``nodestore.set_multi`` call once the block completes. Nothing is written
+    if the block raises.
+
+    >>> with deferred_node_writes():
+    >>>     for event in events:
+    >>>         event.save()
+    """
+    assert getattr(_local, 'pending_writes', None) is None, 'node writes are already deferred'
+    pending = _local.pending_writes = {}
+    try:
+        yield pending
+    finally:
+        _local.pending_writes = None
+    if pending:
+        nodestore.set_multi(pending)
 
 
 class NodeField(GzippedDictField):
@@ -22,7 +22,9 @@ from django.utils.encoding import smart_text
 
 from sentry import nodestore
 from sentry.utils.cache import cache
+from sentry.utils.compat import pickle
 from sentry.utils.hashlib import md5_text
+from sentry.utils.localcache import get_local_cache
 
 from .query import create_or_update
 
@@ -81,6 +83,9 @@ class BaseManager(Manager):
         self.cache_fields = kwargs.pop('cache_fields', [])
         self.cache_ttl = kwargs.pop('cache_ttl', 60 * 5)
         self.cache_version = kwargs.pop('cache_version', None)
+        # keep ``get_from_cache`` results in an in-process LRU in front of
+        # the shared cache, see ``sentry.utils.localcache``
+        self.local_cache = kwargs.pop('local_cache', False)
         self.__local_cache = threading.local()
         super(BaseManager, self).__init__(*args, **kwargs)
 
@@ -126,6 +131,28 @@ class BaseManager(Manager):
         post_save.connect(self.__post_save, sender=sender, weak=False)
         post_delete.connect(self.__post_delete, sender=sender, weak=False)
 
+        if self.local_cache:
+            post_save.connect(self.__invalidate_local, sender=sender, weak=False)
+            post_delete.connect(self.__invalidate_local, sender=sender, weak=False)
+
+    def __get_local_cache(self):
+        if not self.local_cache:
+            return None
+        return get_local_cache(u'modelcache:{}'.format(self.model.__name__))
+
+    def __invalidate_local(self, instance, **kwargs):
+        """
+        Drops an instance from the local caches of every process.
+        """
+        local_cache = self.__get_local_cache()
+        pk_name = instance._meta.pk.name
+        local_cache.invalidate(self.__get_lookup_cache_key(**{pk_name: instance.pk}))
+        for key in self.cache_fields:
+            if key in ('pk', pk_name):
+                continue
+            value = self.__value_for_field(instance, key)
+            local_cache.invalidate(self.__get_lookup_cache_key(**{key: value}))
+
     def __cache_state(self, instance):
         """
         Updates the tracked state of an instance.
@@ -256,17 +283,28 @@ class BaseManager(Manager):
         if key in self.cache_fields or key == pk_name:
             cache_key = self.__get_lookup_cache_key(**{key: value})
 
+            local_cache = self.__get_local_cache()
+            if local_cache is not None:
+                result = self.__get_from_local_cache(local_cache, cache_key, key, value)
+                if result is not None:
+                    result._state.db = router.db_for_read(self.model, **kwargs)
+                    return result
+
             retval = cache.get(cache_key, version=self.cache_version)
             if retval is None:
                 result = self.get(**kwargs)
                 # Ensure we're pushing it into the cache
                 self.__post_save(instance=result)
+                self.__set_local_cache(local_cache, key, value, result)
                 return result
 
             # If we didn't look up by pk we need to hit the reffed
             # key
             if key != pk_name:
-                return self.get_from_cache(**{pk_name: retval})
+                result = self.get_from_cache(**{pk_name: retval})
+                if local_cache is not None:
+                    local_cache.set(cache_key, result.pk)
+                return result
 
             if type(retval) != self.model:
                 if settings.DEBUG:
@@ -281,11 +319,57 @@ class BaseManager(Manager):
                 return self.get(**kwargs)
 
             retval._state.db = router.db_for_read(self.model, **kwargs)
+            self.__set_local_cache(local_cache, key, value, retval)
 
             return retval
         else:
             return self.get(**kwargs)
 
+    def __get_from_local_cache(self, local_cache, cache_key, key, value):
+        pk_name = self.model._meta.pk.name
+        if key != pk_name:
+            pk_val = local_cache.get(cache_key)
+            if pk_val is None:
+                return None
+            result = self.__get_from_local_cache(
+                local_cache,
+                self.__get_lookup_cache_key(**{pk_name: pk_val}),
+                pk_name,
+                pk_val,
+            )
+            # the pointer may be stale if the field has since changed
+            if result is None or smart_text(self.__value_for_field(result, key)) != \
+                    smart_text(value):
+                return None
+            return result
+
+        # instances are stored pickled so that callers never share (and
+        # mutate) the same object
+        data = local_cache.get(cache_key)
+        if data is None:
+            return None
+        return pickle.loads(data)
+
+    def __set_local_cache(self, local_cache, key, value, instance):
+        if local_cache is None:
+            return
+
+        pk_name = self.model._meta.pk.name
+        if key != pk_name:
+            local_cache.set(self.__get_lookup_cache_key(**{key: value}), instance.pk)
+
+        db = instance._state.db
+        instance._state.db = None
+        try:
+            local_cache.set(
+                self.__get_lookup_cache_key(**{pk_name: instance.pk}),
+                pickle.dumps(instance, pickle.HIGHEST_PROTOCOL),
+            )
+        except Exception as e:
+            logger.error(e, exc_info=True)
+        finally:
+            instance._state.db = db
+
     def create_or_update(self, **kwargs):
         return create_or_update(self.model, **kwargs)
 
@@ -310,6 +394,9 @@ class BaseManager(Manager):
         pk_name = self.model._meta.pk.name
         cache_key = self.__get_lookup_cache_key(**{pk_name: instance_id})
         cache.delete(cache_key, version=self.cache_version)
+        local_cache = self.__get_local_cache()
+        if local_cache is not None:
+            local_cache.invalidate(cache_key)
 
     def post_save(self, instance, **kwargs):
         """
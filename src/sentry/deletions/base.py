@@ -1,14 +1,108 @@
 from __future__ import absolute_import, print_function
 
+import hashlib
 import logging
 import re
+import weakref
 
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connections, models, router
+from django.db.models.deletion import DO_NOTHING
+from django.db.models.signals import m2m_changed, post_delete, pre_delete
+from django.dispatch.dispatcher import _make_id
+
+from sentry.cache import default_cache
 from sentry.constants import ObjectStatus
+from sentry.utils import db, metrics
 from sentry.utils.query import bulk_delete_objects
 
 _leaf_re = re.compile(r'^(Event|Group)(.+)')
 
 
+def _get_function(method):
+    return getattr(method, '__func__', method)
+
+
+def get_delete_receivers(model):
+    from sentry.db.models.manager import BaseManager
+
+    sender = _make_id(model)
+    for signal in (pre_delete, post_delete, m2m_changed):
+        for (_, receiver_sender), receiver in signal.receivers:
+            if receiver_sender != sender:
+                continue
+            if isinstance(receiver, weakref.ReferenceType):
+                receiver = receiver()
+                if receiver is None:
+                    continue
+            # ``BaseManager`` connects its ``post_delete`` hook for every
+            # model, but it's a no-op unless a manager overrides it.
+            if _get_function(receiver) is _get_function(BaseManager.post_delete):
+                continue
+            yield receiver
+
+
+def can_fast_delete(model):
+    """
+    Returns ``True`` if rows of ``model`` can be removed with plain
+    ``DELETE`` statements, i.e. the model doesn't customize ``delete`` and
+    Django would neither send signals for it nor cascade to other tables (so
+    the database won't refuse the delete because of foreign keys pointing at
+    its rows.)
+
+    This mirrors ``Collector.can_fast_delete`` but ignores the default
+    ``BaseManager`` hook, which is connected for every Sentry model.
+    """
+    if _get_function(model.delete) is not _get_function(models.Model.delete):
+        return False
+
+    if any(True for _ in get_delete_receivers(model)):
+        return False
+
+    for related in model._meta.get_all_related_objects(include_hidden=True):
+        if related.field.rel.on_delete is not DO_NOTHING:
+            return False
+
+    for field in model._meta.many_to_many:
+        if not field.rel.through:
+            return False
+
+    return True
+
+
+def run_task(task):
+    has_more = True
+    while has_more:
+        has_more = task.chunk()
+
+
+def _run_task_in_thread(task):
+    try:
+        run_task(task)
+    finally:
+        # Threads get their own database connections which would otherwise
+        # be left open once the worker exits.
+        for connection in connections.all():
+            connection.close()
+
+
+def run_tasks(tasks, concurrency=1):
+    """
+    Runs the given (independent) deletion tasks to completion, using up to
+    ``concurrency`` threads.
+    """
+    if len(tasks) < 2 or concurrency < 2:
+        for task in tasks:
+            run_task(task)
+        return
+
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(tasks))) as executor:
+        futures = [executor.submit(_run_task_in_thread, task) for task in tasks]
+    for future in futures:
+        future.result()
+
+
 class BaseRelation(object):
     def __init__(self, params, task):
         self.task = task
@@ -117,16 +211,35 @@ class BaseDeletionTask(object):
 
     def delete_children(self, relations):
         # Ideally this runs through the deletion manager
-        for relation in relations:
-            task = self.manager.get(
+        tasks = [
+            self.manager.get(
                 transaction_id=self.transaction_id,
                 actor_id=self.actor_id,
                 task=relation.task,
                 **relation.params
-            )
-            has_more = True
-            while has_more:
-                has_more = task.chunk()
+            ) for relation in relations
+        ]
+
+        # Consecutive leaf relations don't depend on each other, so they can
+        # be deleted concurrently. Everything else runs in the given order as
+        # later relations may depend on earlier ones being removed.
+        concurrency = getattr(settings, 'SENTRY_DELETIONS_CONCURRENCY', 1)
+        batch = []
+        for task in tasks:
+            if concurrency > 1 and task.is_leaf():
+                batch.append(task)
+                continue
+            run_tasks(batch, concurrency)
+            batch = []
+            run_task(task)
+        run_tasks(batch, concurrency)
+        return False
+
+    def is_leaf(self):
+        """
+        Returns ``True`` if deleting this task's rows does not cascade to any
+        other relations.
+        """
         return False
 
     def mark_deletion_in_progress(self, instance_list):
@@ -136,12 +249,18 @@ class BaseDeletionTask(object):
 class ModelDeletionTask(BaseDeletionTask):
     DEFAULT_QUERY_LIMIT = None
 
-    def __init__(self, manager, model, query, query_limit=None, order_by=None, **kwargs):
+    # Number of rows removed by a single statement when deleting set-based.
+    DEFAULT_BULK_QUERY_LIMIT = 10000
+
+    def __init__(self, manager, model, query, query_limit=None, order_by=None,
+                 bulk_query_limit=None, **kwargs):
         super(ModelDeletionTask, self).__init__(manager, **kwargs)
         self.model = model
         self.query = query
         self.query_limit = (query_limit or self.DEFAULT_QUERY_LIMIT or self.chunk_size)
+        self.bulk_query_limit = bulk_query_limit or self.DEFAULT_BULK_QUERY_LIMIT
         self.order_by = order_by
+        self._can_delete_set_based = None
 
     def __repr__(self):
         return '<%s: model=%s query=%s order_by=%s transaction_id=%s actor_id=%s>' % (
@@ -159,30 +278,141 @@ class ModelDeletionTask(BaseDeletionTask):
         return child_relations + [rel(obj_list)
                                   for rel in default_manager.bulk_dependencies[self.model]]
 
+    def get_queryset(self, num_shards=None, shard_id=None):
+        queryset = self.model.objects.filter(**self.query)
+        if self.order_by:
+            queryset = queryset.order_by(self.order_by)
+
+        if num_shards:
+            assert num_shards > 1
+            assert shard_id < num_shards
+            queryset = queryset.extra(
+                where=[
+                    u'id %% {num_shards} = {shard_id}'.format(
+                        num_shards=num_shards,
+                        shard_id=shard_id,
+                    )
+                ]
+            )
+        return queryset
+
+    def can_delete_set_based(self):
+        """
+        Returns ``True`` if rows can be removed with plain ``DELETE``
+        statements: the task doesn't customize how instances or their
+        children are deleted, and Django would neither cascade nor send
+        signals for the model.
+        """
+        if self._can_delete_set_based is not None:
+            return self._can_delete_set_based
+
+        from sentry.deletions import default_manager
+
+        cls = type(self)
+        rv = (
+            self.order_by is None and
+            cls.get_child_relations == BaseDeletionTask.get_child_relations and
+            cls.get_child_relations_bulk == BaseDeletionTask.get_child_relations_bulk and
+            cls.delete_instance == ModelDeletionTask.delete_instance and
+            cls.delete_instance_bulk == ModelDeletionTask.delete_instance_bulk and
+            not default_manager.dependencies.get(self.model) and
+            not default_manager.bulk_dependencies.get(self.model) and
+            can_fast_delete(self.model)
+        )
+        self._can_delete_set_based = rv
+        return rv
+
+    def is_leaf(self):
+        return self.can_delete_set_based()
+
+    def get_checkpoint_key(self, num_shards=None, shard_id=None):
+        query = u'{}:{}:{}'.format(
+            sorted(self.query.items()), num_shards, shard_id,
+        ).encode('utf-8')
+        return u'deletions:checkpoint:{}:{}:{}'.format(
+            self.transaction_id,
+            self.model._meta.db_table,
+            hashlib.md5(query).hexdigest(),
+        )
+
+    def delete_set_based(self, num_shards=None, shard_id=None):
+        """
+        Deletes up to ``bulk_query_limit`` rows in a single statement, walking
+        the table in primary key order. The highest deleted id is recorded as
+        a checkpoint, so a task that is retried or resumed continues where the
+        previous attempt stopped instead of rescanning the index from the
+        start. Returns ``True`` if there may be more rows to delete.
+        """
+        using = router.db_for_write(self.model)
+        checkpoint_key = None
+        if self.transaction_id:
+            checkpoint_key = self.get_checkpoint_key(num_shards, shard_id)
+
+        last_id = default_cache.get(checkpoint_key) if checkpoint_key else None
+
+        queryset = self.get_queryset(num_shards, shard_id)
+        if last_id is not None:
+            queryset = queryset.filter(id__gt=last_id)
+        id_queryset = queryset.order_by('id').values_list('id', flat=True)[:self.bulk_query_limit]
+
+        with metrics.timer('deletions.set_based.chunk', tags={'model': self.model.__name__}):
+            if db.is_postgres():
+                connection = connections[using]
+                sql, params = id_queryset.query.get_compiler(using).as_sql()
+                cursor = connection.cursor()
+                cursor.execute(
+                    'DELETE FROM %s WHERE id IN (%s) RETURNING id' % (
+                        connection.ops.quote_name(self.model._meta.db_table), sql,
+                    ),
+                    params,
+                )
+                deleted = [r[0] for r in cursor.fetchall()]
+            else:
+                deleted = list(id_queryset)
+                if deleted:
+                    self.model.objects.filter(id__in=deleted)._raw_delete(using=using)
+
+        metrics.incr(
+            'deletions.set_based.rows',
+            amount=len(deleted),
+            tags={'model': self.model.__name__},
+        )
+
+        has_more = len(deleted) >= self.bulk_query_limit
+        if checkpoint_key:
+            if has_more:
+                default_cache.set(checkpoint_key, max(deleted), 60 * 60 * 24)
+            else:
+                default_cache.delete(checkpoint_key)
+
+        if not deleted:
+            return False
+
+        model_name = self.model.__name__
+        if not _leaf_re.search(model_name):
+            self.logger.info(
+                'object.delete.set_based_executed',
+                extra={
+                    'transaction_id': self.transaction_id,
+                    'app_label': self.model._meta.app_label,
+                    'model': model_name,
+                    'rows': len(deleted),
+                }
+            )
+        return has_more
+
     def chunk(self, num_shards=None, shard_id=None):
         """
         Deletes a chunk of this instance's data. Return ``True`` if there is
         more work, or ``False`` if the entity has been removed.
         """
+        if self.can_delete_set_based():
+            return self.delete_set_based(num_shards=num_shards, shard_id=shard_id)
+
         query_limit = self.query_limit
         remaining = self.chunk_size
         while remaining > 0:
-            queryset = self.model.objects.filter(**self.query)
-            if self.order_by:
-                queryset = queryset.order_by(self.order_by)
-
-            if num_shards:
-                assert num_shards > 1
-                assert shard_id < num_shards
-                queryset = queryset.extra(
-                    where=[
-                        u'id %% {num_shards} = {shard_id}'.format(
-                            num_shards=num_shards,
-                            shard_id=shard_id,
-                        )
-                    ]
-                )
-
+            queryset = self.get_queryset(num_shards, shard_id)
             queryset = list(queryset[:query_limit])
             if not queryset:
                 return False
@@ -248,6 +478,9 @@ class BulkModelDeletionTask(ModelDeletionTask):
     def chunk(self):
         return self.delete_instance_bulk()
 
+    def is_leaf(self):
+        return True
+
     def delete_instance_bulk(self):
         try:
             return bulk_delete_objects(
@@ -6,14 +6,18 @@ sentry.event_manager
 """
 from __future__ import absolute_import, print_function
 
+import itertools
 import logging
 import os
 import six
 import jsonschema
 
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from django.conf import settings
-from django.db import connection, IntegrityError, router, transaction
+from django.db import (
+    connection, connections, DatabaseError, IntegrityError, router, transaction
+)
 from django.utils import timezone
 from django.utils.encoding import force_text
 from sentry import options
@@ -33,6 +37,7 @@ from sentry.coreapi import (
     decode_data,
     safely_load_json_string,
 )
+from sentry.db.models.fields.node import deferred_node_writes
 from sentry.interfaces.base import get_interface, prune_empty_keys
 from sentry.interfaces.exception import normalize_mechanism_meta
 from sentry.interfaces.schemas import validate_and_default_interface
@@ -62,6 +67,7 @@ from sentry.utils.safe import ENABLE_TRIMMING, safe_execute, trim, trim_dict, ge
 from sentry.utils.strings import truncatechars
 from sentry.utils.geo import rust_geoip
 from sentry.utils.validators import is_float
+from sentry.utils.writebatch import flush_current_batch, write_batch
 from sentry.utils.contexts_normalization import normalize_user_agent
 from sentry.stacktraces import normalize_in_app
 
@@ -364,6 +370,248 @@ def _decode_event(data, content_encoding):
     return CanonicalKeyDict(data)
 
 
+class PendingEvent(object):
+    __slots__ = ('event', 'mapping', 'publish')
+
+    def __init__(self, event, mapping=None):
+        self.event = event
+        self.mapping = mapping
+        self.publish = None
+
+
+class EventBatch(object):
+    """
+    Shared state for saving several events of one project together.
+
+    Events saved with a batch resolve their grouping hashes through a cache
+    that can be filled for all events with a single query (see
+    ``prefetch_hashes``). Their ``Event`` and ``EventMapping`` rows and node
+    data are written by ``commit`` in one transaction, after which the events
+    that were stored are published to the eventstream. Events already stored
+    are found for the whole batch with ``find_existing``, so callers need to
+    skip them before saving.
+
+    >>> batch = EventBatch(project)
+    >>> existing = batch.find_existing([m.get_data()['event_id'] for m in managers])
+    >>> batch.prefetch_hashes([m.compute_hashes(project.id) for m in managers])
+    >>> for manager in managers:
+    >>>     manager.save(project.id, batch=batch)
+    >>> batch.commit()
+    """
+
+    def __init__(self, project):
+        self.project = project
+        self.group_hashes = {}
+        self.pending = OrderedDict()
+        self.failed = []
+
+    def find_existing(self, event_ids):
+        """
+        Returns the subset of ``event_ids`` which already have an ``Event`` or
+        ``EventMapping`` row in the project.
+        """
+        event_ids = set(event_ids)
+        if not event_ids:
+            return set()
+        existing = set(Event.objects.filter(
+            project_id=self.project.id, event_id__in=event_ids,
+        ).values_list('event_id', flat=True))
+        existing.update(EventMapping.objects.filter(
+            project_id=self.project.id, event_id__in=event_ids - existing,
+        ).values_list('event_id', flat=True))
+        return existing
+
+    def prefetch_hashes(self, hash_lists):
+        hashes = set(itertools.chain.from_iterable(hash_lists)) - set(self.group_hashes)
+        if not hashes:
+            return
+        for group_hash in GroupHash.objects.filter(project=self.project, hash__in=hashes):
+            group_hash.project = self.project
+            self.group_hashes[group_hash.hash] = group_hash
+
+    def get_group_hash(self, hash):
+        try:
+            return self.group_hashes[hash]
+        except KeyError:
+            group_hash = self.group_hashes[hash] = GroupHash.objects.get_or_create(
+                project=self.project,
+                hash=hash,
+            )[0]
+            return group_hash
+
+    def add_event(self, event):
+        self.pending[id(event)] = PendingEvent(event)
+
+    def add_mapping(self, event, mapping):
+        self.pending[id(event)] = PendingEvent(event, mapping)
+
+    def add_publisher(self, event, publish):
+        self.pending[id(event)].publish = publish
+
+    def __len__(self):
+        return len(self.pending)
+
+    def commit(self):
+        """
+        Writes the rows and node data of all pending events and publishes the
+        events that were stored. Returns the list of stored events; events
+        that turned out to be duplicates are skipped, and events that could
+        not be written are logged and added to ``failed``.
+        """
+        pending, self.pending = list(self.pending.values()), OrderedDict()
+        if not pending:
+            return []
+
+        with metrics.timer('events.save_batch.commit'):
+            stored = self._save_mappings([p for p in pending if p.mapping is not None])
+            events = [p for p in pending if p.mapping is None]
+            try:
+                with transaction.atomic(using=router.db_for_write(Event)):
+                    with deferred_node_writes():
+                        stored.extend(self._save_events(events))
+            except Exception:
+                # the rows were rolled back (e.g. writing the node data
+                # failed), so retry every event on its own
+                logger.warning('save_event_batch.commit-failed', exc_info=True)
+                stored.extend(self._save_events_individually(events))
+
+        metrics.timing('events.save_batch.size', len(pending))
+        metrics.timing('events.save_batch.stored', len(stored))
+
+        for p in stored:
+            if p.publish is not None:
+                safe_execute(p.publish, _with_transaction=False)
+        return [p.event for p in stored]
+
+    def _log_duplicate(self, p, model):
+        logger.info(
+            'duplicate.found',
+            exc_info=True,
+            extra={
+                'event_uuid': p.event.event_id,
+                'project_id': self.project.id,
+                'group_id': p.event.group_id,
+                'model': model.__name__,
+            }
+        )
+
+    def _log_failure(self, p, model):
+        logger.error(
+            'save_event_batch.event-failed',
+            exc_info=True,
+            extra={
+                'event_uuid': p.event.event_id,
+                'project_id': self.project.id,
+                'model': model.__name__,
+            }
+        )
+        self.failed.append(p.event)
+
+    def _save_mappings(self, pending):
+        if not pending:
+            return []
+
+        using = router.db_for_write(EventMapping)
+        try:
+            with transaction.atomic(using=using):
+                EventMapping.objects.bulk_create([p.mapping for p in pending])
+            return pending
+        except DatabaseError:
+            pass
+
+        # at least one bad row, fall back to inserting them one by one
+        stored = []
+        for p in pending:
+            try:
+                with transaction.atomic(using=using):
+                    p.mapping.save()
+            except IntegrityError:
+                self._log_duplicate(p, EventMapping)
+            except DatabaseError:
+                self._log_failure(p, EventMapping)
+            else:
+                stored.append(p)
+        return stored
+
+    def _save_events(self, pending):
+        if not pending:
+            return []
+
+        using = router.db_for_write(Event)
+        if is_postgres(using) and len(pending) > 1:
+            try:
+                with transaction.atomic(using=using):
+                    self._bulk_insert_events([p.event for p in pending], using)
+                return pending
+            except DatabaseError:
+                pass
+
+        # at least one bad row, fall back to inserting them one by one
+        stored = []
+        for p in pending:
+            try:
+                with transaction.atomic(using=using):
+                    p.event.save()
+            except IntegrityError:
+                self._log_duplicate(p, Event)
+            except DatabaseError:
+                self._log_failure(p, Event)
+            else:
+                stored.append(p)
+        return stored
+
+    def _save_events_individually(self, pending):
+        using = router.db_for_write(Event)
+        stored = []
+        for p in pending:
+            # primary keys assigned by a rolled back insert are gone
+            p.event.pk = None
+            p.event._state.adding = True
+            try:
+                with transaction.atomic(using=using):
+                    with deferred_node_writes():
+                        p.event.save()
+            except IntegrityError:
+                self._log_duplicate(p, Event)
+            except Exception:
+                self._log_failure(p, Event)
+            else:
+                stored.append(p)
+        return stored
+
+    def _bulk_insert_events(self, events, using):
+        # ``bulk_create`` does not set primary keys, which are needed to
+        # publish the events, so this inserts the rows with ``RETURNING``.
+        connection = connections[using]
+        quote_name = connection.ops.quote_name
+        fields = [f for f in Event._meta.local_fields if f is not Event._meta.pk]
+
+        rows = []
+        params = []
+        for event in events:
+            rows.append('(%s)' % (', '.join(['%s'] * len(fields)), ))
+            for field in fields:
+                params.append(field.get_db_prep_save(
+                    field.pre_save(event, True),
+                    connection=connection,
+                ))
+
+        cursor = connection.cursor()
+        cursor.execute(
+            'INSERT INTO %s (%s) VALUES %s RETURNING %s' % (
+                quote_name(Event._meta.db_table),
+                ', '.join(quote_name(f.column) for f in fields),
+                ', '.join(rows),
+                quote_name(Event._meta.pk.column),
+            ), params
+        )
+        # rows are returned in the order of the VALUES list
+        for event, (pk, ) in zip(events, cursor.fetchall()):
+            event.pk = pk
+            event._state.adding = False
+            event._state.db = using
+
+
 class EventManager(object):
     """
     Handles normalization in both the store endpoint and the save task. The
@@ -806,7 +1054,30 @@ class EventManager(object):
 
         return trim(message.strip(), settings.SENTRY_MAX_MESSAGE_LENGTH)
 
-    def save(self, project_id, raw=False, assume_normalized=False):
+    def compute_hashes(self, project_id):
+        """
+        Calculates the grouping hashes of the (normalized) event ahead of
+        saving it, so that the hashes of several events can be looked up at
+        once. The hashes are stored in the event data and reused by ``save``.
+        """
+        normalize_in_app(self._data)
+        hashes = self._get_event_instance(project_id=project_id).get_hashes()
+        self._data['hashes'] = hashes
+        return hashes
+
+    def save(self, project_id, raw=False, assume_normalized=False, batch=None):
+        """
+        Saves the event. If an ``EventBatch`` is passed, writing the event
+        row and its node data and publishing the event are deferred until the
+        batch is committed.
+        """
+        # The Redis writes made while saving the event (TSDB counters, buffers
+        # and tags) are collected and flushed with one pipeline per host.
+        with write_batch():
+            return self._save(project_id, raw=raw, assume_normalized=assume_normalized,
+                              batch=batch)
+
+    def _save(self, project_id, raw=False, assume_normalized=False, batch=None):
         # Normalize if needed
         if not self._normalized:
             if not assume_normalized:
@@ -823,25 +1094,27 @@ class EventManager(object):
         # already been done if we've processed an event with this ID. (This
         # isn't a perfect solution -- this doesn't handle ``EventMapping`` and
         # there's a race condition between here and when the event is actually
-        # saved, but it's an improvement. See GH-7677.)
-        try:
-            event = Event.objects.get(
-                project_id=project.id,
-                event_id=data['event_id'],
-            )
-        except Event.DoesNotExist:
-            pass
-        else:
-            logger.info(
-                'duplicate.found',
-                exc_info=True,
-                extra={
-                    'event_uuid': data['event_id'],
-                    'project_id': project.id,
-                    'model': Event.__name__,
-                }
-            )
-            return event
+        # saved, but it's an improvement. See GH-7677.) Batches look up all of
+        # their events at once, see ``EventBatch.find_existing``.
+        if batch is None:
+            try:
+                event = Event.objects.get(
+                    project_id=project.id,
+                    event_id=data['event_id'],
+                )
+            except Event.DoesNotExist:
+                pass
+            else:
+                logger.info(
+                    'duplicate.found',
+                    exc_info=True,
+                    extra={
+                        'event_uuid': data['event_id'],
+                        'project_id': project.id,
+                        'model': Event.__name__,
+                    }
+                )
+                return event
 
         # Pull out the culprit
         culprit = self.get_culprit()
@@ -979,9 +1252,14 @@ class EventManager(object):
         if release:
             kwargs['first_release'] = release
 
+        # counters for the group and release are collected here and written
+        # to the buffer together once the event has been saved
+        buffer_incrs = []
+
         try:
             group, is_new, is_regression, is_sample = self._save_aggregate(
-                event=event, hashes=hashes, release=release, **kwargs
+                event=event, hashes=hashes, release=release, buffer_incrs=buffer_incrs,
+                batch=batch, **kwargs
             )
         except HashDiscarded:
             event_discarded.send_robust(
@@ -1014,7 +1292,9 @@ class EventManager(object):
         # Event row. Otherwise, if the Event isn't being sampled, we can safely
         # rely on the Event table itself as the source of truth and ignore
         # EventMapping since it's redundant information.
-        if is_sample:
+        if is_sample and batch is not None:
+            batch.add_mapping(event, EventMapping(project=project, group=group, event_id=event_id))
+        elif is_sample:
             try:
                 with transaction.atomic(using=router.db_for_write(EventMapping)):
                     EventMapping.objects.create(project=project, group=group, event_id=event_id)
@@ -1029,6 +1309,8 @@ class EventManager(object):
                         'model': EventMapping.__name__,
                     }
                 )
+                # the group was still seen, so keep counting it
+                buffer.incr_multi(buffer_incrs)
                 return event
 
         environment = Environment.get_or_create(
@@ -1114,7 +1396,9 @@ class EventManager(object):
         )
 
         # save the event unless its been sampled
-        if not is_sample:
+        if not is_sample and batch is not None:
+            batch.add_event(event)
+        elif not is_sample:
             try:
                 with transaction.atomic(using=router.db_for_write(Event)):
                     event.save()
@@ -1129,18 +1413,10 @@ class EventManager(object):
                         'model': Event.__name__,
                     }
                 )
+                # the group was still seen, so keep counting it
+                buffer.incr_multi(buffer_incrs)
                 return event
 
-            index_event_tags.delay(
-                organization_id=project.organization_id,
-                project_id=project.id,
-                group_id=group.id,
-                environment_id=environment.id,
-                event_id=event.id,
-                tags=tags,
-                date_added=event.datetime,
-            )
-
         if event_user:
             tsdb.record_multi(
                 (
@@ -1152,20 +1428,22 @@ class EventManager(object):
             )
         if release:
             if is_new:
-                buffer.incr(
+                buffer_incrs.append((
                     ReleaseProject, {'new_groups': 1}, {
                         'release_id': release.id,
                         'project_id': project.id,
-                    }
-                )
+                    }, None
+                ))
             if is_new_group_environment:
-                buffer.incr(
+                buffer_incrs.append((
                     ReleaseProjectEnvironment, {'new_issues_count': 1}, {
                         'project_id': project.id,
                         'release_id': release.id,
                         'environment_id': environment.id,
-                    }
-                )
+                    }, None
+                ))
+
+        buffer.incr_multi(buffer_incrs)
 
         safe_execute(Group.objects.add_tags, group, environment, tags, _with_transaction=False)
 
@@ -1174,29 +1452,50 @@ class EventManager(object):
                 project.update(first_event=date)
                 first_event_received.send_robust(project=project, group=group, sender=Project)
 
-        eventstream.insert(
-            group=group,
-            event=event,
-            is_new=is_new,
-            is_sample=is_sample,
-            is_regression=is_regression,
-            is_new_group_environment=is_new_group_environment,
-            primary_hash=hashes[0],
-            # We are choosing to skip consuming the event back
-            # in the eventstream if it's flagged as raw.
-            # This means that we want to publish the event
-            # through the event stream, but we don't care
-            # about post processing and handling the commit.
-            skip_consume=raw,
-        )
+        def publish():
+            if not is_sample:
+                index_event_tags.delay(
+                    organization_id=project.organization_id,
+                    project_id=project.id,
+                    group_id=group.id,
+                    environment_id=environment.id,
+                    event_id=event.id,
+                    tags=tags,
+                    date_added=event.datetime,
+                )
 
-        metrics.timing(
-            'events.latency',
-            received_timestamp - recorded_timestamp,
-            tags={
-                'project_id': project.id,
-            },
-        )
+            # post processing reads these counters, so they need to be written
+            # before the event is published
+            flush_current_batch()
+
+            eventstream.insert(
+                group=group,
+                event=event,
+                is_new=is_new,
+                is_sample=is_sample,
+                is_regression=is_regression,
+                is_new_group_environment=is_new_group_environment,
+                primary_hash=hashes[0],
+                # We are choosing to skip consuming the event back
+                # in the eventstream if it's flagged as raw.
+                # This means that we want to publish the event
+                # through the event stream, but we don't care
+                # about post processing and handling the commit.
+                skip_consume=raw,
+            )
+
+            metrics.timing(
+                'events.latency',
+                received_timestamp - recorded_timestamp,
+                tags={
+                    'project_id': project.id,
+                },
+            )
+
+        if batch is not None:
+            batch.add_publisher(event, publish)
+        else:
+            publish()
 
         return event
 
@@ -1244,7 +1543,10 @@ class EventManager(object):
                 default_cache.set(cache_key, e_userid, 3600)
         return euser
 
-    def _find_hashes(self, project, hash_list):
+    def _find_hashes(self, project, hash_list, batch=None):
+        if batch is not None:
+            return [batch.get_group_hash(hash) for hash in hash_list]
+
         return map(
             lambda hash: GroupHash.objects.get_or_create(
                 project=project,
@@ -1253,11 +1555,11 @@ class EventManager(object):
             hash_list,
         )
 
-    def _save_aggregate(self, event, hashes, release, **kwargs):
+    def _save_aggregate(self, event, hashes, release, buffer_incrs=None, batch=None, **kwargs):
         project = event.project
 
         # attempt to find a matching hash
-        all_hashes = self._find_hashes(project, hashes)
+        all_hashes = self._find_hashes(project, hashes, batch=batch)
 
         existing_group_id = None
         for h in all_hashes:
@@ -1317,6 +1619,11 @@ class EventManager(object):
                 state=GroupHash.State.LOCKED_IN_MIGRATION,
             ).update(group=group)
 
+            # the hashes may be looked up again by later events of a batch
+            for h in new_hashes:
+                if h.state != GroupHash.State.LOCKED_IN_MIGRATION:
+                    h.group_id = group.id
+
             if group_is_new and len(new_hashes) == len(all_hashes):
                 is_new = True
 
@@ -1336,6 +1643,7 @@ class EventManager(object):
                 event=event,
                 data=kwargs,
                 release=release,
+                buffer_incrs=buffer_incrs,
             )
         else:
             is_regression = False
@@ -1444,7 +1752,7 @@ class EventManager(object):
 
         return is_regression
 
-    def _process_existing_aggregate(self, group, event, data, release):
+    def _process_existing_aggregate(self, group, event, data, release, buffer_incrs=None):
         date = max(event.datetime, group.last_seen)
         extra = {
             'last_seen': date,
@@ -1466,8 +1774,13 @@ class EventManager(object):
             'times_seen': 1,
         }
 
-        buffer.incr(Group, update_kwargs, {
-            'id': group.id,
-        }, extra)
+        if buffer_incrs is not None:
+            buffer_incrs.append((Group, update_kwargs, {
+                'id': group.id,
+            }, extra))
+        else:
+            buffer.incr(Group, update_kwargs, {
+                'id': group.id,
+            }, extra)
 
         return is_regression
@@ -62,5 +62,6 @@ class EventStream(Service):
         pass
 
     def relay(self, consumer_group, commit_log_topic,
-              synchronize_commit_group, commit_batch_size=100, initial_offset_reset='latest'):
+              synchronize_commit_group, commit_batch_size=100, initial_offset_reset='latest',
+              worker_count=0, max_in_flight=100):
         raise RelayNotRequired
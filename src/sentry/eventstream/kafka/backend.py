@@ -14,8 +14,9 @@ from sentry.models import Organization
 from sentry.eventstream.base import EventStream
 from sentry.eventstream.kafka.consumer import SynchronizedConsumer
 from sentry.eventstream.kafka.protocol import get_task_kwargs_for_message
+from sentry.eventstream.kafka.worker import PartitionWorkerPool
 from sentry.tasks.post_process import post_process_group
-from sentry.utils import json
+from sentry.utils import json, metrics
 
 logger = logging.getLogger(__name__)
 
@@ -244,7 +245,20 @@ class KafkaEventStream(EventStream):
         )
 
     def relay(self, consumer_group, commit_log_topic,
-              synchronize_commit_group, commit_batch_size=100, initial_offset_reset='latest'):
+              synchronize_commit_group, commit_batch_size=100, initial_offset_reset='latest',
+              worker_count=0, max_in_flight=100):
+        """
+        Enqueues post-processing tasks for messages that have been committed
+        by the synchronized consumer group.
+
+        By default messages are processed one at a time in the consuming
+        thread. If ``worker_count`` is set, messages are instead handed to a
+        ``PartitionWorkerPool`` which processes partitions concurrently (while
+        keeping messages within a partition in order) with at most
+        ``max_in_flight`` unprocessed messages per partition. Offsets are only
+        committed up to the last message for which all preceding messages of
+        the partition have been processed.
+        """
         logger.debug('Starting relay...')
 
         consumer = SynchronizedConsumer(
@@ -257,6 +271,25 @@ class KafkaEventStream(EventStream):
 
         owned_partition_offsets = {}
 
+        def process_message(value):
+            task_kwargs = get_task_kwargs_for_message(value)
+            if task_kwargs is not None:
+                post_process_group.delay(**task_kwargs)
+
+        if worker_count:
+            pool = PartitionWorkerPool(
+                process_message,
+                worker_count=worker_count,
+                window=max_in_flight,
+            )
+        else:
+            pool = None
+
+        def update_offsets_from_pool():
+            for key, offset in pool.get_offsets().items():
+                if key in owned_partition_offsets:
+                    owned_partition_offsets[key] = offset
+
         def commit(partitions):
             results = consumer.commit(offsets=partitions, asynchronous=False)
 
@@ -295,6 +328,15 @@ class KafkaEventStream(EventStream):
         def on_revoke(consumer, partitions):
             logger.debug('Revoked partition assignment: %r', partitions)
 
+            if pool is not None:
+                # Wait for the in-flight messages of the revoked partitions
+                # so their offsets can be committed before another consumer
+                # picks them up.
+                keys = [(i.topic, i.partition) for i in partitions]
+                pool.drain(keys)
+                update_offsets_from_pool()
+                pool.forget(keys)
+
             offsets_to_commit = []
 
             for i in partitions:
@@ -329,6 +371,13 @@ class KafkaEventStream(EventStream):
         )
 
         def commit_offsets():
+            if pool is not None:
+                pool.check()
+                update_offsets_from_pool()
+                processed, in_flight = pool.get_stats()
+                metrics.incr('eventstream.relay.processed', amount=processed)
+                metrics.timing('eventstream.relay.in-flight', in_flight)
+
             offsets_to_commit = []
             for (topic, partition), offset in owned_partition_offsets.items():
                 if offset is None:
@@ -361,11 +410,11 @@ class KafkaEventStream(EventStream):
                     continue
 
                 i = i + 1
-                owned_partition_offsets[key] = message.offset() + 1
-
-                task_kwargs = get_task_kwargs_for_message(message.value())
-                if task_kwargs is not None:
-                    post_process_group.delay(**task_kwargs)
+                if pool is not None:
+                    pool.submit(key, message.offset(), message.value())
+                else:
+                    process_message(message.value())
+                    owned_partition_offsets[key] = message.offset() + 1
 
                 if i % commit_batch_size == 0:
                     commit_offsets()
@@ -373,6 +422,10 @@ class KafkaEventStream(EventStream):
             pass
 
         logger.debug('Committing offsets and closing consumer...')
+        if pool is not None:
+            pool.drain()
         commit_offsets()
 
         consumer.close()
+        if pool is not None:
+            pool.close()
@@ -0,0 +1,175 @@
+from __future__ import absolute_import
+
+import logging
+import sys
+import threading
+from Queue import Queue
+
+from six.moves import xrange
+
+
+logger = logging.getLogger(__name__)
+
+
+class PartitionState(object):
+    """
+    Tracks the messages of a single partition that have been submitted to a
+    ``PartitionWorkerPool`` but have not finished processing yet.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        # The offset of the next message that has not been processed, i.e. the
+        # offset that is safe to commit for this partition.
+        self.offset = None
+        self.error = None
+
+
+class PartitionWorkerPool(object):
+    """
+    Processes messages from several partitions concurrently while preserving
+    the order of messages within each partition.
+
+    Every partition is pinned to one of ``worker_count`` worker threads, so
+    messages from the same partition are always processed sequentially and in
+    the order they were submitted. At most ``window`` messages of a partition
+    may be in flight at any time; submitting more blocks until earlier
+    messages have been processed.
+
+    Since messages of a partition complete in order, the committable offset
+    of a partition is simply the offset following the most recently processed
+    message. A message that fails to process is never marked as completed, so
+    offsets are never committed past it.
+    """
+
+    def __init__(self, function, worker_count=4, window=100):
+        assert worker_count > 0 and window > 0
+        self.function = function
+        self.worker_count = worker_count
+        self.window = window
+
+        self.__partitions = {}
+        self.__lock = threading.Lock()
+        self.__queues = [Queue() for _ in xrange(worker_count)]
+        self.__workers = []
+        self.__processed = 0
+
+        for queue in self.__queues:
+            t = threading.Thread(target=self.__worker, args=(queue, ))
+            t.daemon = True
+            t.start()
+            self.__workers.append(t)
+
+    def __worker(self, queue):
+        while True:
+            item = queue.get(True)
+            if item is None:
+                return
+
+            state, offset, value = item
+            if state.error is None:
+                try:
+                    self.function(value)
+                except Exception:
+                    logger.exception('Failed to process message at offset %r', offset)
+                    state.error = sys.exc_info()
+                else:
+                    with self.__lock:
+                        self.__processed += 1
+
+            with state.condition:
+                if state.error is None:
+                    state.offset = offset + 1
+                state.in_flight -= 1
+                state.condition.notify_all()
+
+    def __get_state(self, key):
+        with self.__lock:
+            state = self.__partitions.get(key)
+            if state is None:
+                state = self.__partitions[key] = PartitionState(self.window)
+            return state
+
+    def __get_queue(self, key):
+        topic, partition = key
+        return self.__queues[hash((topic, partition)) % self.worker_count]
+
+    def submit(self, key, offset, value):
+        """
+        Enqueue the message at ``offset`` of the partition identified by
+        ``key`` (a ``(topic, partition)`` tuple) for processing, blocking
+        while the partition's in-flight window is full.
+        """
+        state = self.__get_state(key)
+        with state.condition:
+            while state.in_flight >= state.window and state.error is None:
+                state.condition.wait(0.1)
+            self.__raise_error(key, state)
+            state.in_flight += 1
+        self.__get_queue(key).put((state, offset, value))
+
+    def __raise_error(self, key, state):
+        if state.error is not None:
+            raise Exception('Failed to process message from %r: %r' % (key, state.error[1]))
+
+    def check(self):
+        """
+        Raises an exception if any message has failed to process.
+        """
+        with self.__lock:
+            partitions = list(self.__partitions.items())
+        for key, state in partitions:
+            self.__raise_error(key, state)
+
+    def drain(self, keys=None):
+        """
+        Block until all in-flight messages for the partitions identified by
+        ``keys`` (or every partition, if not provided) have finished.
+        """
+        with self.__lock:
+            if keys is None:
+                states = list(self.__partitions.values())
+            else:
+                states = [self.__partitions[k] for k in keys if k in self.__partitions]
+
+        for state in states:
+            with state.condition:
+                while state.in_flight > 0:
+                    state.condition.wait(0.1)
+
+    def get_offsets(self):
+        """
+        Returns a mapping of ``(topic, partition)`` to the offset that is safe
+        to commit, for all partitions that have processed at least one message.
+        """
+        with self.__lock:
+            partitions = list(self.__partitions.items())
+        return {key: state.offset for key, state in partitions if state.offset is not None}
+
+    def get_stats(self):
+        """
+        Returns the number of messages processed since the last call, and the
+        number of messages currently in flight.
+        """
+        with self.__lock:
+            processed, self.__processed = self.__processed, 0
+            partitions = list(self.__partitions.values())
+        return processed, sum(state.in_flight for state in partitions)
+
+    def forget(self, keys):
+        """
+        Stops tracking the partitions identified by ``keys``. This should only
+        be called after the partitions have been drained.
+        """
+        with self.__lock:
+            for key in keys:
+                self.__partitions.pop(key, None)
+
+    def close(self):
+        self.drain()
+        for queue in self.__queues:
+            queue.put(None)
+        for worker in self.__workers:
+            worker.join()
@@ -12,6 +12,22 @@ def is_utf8(codec):
     return name in ('utf-8', 'ascii')
 
 
+def make_source_view(source, encoding=None):
+    if isinstance(source, SourceView):
+        return source
+    if isinstance(source, text_type):
+        source = source.encode('utf-8')
+    # If an encoding is provided and it's not utf-8 compatible
+    # we try to re-encoding the source and create a source view
+    # from it.
+    elif encoding is not None and not is_utf8(encoding):
+        try:
+            source = source.decode(encoding).encode('utf-8')
+        except UnicodeError:
+            pass
+    return SourceView.from_bytes(source)
+
+
 class SourceCache(object):
     def __init__(self):
         self._cache = {}
@@ -40,20 +56,7 @@ class SourceCache(object):
 
     def add(self, url, source, encoding=None):
         url = self._get_canonical_url(url)
-
-        if not isinstance(source, SourceView):
-            if isinstance(source, text_type):
-                source = source.encode('utf-8')
-            # If an encoding is provided and it's not utf-8 compatible
-            # we try to re-encoding the source and create a source view
-            # from it.
-            elif encoding is not None and not is_utf8(encoding):
-                try:
-                    source = source.decode(encoding).encode('utf-8')
-                except UnicodeError:
-                    pass
-            source = SourceView.from_bytes(source)
-        self._cache[url] = source
+        self._cache[url] = make_source_view(source, encoding)
 
     def add_error(self, url, error):
         url = self._get_canonical_url(url)
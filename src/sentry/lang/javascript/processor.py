@@ -9,7 +9,10 @@ import base64
 import six
 import zlib
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
+from django.db import connections
 from os.path import splitext
 from requests.utils import get_encoding_from_headers
 from six.moves.urllib.parse import urljoin, urlsplit
@@ -31,11 +34,13 @@ from sentry.utils.cache import cache
 from sentry.utils.files import compress_file
 from sentry.utils.hashlib import md5_text
 from sentry.utils.http import is_valid_origin
+from sentry.utils.localcache import get_local_cache
 from sentry.utils.safe import get_path
 from sentry.utils import metrics
 from sentry.stacktraces import StacktraceProcessor
 
-from .cache import SourceCache, SourceMapCache
+from .cache import SourceCache, SourceMapCache, make_source_view
+from .sourcemapindex import get_sourcemap_index_id, load_sourcemap_index
 
 # number of surrounding lines (on each side) to fetch
 LINES_OF_CONTEXT = 5
@@ -64,6 +69,16 @@ CACHE_CONTROL_MIN = 60
 # the maximum number of remote resources (i.e. source files) that should be
 # fetched
 MAX_RESOURCE_FETCHES = 100
+# the maximum number of files that are scraped at the same time
+MAX_CONCURRENT_FETCHES = 10
+# parsed release artifacts are cached by checksum, so entries never go stale;
+# the TTL only releases memory held by releases which are no longer active
+VIEW_CACHE_MAX_ENTRIES = 1000
+VIEW_CACHE_TTL = 60 * 60
+# the headers and checksum of release artifacts are looked up through a short
+# lived cache, which bounds how long a replaced artifact can still be served
+ARTIFACT_CACHE_MAX_ENTRIES = 10000
+ARTIFACT_CACHE_TTL = 60
 
 logger = logging.getLogger(__name__)
 
@@ -200,6 +215,23 @@ def discover_sourcemap(result):
 
 
 def fetch_release_file(filename, release, dist=None):
+    artifact = _get_release_file(filename, release, dist)
+    if artifact is None:
+        return None
+
+    headers, z_body, body, encoding, _ = artifact
+    if body is None:
+        body = zlib.decompress(z_body)
+    return http.UrlResult(filename, headers, body, 200, encoding)
+
+
+def _get_release_file(filename, release, dist):
+    """
+    Returns ``(headers, z_body, body, encoding, checksum)`` for a release
+    artifact, or ``None`` if there is none. ``body`` is ``None`` if the
+    artifact was read from the cache, since only ``z_body`` is stored there,
+    and ``checksum`` is ``None`` for entries cached by older versions.
+    """
     cache_key = 'releasefile:v1:%s:%s' % (release.id, md5_text(filename).hexdigest(), )
 
     logger.debug('Checking cache for release artifact %r (release_id=%s)', filename, release.id)
@@ -255,23 +287,20 @@ def fetch_release_file(filename, release, dist=None):
         else:
             headers = {k.lower(): v for k, v in releasefile.file.headers.items()}
             encoding = get_encoding_from_headers(headers)
-            result = http.UrlResult(filename, headers, body, 200, encoding)
-            cache.set(cache_key, (headers, z_body, 200, encoding), 3600)
+            checksum = releasefile.file.checksum
+            result = (headers, z_body, body, encoding, checksum)
+            cache.set(cache_key, (headers, z_body, 200, encoding, checksum), 3600)
 
     elif result == -1:
         # We cached an error, so normalize
         # it down to None
         result = None
     else:
-        # Previous caches would be a 3-tuple instead of a 4-tuple,
-        # so this is being maintained for backwards compatibility
-        try:
-            encoding = result[3]
-        except IndexError:
-            encoding = None
-        result = http.UrlResult(
-            filename, result[0], zlib.decompress(result[1]), result[2], encoding
-        )
+        # Previous caches would be a 3-tuple (or 4-tuple) instead of a
+        # 5-tuple, so this is being maintained for backwards compatibility
+        encoding = result[3] if len(result) > 3 else None
+        checksum = result[4] if len(result) > 4 else None
+        result = (result[0], result[1], None, encoding, checksum)
 
     return result
 
@@ -282,6 +311,142 @@ def fetch_file(url, project=None, release=None, dist=None, allow_scraping=True):
 
     Attempts to fetch from the cache.
     """
+    result = _fetch_release_file(url, release, dist)
+    if result is None:
+        result = _scrape_file(url, project, allow_scraping)
+    return _validate_file(url, result)
+
+
+def fetch_files(urls, project=None, release=None, dist=None, allow_scraping=True):
+    """
+    Pull down several URLs, returning a list with either a UrlResult object
+    or the ``BadSource`` error raised for each URL, in the same order.
+
+    Release artifacts are read on the calling thread, since they are stored
+    in the database. The remaining files are scraped concurrently.
+    """
+    results = [None] * len(urls)
+    pending = []
+    for idx, url in enumerate(urls):
+        try:
+            result = _fetch_release_file(url, release, dist)
+            if result is None:
+                pending.append(idx)
+            else:
+                results[idx] = _validate_file(url, result)
+        except http.BadSource as exc:
+            results[idx] = exc
+
+    def scrape(url):
+        try:
+            return fetch_file(
+                url, project=project, release=None, dist=None, allow_scraping=allow_scraping
+            )
+        except http.BadSource as exc:
+            return exc
+
+    def scrape_in_thread(url):
+        try:
+            return scrape(url)
+        finally:
+            # Threads get their own database connections (e.g. to read
+            # project options) which would otherwise be left open.
+            for connection in connections.all():
+                connection.close()
+
+    if len(pending) < 2:
+        for idx in pending:
+            results[idx] = scrape(urls[idx])
+        return results
+
+    with metrics.timer('sourcemaps.fetch_concurrent'):
+        with ThreadPoolExecutor(max_workers=min(len(pending), MAX_CONCURRENT_FETCHES)) as executor:
+            scraped = executor.map(scrape_in_thread, [urls[idx] for idx in pending])
+            for idx, result in zip(pending, scraped):
+                results[idx] = result
+    return results
+
+
+def fetch_release_view(kind, url, release, dist, parse):
+    """
+    Returns ``parse(url, result)`` for the release artifact ``url``, or
+    ``None`` if there is no such artifact.
+
+    Parsed views are kept in a process wide cache keyed by the checksum of
+    the artifact, since the same artifacts are used by every event of a
+    release: a hit skips decompressing and parsing the artifact again. The
+    headers and checksum of the artifact are cached locally as well, so a hit
+    does not even fetch the artifact from the shared cache.
+    """
+    _check_truncated(url)
+    dist_name = dist and dist.name or None
+    artifacts = get_artifact_cache()
+    artifact_key = (release.id, dist_name, url)
+
+    artifact = None
+    meta = artifacts.get(artifact_key)
+    if meta is None:
+        with metrics.timer('sourcemaps.release_file'):
+            artifact = _get_release_file(url, release, dist)
+        if artifact is None:
+            return None
+        meta = (artifact[0], artifact[4])
+        if meta[1] is not None:
+            artifacts.set(artifact_key, meta)
+
+    headers, checksum = meta
+    views = get_view_cache()
+    if checksum is not None:
+        key = (kind, release.id, dist_name, url, checksum)
+        view = views.get(key)
+        if view is not None:
+            return view
+
+        if kind == 'sourcemap' and settings.SENTRY_SOURCEMAP_INDEX:
+            index_id = get_sourcemap_index_id(headers)
+            if index_id is not None:
+                view = load_sourcemap_index(index_id)
+            if view is not None:
+                metrics.incr('sourcemaps.index.hit')
+                views.set(key, view, weight=len(view))
+                return view
+            metrics.incr('sourcemaps.index.miss')
+
+    if artifact is None:
+        with metrics.timer('sourcemaps.release_file'):
+            artifact = _get_release_file(url, release, dist)
+        if artifact is None:
+            artifacts.delete(artifact_key)
+            return None
+
+    headers, z_body, body, encoding, checksum = artifact
+    if body is None:
+        body = zlib.decompress(z_body)
+    view = parse(url, _validate_file(url, http.UrlResult(url, headers, body, 200, encoding)))
+    if checksum is not None:
+        artifacts.set(artifact_key, (headers, checksum))
+        views.set((kind, release.id, dist_name, url, checksum), view, weight=len(body))
+    return view
+
+
+def get_artifact_cache():
+    return get_local_cache(
+        'sourcemaps.artifacts',
+        max_size=ARTIFACT_CACHE_MAX_ENTRIES,
+        ttl=ARTIFACT_CACHE_TTL,
+    )
+
+
+def get_view_cache():
+    return get_local_cache(
+        'sourcemaps.views',
+        max_size=VIEW_CACHE_MAX_ENTRIES,
+        ttl=VIEW_CACHE_TTL,
+        max_weight=settings.SENTRY_SOURCEMAP_VIEW_CACHE_SIZE,
+    )
+
+
+def _check_truncated(url):
     # If our url has been truncated, it'd be impossible to fetch
     # so we check for this early and bail
     if url[-3:] == '...':
@@ -291,36 +456,40 @@ def fetch_file(url, project=None, release=None, dist=None, allow_scraping=True):
                 'url': http.expose_url(url),
             }
         )
+
+
+def _fetch_release_file(url, release, dist):
+    _check_truncated(url)
     if release:
         with metrics.timer('sourcemaps.release_file'):
-            result = fetch_release_file(url, release, dist)
-    else:
-        result = None
+            return fetch_release_file(url, release, dist)
+    return None
 
-    cache_key = 'source:cache:v4:%s' % (md5_text(url).hexdigest(), )
 
-    if result is None:
-        if not allow_scraping or not url.startswith(('http:', 'https:')):
-            error = {
-                'type': EventError.JS_MISSING_SOURCE,
-                'url': http.expose_url(url),
-            }
-            raise http.CannotFetch(error)
+def _scrape_file(url, project, allow_scraping):
+    if not allow_scraping or not url.startswith(('http:', 'https:')):
+        error = {
+            'type': EventError.JS_MISSING_SOURCE,
+            'url': http.expose_url(url),
+        }
+        raise http.CannotFetch(error)
 
-        logger.debug('Checking cache for url %r', url)
-        result = cache.get(cache_key)
-        if result is not None:
-            # Previous caches would be a 3-tuple instead of a 4-tuple,
-            # so this is being maintained for backwards compatibility
-            try:
-                encoding = result[4]
-            except IndexError:
-                encoding = None
-            # We got a cache hit, but the body is compressed, so we
-            # need to decompress it before handing it off
-            result = http.UrlResult(
-                result[0], result[1], zlib.decompress(result[2]), result[3], encoding
-            )
+    cache_key = 'source:cache:v4:%s' % (md5_text(url).hexdigest(), )
+
+    logger.debug('Checking cache for url %r', url)
+    result = cache.get(cache_key)
+    if result is not None:
+        # Previous caches would be a 3-tuple instead of a 4-tuple,
+        # so this is being maintained for backwards compatibility
+        try:
+            encoding = result[4]
+        except IndexError:
+            encoding = None
+        # We got a cache hit, but the body is compressed, so we
+        # need to decompress it before handing it off
+        result = http.UrlResult(
+            result[0], result[1], zlib.decompress(result[2]), result[3], encoding
+        )
 
     if result is None:
         headers = {}
@@ -344,6 +513,10 @@ def fetch_file(url, project=None, release=None, dist=None, allow_scraping=True):
                  result.encoding),
                 get_max_age(result.headers))
 
+    return result
+
+
+def _validate_file(url, result):
     # If we did not get a 200 OK we just raise a cannot fetch here.
     if result.status != 200:
         raise http.CannotFetch(
@@ -419,6 +592,10 @@ def fetch_sourcemap(url, project=None, release=None, dist=None, allow_scraping=T
             url, project=project, release=release, dist=dist, allow_scraping=allow_scraping
         )
         body = result.body
+    return parse_sourcemap(url, body)
+
+
+def parse_sourcemap(url, body):
     try:
         return SourceMapView.from_json_bytes(body)
     except Exception as exc:
@@ -429,6 +606,10 @@ def fetch_sourcemap(url, project=None, release=None, dist=None, allow_scraping=T
         })
 
 
+def parse_source(url, result):
+    return make_source_view(result.body, result.encoding), discover_sourcemap(result), result.url
+
+
 def is_data_uri(url):
     return url[:BASE64_PREAMBLE_LENGTH] == BASE64_SOURCEMAP_PREAMBLE
 
@@ -758,66 +939,123 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
         return self.cache.get(filename)
 
     def cache_source(self, filename):
+        self.cache_sources([filename])
+
+    def cache_sources(self, filenames):
+        """
+        Fetches the given files and their sourcemaps into the caches.
+
+        All files are fetched concurrently, followed by all of the sourcemaps
+        they link to, but results are added to the caches in the order of
+        ``filenames``, so the outcome does not depend on timing.
+        """
         sourcemaps = self.sourcemaps
         cache = self.cache
 
-        self.fetch_count += 1
+        pending = []
+        for filename in filenames:
+            self.fetch_count += 1
 
-        if self.fetch_count > self.max_fetches:
-            cache.add_error(filename, {
-                'type': EventError.JS_TOO_MANY_REMOTE_SOURCES,
-            })
-            return
+            if self.fetch_count > self.max_fetches:
+                cache.add_error(filename, {
+                    'type': EventError.JS_TOO_MANY_REMOTE_SOURCES,
+                })
+                continue
 
-        # TODO: respect cache-control/max-age headers to some extent
-        logger.debug('Fetching remote source %r', filename)
-        try:
-            result = fetch_file(
-                filename,
-                project=self.project,
-                release=self.release,
-                dist=self.dist,
-                allow_scraping=self.allow_scraping
-            )
-        except http.BadSource as exc:
-            cache.add_error(filename, exc.data)
-            return
+            # TODO: respect cache-control/max-age headers to some extent
+            logger.debug('Fetching remote source %r', filename)
+            pending.append(filename)
 
-        cache.add(filename, result.body, result.encoding)
-        cache.alias(result.url, filename)
+        sources = self.fetch_views('source', pending, parse_source)
 
-        sourcemap_url = discover_sourcemap(result)
-        if not sourcemap_url:
-            return
+        # sourcemap url -> files linking to it
+        linked = OrderedDict()
+        for filename in pending:
+            source = sources[filename]
+            if isinstance(source, http.BadSource):
+                cache.add_error(filename, source.data)
+                continue
 
-        logger.debug('Found sourcemap %r for minified script %r', sourcemap_url[:256], result.url)
-        sourcemaps.link(filename, sourcemap_url)
-        if sourcemap_url in sourcemaps:
-            return
+            source_view, sourcemap_url, url = source
+            cache.add(filename, source_view)
+            cache.alias(url, filename)
 
-        # pull down sourcemap
-        try:
-            sourcemap_view = fetch_sourcemap(
-                sourcemap_url,
-                project=self.project,
-                release=self.release,
-                dist=self.dist,
-                allow_scraping=self.allow_scraping,
-            )
-        except http.BadSource as exc:
-            cache.add_error(filename, exc.data)
-            return
+            if not sourcemap_url:
+                continue
 
-        sourcemaps.add(sourcemap_url, sourcemap_view)
+            logger.debug('Found sourcemap %r for minified script %r', sourcemap_url[:256], url)
+            sourcemaps.link(filename, sourcemap_url)
+            if sourcemap_url in sourcemaps:
+                continue
 
-        # cache any inlined sources
-        for src_id, source_name in sourcemap_view.iter_sources():
-            source_view = sourcemap_view.get_sourceview(src_id)
-            if source_view is not None:
-                self.cache.add(
-                    urljoin(sourcemap_url, source_name),
-                    source_view
-                )
+            linked.setdefault(sourcemap_url, []).append(filename)
+
+        # pull down sourcemaps
+        sourcemap_urls = [link for link in linked if not is_data_uri(link)]
+        sourcemap_views = self.fetch_views(
+            'sourcemap',
+            sourcemap_urls,
+            lambda url, result: parse_sourcemap(url, result.body),
+        )
+
+        for sourcemap_url, linked_filenames in six.iteritems(linked):
+            try:
+                if is_data_uri(sourcemap_url):
+                    sourcemap_view = fetch_sourcemap(sourcemap_url)
+                else:
+                    sourcemap_view = sourcemap_views[sourcemap_url]
+                    if isinstance(sourcemap_view, http.BadSource):
+                        raise sourcemap_view
+            except http.BadSource as exc:
+                for filename in linked_filenames:
+                    cache.add_error(filename, exc.data)
+                continue
+
+            sourcemaps.add(sourcemap_url, sourcemap_view)
+
+            # cache any inlined sources
+            for src_id, source_name in sourcemap_view.iter_sources():
+                source_view = sourcemap_view.get_sourceview(src_id)
+                if source_view is not None:
+                    self.cache.add(
+                        urljoin(sourcemap_url, source_name),
+                        source_view
+                    )
+
+    def fetch_views(self, kind, urls, parse):
+        """
+        Returns a mapping of each URL to ``parse(url, result)``, or to the
+        ``BadSource`` error raised while fetching or parsing it.
+
+        Release artifacts are parsed through the process wide view cache,
+        and all other files are scraped concurrently.
+        """
+        views = {}
+        pending = []
+        for url in urls:
+            if self.release:
+                try:
+                    view = fetch_release_view(kind, url, self.release, self.dist, parse)
+                except http.BadSource as exc:
+                    view = exc
+                if view is not None:
+                    views[url] = view
+                    continue
+            pending.append(url)
+
+        results = fetch_files(
+            pending,
+            project=self.project,
+            allow_scraping=self.allow_scraping,
+        )
+        for url, result in zip(pending, results):
+            if not isinstance(result, http.BadSource):
+                try:
+                    result = parse(url, result)
+                except http.BadSource as exc:
+                    result = exc
+            views[url] = result
+        return views
 
     def populate_source_cache(self, frames):
         """
@@ -841,10 +1079,7 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
                 continue
             pending_file_list.add(f['abs_path'])
 
-        for idx, filename in enumerate(pending_file_list):
-            self.cache_source(
-                filename=filename,
-            )
+        self.cache_sources(sorted(pending_file_list))
 
     def close(self):
         StacktraceProcessor.close(self)
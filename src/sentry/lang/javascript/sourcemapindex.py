@@ -0,0 +1,571 @@
+"""
+sentry.lang.javascript.sourcemapindex
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+A compact binary index of a sourcemap, built when the sourcemap is uploaded
+so that frames can be resolved at processing time without parsing JSON.
+
+The tokens of every line of the minified file are sorted and split into
+blocks of up to ``BLOCK_SIZE`` tokens, which are encoded as varints relative
+to the previous token of the block. A line table holds the first block of
+every line and a block table the first column and offset of every block, so
+a lookup only has to decode a single block. The index consists of::
+
+    header  | magic, line count, block count, source count, name count,
+            | size of the token blocks
+    lines   | first block of each line (plus the total block count)
+    blocks  | dst_col of the first token, offset into the token blocks
+    sources | name offset, name length, content offset, content length
+    names   | offset, length
+    tokens  | token blocks
+    strings | UTF-8 source names, embedded sources and names
+
+Only the header, the line and block tables and the source table are read
+when an index is opened, everything else is read from the file on demand.
+
+:copyright: (c) 2010-2018 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import
+
+import re
+import struct
+import sys
+import tempfile
+import threading
+
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+
+import six
+from symbolic import SourceView
+
+from sentry.models import File
+from sentry.utils import json
+
+__all__ = (
+    'SourceMapIndex', 'build_sourcemap_index', 'delete_sourcemap_index', 'get_sourcemap_index_id',
+    'load_sourcemap_index', 'store_sourcemap_index', 'write_sourcemap_index',
+)
+
+INDEX_FILE_TYPE = 'release.sourcemap-index'
+
+# The header of a sourcemap file holding the id of its index file
+INDEX_HEADER = 'X-Sentry-Sourcemap-Index'
+
+MAGIC = b'SMI2'
+HEADER = struct.Struct('<4sIIIII')
+SOURCE = struct.Struct('<IIII')
+NAME = struct.Struct('<II')
+NONE = 0xFFFFFFFF
+
+# the maximum number of tokens in a block
+BLOCK_SIZE = 64
+
+# token flags, stored in the lowest bits of the column delta
+HAS_SOURCE = 1
+HAS_NAME = 2
+
+# the number of tokens searched backwards for the original function name
+FUNCTION_NAME_MAX_TOKENS = 128
+
+BASE64_VALUES = {
+    c: i for i, c in enumerate('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/')
+}
+IDENTIFIER_RE = re.compile(r'[\w$]+', re.UNICODE)
+
+SourceMapTokenMatch = namedtuple(
+    'SourceMapTokenMatch',
+    'src_line src_col dst_line dst_col src_id name src function_name',
+)
+
+
+def decode_vlq(segment):
+    values = []
+    value = shift = 0
+    for char in segment:
+        digit = BASE64_VALUES[char]
+        value += (digit & 31) << shift
+        if digit & 32:
+            shift += 5
+        else:
+            values.append(-(value >> 1) if value & 1 else value >> 1)
+            value = shift = 0
+    return values
+
+
+def iter_split(value, separator):
+    # Like ``value.split(separator)``, without creating all parts up front.
+    start = 0
+    while True:
+        end = value.find(separator, start)
+        if end < 0:
+            yield value[start:]
+            return
+        yield value[start:end]
+        start = end + 1
+
+
+def parse_mappings(mappings):
+    """
+    Yields the tokens of every line of ``mappings`` as a list of
+    ``(dst_col, src_line, src_col, src_id, name_id)``, in the order they
+    appear. ``src_id`` and ``name_id`` are ``NONE`` for segments without a
+    source or name.
+    """
+    src_id = src_line = src_col = name_id = 0
+    for line in iter_split(mappings, ';'):
+        tokens = []
+        dst_col = 0
+        for segment in iter_split(line, ','):
+            if not segment:
+                continue
+            values = decode_vlq(segment)
+            dst_col += values[0]
+            if len(values) < 4:
+                tokens.append((dst_col, 0, 0, NONE, NONE))
+                continue
+            src_id += values[1]
+            src_line += values[2]
+            src_col += values[3]
+            if len(values) > 4:
+                name_id += values[4]
+                tokens.append((dst_col, src_line, src_col, src_id, name_id))
+            else:
+                tokens.append((dst_col, src_line, src_col, src_id, NONE))
+        yield tokens
+
+
+def get_source_names(data):
+    sources = [source or u'' for source in data.get('sources') or ()]
+    source_root = (data.get('sourceRoot') or u'').rstrip(u'/')
+    if not source_root:
+        return sources
+    return [
+        source if source.startswith((u'/', u'http:', u'https:')) else
+        u'{}/{}'.format(source_root, source) for source in sources
+    ]
+
+
+def write_varint(out, value):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def write_signed_varint(out, value):
+    write_varint(out, value << 1 if value >= 0 else (-value << 1) - 1)
+
+
+def read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def read_signed_varint(data, pos):
+    value, pos = read_varint(data, pos)
+    return -((value + 1) >> 1) if value & 1 else value >> 1, pos
+
+
+def decode_block(data, dst_line):
+    """
+    Returns the tokens encoded in ``data`` as
+    ``(dst_line, dst_col, src_line, src_col, src_id, name_id)``.
+    """
+    data = bytearray(data)
+    tokens = []
+    pos = dst_col = src_line = src_col = src_id = name_id = 0
+    while pos < len(data):
+        value, pos = read_varint(data, pos)
+        dst_col += value >> 2
+        if not value & HAS_SOURCE:
+            tokens.append((dst_line, dst_col, 0, 0, NONE, NONE))
+            continue
+        delta, pos = read_signed_varint(data, pos)
+        src_id += delta
+        delta, pos = read_signed_varint(data, pos)
+        src_line += delta
+        delta, pos = read_signed_varint(data, pos)
+        src_col += delta
+        if value & HAS_NAME:
+            delta, pos = read_signed_varint(data, pos)
+            name_id += delta
+            tokens.append((dst_line, dst_col, src_line, src_col, src_id, name_id))
+        else:
+            tokens.append((dst_line, dst_col, src_line, src_col, src_id, NONE))
+    return tokens
+
+
+def _array_to_bytes(values):
+    # indexes are little endian, like the rest of the format
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tostring()
+
+
+def _array_from_bytes(data):
+    values = array('I')
+    values.fromstring(data)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def write_sourcemap_index(body, fp):
+    """
+    Writes the index of the JSON sourcemap ``body`` to ``fp``, raising
+    ``ValueError`` if it isn't a sourcemap (or is an indexed sourcemap with
+    sections.)
+
+    Tokens are encoded line by line, so apart from the sourcemap only the
+    tokens of a single line are held as Python objects.
+    """
+    data = json.loads(body)
+    if not isinstance(data, dict) or 'mappings' not in data:
+        raise ValueError('not a sourcemap')
+    if 'sections' in data:
+        raise ValueError('indexed sourcemaps are not supported')
+
+    strings = bytearray()
+
+    def add_string(value):
+        value = value.encode('utf-8')
+        offset = len(strings)
+        strings.extend(value)
+        return offset, len(value)
+
+    sources = bytearray()
+    source_count = 0
+    contents = data.get('sourcesContent') or ()
+    for idx, name in enumerate(get_source_names(data)):
+        content = contents[idx] if idx < len(contents) else None
+        name_offset, name_length = add_string(name)
+        if content is None:
+            content_offset, content_length = 0, NONE
+        else:
+            content_offset, content_length = add_string(content)
+        sources.extend(SOURCE.pack(name_offset, name_length, content_offset, content_length))
+        source_count += 1
+
+    names = bytearray()
+    name_count = 0
+    for name in data.get('names') or ():
+        names.extend(NAME.pack(*add_string(name or u'')))
+        name_count += 1
+
+    lines = array('I')
+    blocks = array('I')
+    tokens = bytearray()
+    try:
+        for line_tokens in parse_mappings(data['mappings']):
+            lines.append(len(blocks) // 2)
+            line_tokens.sort()
+            for idx, (dst_col, src_line, src_col, src_id, name_id) in enumerate(line_tokens):
+                if idx % BLOCK_SIZE == 0:
+                    blocks.append(dst_col)
+                    blocks.append(len(tokens))
+                    prev_col = prev_src_line = prev_src_col = prev_src_id = prev_name_id = 0
+
+                if src_id == NONE:
+                    write_varint(tokens, (dst_col - prev_col) << 2)
+                    prev_col = dst_col
+                    continue
+                if not 0 <= src_id < source_count:
+                    raise ValueError('invalid source reference')
+                if src_line < 0 or src_col < 0:
+                    raise ValueError('invalid token position')
+
+                flags = HAS_SOURCE
+                if name_id != NONE:
+                    if not 0 <= name_id < name_count:
+                        raise ValueError('invalid name reference')
+                    flags |= HAS_NAME
+
+                write_varint(tokens, (dst_col - prev_col) << 2 | flags)
+                write_signed_varint(tokens, src_id - prev_src_id)
+                write_signed_varint(tokens, src_line - prev_src_line)
+                write_signed_varint(tokens, src_col - prev_src_col)
+                prev_col, prev_src_line, prev_src_col, prev_src_id = \
+                    dst_col, src_line, src_col, src_id
+                if flags & HAS_NAME:
+                    write_signed_varint(tokens, name_id - prev_name_id)
+                    prev_name_id = name_id
+        lines.append(len(blocks) // 2)
+    except OverflowError:
+        # negative or too large columns don't fit the block table
+        raise ValueError('invalid token position')
+
+    fp.write(HEADER.pack(
+        MAGIC, len(lines) - 1, len(blocks) // 2, source_count, name_count, len(tokens),
+    ))
+    fp.write(_array_to_bytes(lines))
+    fp.write(_array_to_bytes(blocks))
+    for part in (sources, names, tokens, strings):
+        fp.write(bytes(part))
+
+
+def build_sourcemap_index(body):
+    """
+    Returns the index of the JSON sourcemap ``body``, see
+    ``write_sourcemap_index``.
+    """
+    fp = six.BytesIO()
+    write_sourcemap_index(body, fp)
+    return fp.getvalue()
+
+
+class SourceMapIndex(object):
+    """
+    Resolves tokens from a sourcemap index, with the parts of the interface
+    of ``symbolic.SourceMapView`` used by the JavaScript processor.
+
+    ``fp`` is a seekable file object holding the index. Lookups read the
+    blocks, names and sources they need from it, so the memory used by an
+    index (see ``__len__``) only depends on the number of lines, blocks and
+    sources in the sourcemap.
+    """
+
+    def __init__(self, fp):
+        self.fp = fp
+        self._lock = threading.Lock()
+
+        header = self._read(0, HEADER.size)
+        if len(header) != HEADER.size:
+            raise ValueError('not a sourcemap index')
+        magic, self.line_count, self.block_count, self.source_count, self.name_count, \
+            self.tokens_size = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError('not a sourcemap index')
+
+        offset = HEADER.size
+        self.lines = self._read_array(offset, self.line_count + 1)
+        offset += len(self.lines) * 4
+        # the first column and offset of every block, interleaved
+        self.blocks = self._read_array(offset, self.block_count * 2)
+        offset += len(self.blocks) * 4
+        sources = self._read(offset, self.source_count * SOURCE.size)
+        if len(sources) != self.source_count * SOURCE.size:
+            raise ValueError('truncated sourcemap index')
+        self.sources = [
+            SOURCE.unpack_from(sources, src_id * SOURCE.size)
+            for src_id in six.moves.range(self.source_count)
+        ]
+        offset += len(sources)
+        self.names_offset = offset
+        self.tokens_offset = self.names_offset + self.name_count * NAME.size
+        self.strings_offset = self.tokens_offset + self.tokens_size
+
+    def __len__(self):
+        return (
+            HEADER.size + (len(self.lines) + len(self.blocks)) * 4 +
+            self.source_count * SOURCE.size
+        )
+
+    def _read(self, offset, size):
+        with self._lock:
+            self.fp.seek(offset)
+            return self.fp.read(size)
+
+    def _read_array(self, offset, count):
+        data = self._read(offset, count * 4)
+        if len(data) != count * 4:
+            raise ValueError('truncated sourcemap index')
+        return _array_from_bytes(data)
+
+    def _get_block_line(self, block):
+        return bisect_right(self.lines, block) - 1
+
+    def get_block(self, block):
+        """
+        Returns the tokens of a block as
+        ``(dst_line, dst_col, src_line, src_col, src_id, name_id)``.
+        """
+        start = self.blocks[block * 2 + 1]
+        if block + 1 < self.block_count:
+            end = self.blocks[block * 2 + 3]
+        else:
+            end = self.tokens_size
+        return decode_block(
+            self._read(self.tokens_offset + start, end - start),
+            self._get_block_line(block),
+        )
+
+    def iter_tokens(self):
+        for block in six.moves.range(self.block_count):
+            for token in self.get_block(block):
+                yield token
+
+    def _find_block(self, line, col):
+        # Returns the last block starting at or before ``(line, col)``, which
+        # is the last block of a previous line if there is none in ``line``.
+        if line >= self.line_count:
+            return self.block_count - 1
+        lo, hi = self.lines[line], self.lines[line + 1]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if col < self.blocks[mid * 2]:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo - 1
+
+    def _get_string(self, offset, length):
+        return self._read(self.strings_offset + offset, length).decode('utf-8')
+
+    def get_source_name(self, src_id):
+        name_offset, name_length, _, _ = self.sources[src_id]
+        return self._get_string(name_offset, name_length)
+
+    def get_name(self, name_id):
+        if name_id == NONE:
+            return None
+        return self._get_string(*NAME.unpack(
+            self._read(self.names_offset + name_id * NAME.size, NAME.size)))
+
+    def iter_sources(self):
+        for src_id in six.moves.range(self.source_count):
+            yield src_id, self.get_source_name(src_id)
+
+    def get_sourceview(self, src_id):
+        _, _, content_offset, content_length = self.sources[src_id]
+        if content_length == NONE:
+            return None
+        return SourceView.from_bytes(
+            self._read(self.strings_offset + content_offset, content_length))
+
+    def lookup(self, line, col, minified_name=None, minified_source=None):
+        block = self._find_block(line, col)
+        if block < 0:
+            return None
+
+        tokens = self.get_block(block)
+        if tokens[0][0] < line:
+            idx = len(tokens) - 1
+        else:
+            idx = bisect_right([token[1] for token in tokens], col) - 1
+
+        dst_line, dst_col, src_line, src_col, src_id, name_id = tokens[idx]
+        if src_id == NONE:
+            return None
+
+        function_name = None
+        if minified_name is not None and minified_source is not None:
+            function_name = self.get_original_function_name(
+                block, tokens, idx, minified_name, minified_source)
+
+        return SourceMapTokenMatch(
+            src_line, src_col, dst_line, dst_col, src_id, self.get_name(name_id),
+            self.get_source_name(src_id), function_name,
+        )
+
+    def get_original_function_name(self, block, tokens, idx, minified_name, minified_source):
+        """
+        Returns the original name of ``minified_name`` by looking for the
+        closest preceding token where it appears in the minified source,
+        starting at token ``idx`` of ``block``.
+        """
+        remaining = FUNCTION_NAME_MAX_TOKENS
+        while True:
+            candidates = tokens[max(idx + 1 - remaining, 0):idx + 1]
+            for dst_line, dst_col, _, _, _, name_id in reversed(candidates):
+                if name_id == NONE:
+                    continue
+                try:
+                    line = minified_source[dst_line]
+                except IndexError:
+                    continue
+                match = IDENTIFIER_RE.match(line, dst_col)
+                if match is not None and match.group() == minified_name:
+                    return self.get_name(name_id)
+
+            remaining -= len(candidates)
+            block -= 1
+            if remaining <= 0 or block < 0:
+                return None
+            tokens = self.get_block(block)
+            idx = len(tokens) - 1
+
+
+def get_sourcemap_index_id(headers):
+    """
+    Returns the id of the index file referenced by the ``headers`` of a
+    sourcemap file, or ``None`` if it hasn't been indexed.
+    """
+    for key, value in six.iteritems(headers or {}):
+        if key.lower() == INDEX_HEADER.lower():
+            return int(value)
+    return None
+
+
+def store_sourcemap_index(sourcemap_file):
+    """
+    Builds and stores the index of ``sourcemap_file`` unless it exists
+    already, and references it in the headers of the sourcemap file.
+    Returns the index file, or ``None`` if the file isn't a sourcemap that
+    can be indexed.
+    """
+    index_id = get_sourcemap_index_id(sourcemap_file.headers)
+    if index_id is not None:
+        index_file = File.objects.filter(id=index_id, type=INDEX_FILE_TYPE).first()
+        if index_file is not None:
+            return index_file
+
+    with sourcemap_file.getfile() as fp:
+        body = fp.read()
+
+    # the index is written to disk and streamed into the file from there
+    with tempfile.TemporaryFile() as index:
+        try:
+            write_sourcemap_index(body, index)
+        except ValueError:
+            return None
+        index.seek(0)
+
+        index_file = File.objects.create(
+            name=u'{}.index'.format(sourcemap_file.name),
+            type=INDEX_FILE_TYPE,
+            headers={'Content-Type': 'application/octet-stream'},
+        )
+        index_file.putfile(index)
+
+    headers = dict(sourcemap_file.headers or {})
+    headers[INDEX_HEADER] = index_file.id
+    sourcemap_file.update(headers=headers)
+    return index_file
+
+
+def delete_sourcemap_index(sourcemap_file):
+    """
+    Deletes the index of ``sourcemap_file``, if it has one.
+    """
+    index_id = get_sourcemap_index_id(sourcemap_file.headers)
+    if index_id is not None:
+        File.objects.filter(id=index_id, type=INDEX_FILE_TYPE).delete()
+
+
+def load_sourcemap_index(index_id):
+    """
+    Returns the ``SourceMapIndex`` stored in the index file ``index_id``, or
+    ``None`` if it doesn't exist or can't be read. The file isn't downloaded,
+    lookups read the parts of it they need.
+    """
+    index_file = File.objects.filter(id=index_id, type=INDEX_FILE_TYPE).first()
+    if index_file is None:
+        return None
+
+    fp = index_file.getfile()
+    try:
+        return SourceMapIndex(fp)
+    except ValueError:
+        # e.g. an index written in an older format
+        fp.close()
+        return None
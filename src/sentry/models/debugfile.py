@@ -19,8 +19,10 @@ import hashlib
 import logging
 import tempfile
 
+from concurrent.futures import ThreadPoolExecutor
 from jsonfield import JSONField
-from django.db import models, transaction, IntegrityError
+from django.conf import settings
+from django.db import connections, models, transaction, IntegrityError
 from django.db.models.fields.related import OneToOneRel
 
 from symbolic import FatObject, SymbolicError, ObjectErrorUnsupportedObject, \
@@ -38,24 +40,60 @@ from sentry.reprocessing import resolve_processing_issue, \
     bump_reprocessing_revision
 from sentry.utils import metrics
 from sentry.utils.db import mysql_disabled_integrity
+from sentry.utils.localcache import get_local_cache
+from sentry.utils.locking import UnableToAcquireLock
+from sentry.utils.retries import RetryException, TimedRetryPolicy
 from sentry.utils.zip import safe_extract_zip
 from sentry.utils.decorators import classproperty
 
 
 logger = logging.getLogger(__name__)
 
-ONE_DAY = 60 * 60 * 24
+ONE_HOUR = 60 * 60
+ONE_DAY = ONE_HOUR * 24
 ONE_DAY_AND_A_HALF = int(ONE_DAY * 1.5)
 
 # How long we cache a conversion failure by checksum in cache.  Currently
 # 10 minutes is assumed to be a reasonable value here.
 CONVERSION_ERROR_TTL = 60 * 10
 
+# Conversions of a debug file are locked, so that concurrent workers don't
+# download and convert the same file. The lock expires after the duration in
+# case a worker dies. Event processing waits for the timeout before giving up
+# and converting the file anyway.
+CONVERSION_LOCK_DURATION = 60 * 5
+CONVERSION_LOCK_TIMEOUT = 30
+
 DIF_MIMETYPES = dict((v, k) for k, v in KNOWN_DIF_TYPES.items())
 
 _proguard_file_re = re.compile(r'/proguard/(?:mapping-)?(.*?)\.txt$')
 
 
+def get_cache_handles():
+    """Returns the process wide pool of open symcaches and cficaches. Caches
+    are memory mapped, so the pool is bounded by the number of open files and
+    the sum of their sizes.
+    """
+    return get_local_cache(
+        'difcache.handles',
+        max_size=settings.SENTRY_DIF_CACHE_MAX_OPEN,
+        ttl=ONE_DAY,
+        max_weight=settings.SENTRY_DIF_CACHE_MAX_MAPPED,
+    )
+
+
+def get_resolved_caches():
+    """Returns the process wide mapping of debug ids to their debug file and
+    up-to-date cache file model, so that events referencing the same images
+    don't query the database every time.
+    """
+    return get_local_cache('difcache.resolved', ttl=settings.SENTRY_DIF_CACHE_RESOLVE_TTL)
+
+
+def _get_resolved_key(project_id, cls, debug_id):
+    return u'%s:%s:%s' % (project_id, cls.cache_name, debug_id)
+
+
 def _get_idempotency_id(project, checksum):
     """For some operations an idempotency ID is needed."""
     return hashlib.sha1(b'%s|%s|project.dsym' % (
@@ -230,6 +268,10 @@ class ProjectDebugFile(Model):
 
         self.file.delete()
 
+        resolved = get_resolved_caches()
+        for cls in (ProjectSymCacheFile, ProjectCfiCacheFile):
+            resolved.invalidate(_get_resolved_key(self.project_id, cls, self.debug_id))
+
 
 class ProjectCacheFile(Model):
     """Abstract base class for all debug cache files."""
@@ -557,6 +599,15 @@ def create_files_from_dif_zip(fileobj, project, update_caches=True):
         shutil.rmtree(scratchpad)
 
 
+def _record_conversion(cls, path, duration):
+    tags = {'type': cls.cache_name}
+    size = os.path.getsize(path)
+    metrics.timing('difcache.conversion.duration', duration, tags=tags)
+    metrics.timing('difcache.conversion.size', size, tags=tags)
+    if duration > 0:
+        metrics.timing('difcache.conversion.throughput', size / duration, tags=tags)
+
+
 class DIFCache(object):
     @property
     def cache_path(self):
@@ -568,10 +619,17 @@ class DIFCache(object):
     def update_caches(self, project, debug_ids):
         """Updates symcaches and cficaches for all debug files matching the
         given debug ids, if the respective files support any of those caches.
+        Each debug file is downloaded once and converted to all of its missing
+        caches. Files that are being converted by another worker are skipped.
         """
-        # XXX: Worst case, this might download the same DIF twice.
-        self._get_caches_impl(project, debug_ids, ProjectSymCacheFile)
-        self._get_caches_impl(project, debug_ids, ProjectCfiCacheFile)
+        jobs = {}
+        for cls in (ProjectSymCacheFile, ProjectCfiCacheFile):
+            _, to_update = self._find_caches(project, debug_ids, cls)
+            for debug_file in to_update:
+                jobs.setdefault(debug_file.id, (debug_file, []))[1].append(cls)
+
+        if jobs:
+            self._update_cachefiles(project, list(jobs.values()), wait=False)
 
     def get_symcaches(self, project, debug_ids, on_dif_referenced=None,
                       with_conversion_errors=False):
@@ -651,13 +709,60 @@ class DIFCache(object):
         return None
 
     def _get_caches_impl(self, project, debug_ids, cls, on_dif_referenced=None):
-        # Fetch debug files first and invoke the callback if we need
+        caches, to_update = self._find_caches(project, debug_ids, cls, on_dif_referenced)
+
+        # If any cache files need to be updated, do that now
+        conversion_errors = {}
+        if to_update:
+            resolved = get_resolved_caches()
+            results = self._update_cachefiles(
+                project, [(debug_file, (cls, )) for debug_file in to_update])
+            for debug_file, _, cache_file, cache, err in results:
+                debug_id = debug_file.debug_id
+                if err is not None:
+                    conversion_errors[debug_id] = err
+                    continue
+                if cache_file is not None or cache is not None:
+                    caches.append((debug_id, cache_file, cache))
+                if cache_file is not None and cache_file.debug_file_id == debug_file.id:
+                    resolved.set(_get_resolved_key(project.id, cls, debug_id),
+                                 (debug_file, cache_file))
+
+        return caches, conversion_errors
+
+    def _find_caches(self, project, debug_ids, cls, on_dif_referenced=None):
+        """Returns the up-to-date caches of the debug files matching the given
+        debug ids as ``(debug_id, cache_file, None)``, and the list of debug
+        files which need to be converted.
+        """
         debug_ids = [six.text_type(debug_id).lower() for debug_id in debug_ids]
-        debug_files = ProjectDebugFile.objects.find_by_debug_ids(
-            project, debug_ids, features=cls.required_features)
+
+        # Debug files with an up-to-date cache have been resolved recently by
+        # this process. Only look up the others in the database.
+        resolved = get_resolved_caches()
+        caches = []
+        referenced = []
+        unresolved_ids = []
+        for debug_id in debug_ids:
+            rv = resolved.get(_get_resolved_key(project.id, cls, debug_id))
+            if rv is None:
+                unresolved_ids.append(debug_id)
+            else:
+                debug_file, cache_file = rv
+                referenced.append(debug_file)
+                caches.append((debug_id, cache_file, None))
+
+        # Fetch debug files first and invoke the callback if we need
+        if unresolved_ids:
+            debug_files = ProjectDebugFile.objects.find_by_debug_ids(
+                project, unresolved_ids, features=cls.required_features)
+        else:
+            debug_files = {}
 
         # Notify the caller that we have used a symbol file
         if on_dif_referenced is not None:
+            for debug_file in referenced:
+                on_dif_referenced(debug_file)
             for debug_file in six.itervalues(debug_files):
                 on_dif_referenced(debug_file)
 
@@ -669,7 +774,6 @@ class DIFCache(object):
 
         # Check for missing and out-of-date cache files. Outdated files are
         # removed to be re-created immediately.
-        caches = []
         to_update = debug_files.copy()
         for cache_file in existing_caches:
             if cache_file.outdated:
@@ -678,51 +782,114 @@ class DIFCache(object):
                 debug_id = cache_file.debug_file.debug_id
                 to_update.pop(debug_id, None)
                 caches.append((debug_id, cache_file, None))
+                resolved.set(_get_resolved_key(project.id, cls, debug_id),
+                             (debug_files[debug_id], cache_file))
 
-        # If any cache files need to be updated, do that now
-        if to_update:
-            updated_cachefiles, conversion_errors = self._update_cachefiles(
-                project, to_update.values(), cls)
-            caches.extend(updated_cachefiles)
+        return caches, list(to_update.values())
+
+    def _update_cachefiles(self, project, jobs, wait=True):
+        """Converts debug files to caches. ``jobs`` is a list of
+        ``(debug_file, classes)`` tuples, and the files are converted using up
+        to ``SENTRY_DIF_CONVERSION_CONCURRENCY`` threads.
+
+        Returns a list of ``(debug_file, cls, cache_file, cache, error)`` for
+        every conversion. If ``wait`` is false, debug files that are being
+        converted by another worker are skipped.
+        """
+        concurrency = settings.SENTRY_DIF_CONVERSION_CONCURRENCY
+        if len(jobs) < 2 or concurrency < 2:
+            results = [
+                self._convert_debug_file(debug_file, classes, wait)
+                for debug_file, classes in jobs
+            ]
         else:
-            conversion_errors = {}
+            with ThreadPoolExecutor(max_workers=min(concurrency, len(jobs))) as executor:
+                futures = [
+                    executor.submit(self._convert_debug_file_in_thread, debug_file, classes, wait)
+                    for debug_file, classes in jobs
+                ]
+            results = [future.result() for future in futures]
 
-        return caches, conversion_errors
+        return [result for file_results in results for result in file_results]
+
+    def _convert_debug_file_in_thread(self, debug_file, classes, wait):
+        try:
+            return self._convert_debug_file(debug_file, classes, wait)
+        finally:
+            # Threads get their own database connections which would otherwise
+            # be left open once the worker exits.
+            for connection in connections.all():
+                connection.close()
+
+    def _convert_debug_file(self, debug_file, classes, wait=True):
+        from sentry.app import locks
+
+        # Find all the known bad files we could not convert last time. We
+        # use the debug identifier and file checksum to identify the source
+        # DIF for historic reasons (debug_file.id would do, too).
+        cache_key = 'scbe:%s:%s' % (debug_file.debug_id, debug_file.file.checksum)
+        err = default_cache.get(cache_key)
+        if err is not None:
+            return [(debug_file, cls, None, None, err) for cls in classes]
+
+        lock = locks.get(u'difcache:convert:%s' % debug_file.id,
+                         duration=CONVERSION_LOCK_DURATION)
+        try:
+            if wait:
+                TimedRetryPolicy(CONVERSION_LOCK_TIMEOUT, delay=lambda i: 0.5)(lock.acquire)
+            else:
+                lock.acquire()
+        except (UnableToAcquireLock, RetryException):
+            if not wait:
+                metrics.incr('difcache.conversion.skipped')
+                return []
+            # Rather convert the file again than fail to symbolicate
+            metrics.incr('difcache.conversion.lock-timeout')
+            lock = None
+
+        try:
+            return self._convert_debug_file_locked(debug_file, classes, cache_key)
+        finally:
+            if lock is not None:
+                lock.release()
 
-    def _update_cachefiles(self, project, debug_files, cls):
+    def _convert_debug_file_locked(self, debug_file, classes, cache_key):
         rv = []
-        conversion_errors = {}
 
-        for debug_file in debug_files:
-            debug_id = debug_file.debug_id
+        # Another worker may have converted the file while we were waiting
+        # for the lock, so check for new caches first.
+        pending = []
+        for cls in classes:
+            cache_file = cls.objects \
+                .filter(project=debug_file.project_id, debug_file=debug_file) \
+                .select_related('cache_file') \
+                .first()
+            if cache_file is not None and not cache_file.outdated:
+                rv.append((debug_file, cls, cache_file, None, None))
+            else:
+                pending.append(cls)
 
-            # Find all the known bad files we could not convert last time. We
-            # use the debug identifier and file checksum to identify the source
-            # DIF for historic reasons (debug_file.id would do, too).
-            cache_key = 'scbe:%s:%s' % (debug_id, debug_file.file.checksum)
-            err = default_cache.get(cache_key)
-            if err is not None:
-                conversion_errors[debug_id] = err
-                continue
+        if not pending:
+            return rv
 
-            # Download the original debug symbol and convert the object file to
-            # a cache. This can either yield a cache object, an error or none of
-            # the above. THE FILE DOWNLOAD CAN TAKE SIGNIFICANT TIME.
-            with debug_file.file.getfile(as_tempfile=True) as tf:
+        # Download the original debug symbol once and convert the object file
+        # to all pending caches. Each can either yield a cache object, an error
+        # or none of the above. THE FILE DOWNLOAD CAN TAKE SIGNIFICANT TIME.
+        with metrics.timer('difcache.download'):
+            tf = debug_file.file.getfile(as_tempfile=True)
+
+        with tf:
+            for cls in pending:
                 file, cache, err = self._update_cachefile(debug_file, tf.name, cls)
 
-            # Store this conversion error so that we can skip subsequent
-            # conversions. There might be concurrent conversions running for the
-            # same debug file, however.
-            if err is not None:
-                default_cache.set(cache_key, err, CONVERSION_ERROR_TTL)
-                conversion_errors[debug_id] = err
-                continue
+                # Store this conversion error so that we can skip subsequent
+                # conversions.
+                if err is not None:
+                    default_cache.set(cache_key, err, CONVERSION_ERROR_TTL)
 
-            if file is not None or cache is not None:
-                rv.append((debug_id, file, cache))
+                rv.append((debug_file, cls, file, cache, err))
 
-        return rv, conversion_errors
+        return rv
 
     def _update_cachefile(self, debug_file, path, cls):
         debug_id = debug_file.debug_id
@@ -746,7 +913,9 @@ class DIFCache(object):
                 if o.features < set(cls.required_features):
                     return None, None, None
 
+            start = time.time()
             cache = cls.cache_cls.from_object(o)
+            _record_conversion(cls, path, time.time() - start)
         except SymbolicError as e:
             if not isinstance(e, cls.ignored_errors):
                 logger.error('dsymfile.%s-build-error' % cls.cache_name,
@@ -800,6 +969,7 @@ class DIFCache(object):
         rv = {}
         base = self.get_project_path(project)
         cls_name = cls.__name__.lower()
+        handles = get_cache_handles()
 
         for debug_id, model, cache in cachefiles:
             # If we're given a cache instance, use that over accessing the file
@@ -810,23 +980,51 @@ class DIFCache(object):
             elif model is None:
                 raise RuntimeError('missing %s file to load from fs' % cls_name)
 
+            # Cache files never change, so an open handle from a previous
+            # event can be used as long as the model id and version match.
+            cachefile_name = '%s_%s.%s' % (model.id, model.version, cls_name)
+            cachefile_path = os.path.join(base, cachefile_name)
+            now = int(time.time())
+            pooled = handles.get(cachefile_name)
+            if pooled is not None:
+                handle, size, touched = pooled
+                # Pooled files still need their timestamp bumped, otherwise
+                # ``clear_old_entries`` would remove the most used ones first.
+                if touched < now - ONE_HOUR:
+                    try:
+                        os.utime(cachefile_path, (now, now))
+                    except OSError as e:
+                        if e.errno != errno.ENOENT:
+                            raise
+                        # The file was removed, so the next event loads it
+                        # again. The open handle is still good for this one.
+                        handles.delete(cachefile_name)
+                    else:
+                        handles.set(cachefile_name, (handle, size, now), weight=size)
+                rv[debug_id] = handle
+                continue
+
             # Try to locate a cached instance from the file system and bump the
             # timestamp to indicate it is still being used. Otherwise, download
             # from the blob store and place it in the cache folder.
-            cachefile_name = '%s_%s.%s' % (model.id, model.version, cls_name)
-            cachefile_path = os.path.join(base, cachefile_name)
             try:
                 stat = os.stat(cachefile_path)
             except OSError as e:
                 if e.errno != errno.ENOENT:
                     raise
                 model.cache_file.save_to(cachefile_path)
+                size = os.path.getsize(cachefile_path)
+                touched = now
             else:
-                now = int(time.time())
-                if stat.st_ctime < now - ONE_DAY:
+                size = stat.st_size
+                touched = int(stat.st_mtime)
+                if touched < now - ONE_HOUR:
                     os.utime(cachefile_path, (now, now))
+                    touched = now
 
-            rv[debug_id] = cls.from_path(cachefile_path)
+            handle = cls.from_path(cachefile_path)
+            handles.set(cachefile_name, (handle, size, touched), weight=size)
+            rv[debug_id] = handle
         return rv
 
     def clear_old_entries(self):
@@ -836,7 +1034,9 @@ class DIFCache(object):
             return
 
         cutoff = int(time.time()) - ONE_DAY_AND_A_HALF
+        max_size = options.get('dsym.cache-max-size')
 
+        entries = []
         for cache_folder in cache_folders:
             cache_folder = os.path.join(self.cache_path, cache_folder)
             try:
@@ -846,14 +1046,28 @@ class DIFCache(object):
             for cached_file in items:
                 cached_file = os.path.join(cache_folder, cached_file)
                 try:
-                    mtime = os.path.getmtime(cached_file)
+                    stat = os.stat(cached_file)
                 except OSError:
                     continue
-                if mtime < cutoff:
-                    try:
-                        os.remove(cached_file)
-                    except OSError:
-                        pass
+                entries.append((stat.st_mtime, stat.st_size, cached_file))
+
+        # Remove files that have not been used for a while, then the least
+        # recently used ones until the cache fits into its maximum size.
+        entries.sort()
+        size = sum(file_size for _, file_size, _ in entries)
+        removed = 0
+        for mtime, file_size, cached_file in entries:
+            if mtime >= cutoff and (not max_size or size <= max_size):
+                break
+            try:
+                os.remove(cached_file)
+            except OSError:
+                continue
+            size -= file_size
+            removed += 1
+
+        metrics.incr('difcache.evicted', amount=removed)
+        metrics.timing('difcache.size', size)
 
 
 ProjectDebugFile.difcache = DIFCache()
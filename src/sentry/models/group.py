@@ -169,21 +169,16 @@ class GroupManager(BaseManager):
         project_id = group.project_id
         date = group.last_seen
 
+        tag_values = []
         for tag_item in tags:
             if len(tag_item) == 2:
                 (key, value), data = tag_item, None
             else:
                 key, value, data = tag_item
+            tag_values.append((key, value, data))
 
-            tagstore.incr_tag_value_times_seen(project_id, environment.id, key, value, extra={
-                'last_seen': date,
-                'data': data,
-            })
-
-            tagstore.incr_group_tag_value_times_seen(project_id, group.id, environment.id, key, value, extra={
-                'project_id': project_id,
-                'last_seen': date,
-            })
+        tagstore.incr_tag_values_times_seen(
+            project_id, group.id, environment.id, tag_values, date)
 
     def get_groups_by_external_issue(self, integration, external_issue_key):
         from sentry.models import ExternalIssue, GroupLink
@@ -15,6 +15,7 @@ from sentry.db.models import Model, FlexibleForeignKey, sane_repr
 from sentry.db.models.fields import EncryptedPickledObjectField
 from sentry.db.models.manager import BaseManager
 from sentry.utils.cache import cache
+from sentry.utils.localcache import get_local_cache
 
 
 class ProjectOptionManager(BaseManager):
@@ -74,11 +75,19 @@ class ProjectOptionManager(BaseManager):
 
         if project_id not in self.__cache:
             cache_key = self._make_key(project_id)
+            local_cache = get_local_cache('projectoption')
+            result = local_cache.get(cache_key)
+            if result is not None:
+                # the local cache outlives requests, never hand out its copy
+                self.__cache[project_id] = dict(result)
+                return self.__cache[project_id]
+
             result = cache.get(cache_key)
             if result is None:
                 result = self.reload_cache(project_id)
             else:
                 self.__cache[project_id] = result
+                local_cache.set(cache_key, dict(result))
         return self.__cache.get(project_id, {})
 
     def clear_local_cache(self, **kwargs):
@@ -89,6 +98,9 @@ class ProjectOptionManager(BaseManager):
         result = dict((i.key, i.value) for i in self.filter(project=project_id))
         cache.set(cache_key, result)
         self.__cache[project_id] = result
+        local_cache = get_local_cache('projectoption')
+        local_cache.invalidate(cache_key)
+        local_cache.set(cache_key, dict(result))
         return result
 
     def post_save(self, instance, **kwargs):
@@ -12,7 +12,9 @@ from six.moves import reduce
 
 from sentry.db.models import Model, sane_repr
 from sentry.db.models.fields import FlexibleForeignKey
-from sentry.ownership.grammar import load_schema
+from sentry.ownership.grammar import compile_rules
+from sentry.utils import metrics
+from sentry.utils.localcache import get_local_cache
 
 
 class ProjectOwnership(Model):
@@ -55,9 +57,7 @@ class ProjectOwnership(Model):
 
         rules = []
         if ownership.schema is not None:
-            for rule in load_schema(ownership.schema):
-                if rule.test(data):
-                    rules.append(rule)
+            rules = ownership.get_compiled_rules().test(data)
 
         if not rules:
             return cls.Everyone if ownership.fallthrough else [], None
@@ -66,6 +66,24 @@ class ProjectOwnership(Model):
 
         return filter(None, resolve_actors(owners, project_id).values()), rules
 
+    def get_compiled_rules(self):
+        """
+        Returns the ``CompiledRules`` for this ownership's schema. Compiled
+        rules are cached in process for each revision of the ownership, so
+        saving a new schema (which bumps ``last_updated``) invalidates them.
+        """
+        if self.id is None:
+            return compile_rules(self.schema)
+
+        cache = get_local_cache('projectownership')
+        cache_key = u'{}:{}'.format(self.id, self.last_updated)
+        compiled = cache.get(cache_key)
+        if compiled is None:
+            compiled = compile_rules(self.schema)
+            cache.set(cache_key, compiled)
+            metrics.timing('projectownership.compiled-rules', len(compiled))
+        return compiled
+
 
 def resolve_actors(owners, project_id):
     """ Convert a list of Owner objects into a dictionary
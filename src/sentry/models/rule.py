@@ -9,6 +9,7 @@ from __future__ import absolute_import, print_function
 
 from django.db import models
 from django.utils import timezone
+from uuid import uuid4
 
 from sentry.db.models import (
     BoundedPositiveIntegerField, Model, FlexibleForeignKey, GzippedDictField, sane_repr
@@ -63,16 +64,34 @@ class Rule(Model):
             cache.set(cache_key, rules_list, 60)
         return rules_list
 
+    @classmethod
+    def get_version_for_project(cls, project_id):
+        """
+        Returns an opaque token which changes whenever a rule of the project
+        is saved or deleted. Used to invalidate compiled rule plans which are
+        cached in process.
+        """
+        cache_key = u'project:{}:rules:version'.format(project_id)
+        version = cache.get(cache_key)
+        if version is None:
+            version = uuid4().hex
+            cache.set(cache_key, version, 3600)
+        return version
+
+    def _clear_project_cache(self):
+        cache.delete_many([
+            u'project:{}:rules'.format(self.project_id),
+            u'project:{}:rules:version'.format(self.project_id),
+        ])
+
     def delete(self, *args, **kwargs):
         rv = super(Rule, self).delete(*args, **kwargs)
-        cache_key = u'project:{}:rules'.format(self.project_id)
-        cache.delete(cache_key)
+        self._clear_project_cache()
         return rv
 
     def save(self, *args, **kwargs):
         rv = super(Rule, self).save(*args, **kwargs)
-        cache_key = u'project:{}:rules'.format(self.project_id)
-        cache.delete(cache_key)
+        self._clear_project_cache()
         return rv
 
     def get_audit_log_data(self):
@@ -14,6 +14,7 @@ from base64 import b64encode
 from threading import local
 from uuid import uuid4
 
+from sentry.nodestore.codec import get_default_codec
 from sentry.utils.services import Service
 
 
@@ -23,6 +24,13 @@ class NodeStorage(local, Service):
         'cleanup', 'validate'
     )
 
+    @property
+    def codec(self):
+        """
+        The codec used by backends which store node data as raw bytes.
+        """
+        return get_default_codec()
+
     def create(self, data):
         """
         >>> key = nodestore.create({'foo': 'bar'})
@@ -9,6 +9,7 @@ sentry.nodestore.cassandra.backend
 from __future__ import absolute_import, print_function
 
 import casscache
+import six
 
 from sentry.nodestore.base import NodeStorage
 from sentry.utils.cache import memoize
@@ -44,11 +45,21 @@ class CassandraNodeStorage(NodeStorage):
     def delete(self, id):
         self.connection.delete(id)
 
+    def _decode(self, value):
+        # nodes written before the node codec was introduced are stored as
+        # plain objects and are returned as is
+        if isinstance(value, six.binary_type):
+            return self.codec.decode(value)
+        return value
+
     def get(self, id):
-        return self.connection.get(id)
+        return self._decode(self.connection.get(id))
 
     def get_multi(self, id_list):
-        return self.connection.get_multi(id_list)
+        return {
+            id: self._decode(value)
+            for id, value in six.iteritems(self.connection.get_multi(id_list))
+        }
 
     def set(self, id, data):
-        self.connection.set(id, data)
+        self.connection.set(id, self.codec.encode(data))
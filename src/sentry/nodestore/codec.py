@@ -0,0 +1,236 @@
+"""
+sentry.nodestore.codec
+~~~~~~~~~~~~~~~~~~~~~~
+
+A versioned, self-describing binary encoding for node payloads.
+
+Every encoded payload starts with a fixed size header::
+
+    magic (2 bytes) | version (1) | serializer (1) | compressor (1) | dict id (4)
+
+followed by the compressed body. Payloads without the magic prefix are
+treated as one of the legacy formats (base64 encoded zlib compressed pickle
+or plain JSON) so existing nodes stay readable.
+
+:copyright: (c) 2010-2018 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+
+from __future__ import absolute_import
+
+import six
+import struct
+import zlib
+
+from django.conf import settings
+
+from sentry.utils import json, metrics
+from sentry.utils.compat import pickle
+from sentry.utils.strings import decompress
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+__all__ = ('NodeCodec', 'NodeDecodeError', 'get_default_codec', 'train_dictionary')
+
+MAGIC = b'\x00N'
+VERSION = 1
+
+HEADER = struct.Struct('>2sBBBI')
+
+SERIALIZER_JSON = 0
+SERIALIZER_MSGPACK = 1
+
+COMPRESSOR_NONE = 0
+COMPRESSOR_ZLIB = 1
+COMPRESSOR_ZSTD = 2
+
+
+class NodeDecodeError(Exception):
+    pass
+
+
+def _msgpack_dumps(value):
+    return msgpack.packb(value, use_bin_type=True)
+
+
+def _msgpack_loads(value):
+    return msgpack.unpackb(value, encoding='utf-8')
+
+
+def _json_dumps(value):
+    return json.dumps(value).encode('utf-8')
+
+
+def _json_loads(value):
+    return json.loads(value.decode('utf-8'))
+
+
+SERIALIZERS = {
+    SERIALIZER_JSON: (_json_dumps, _json_loads),
+    SERIALIZER_MSGPACK: (_msgpack_dumps, _msgpack_loads),
+}
+
+
+class NodeCodec(object):
+    """
+    Encodes node data into the binary node format and decodes both the
+    binary format and the legacy formats.
+
+    ``dictionaries`` maps a platform name to a trained zstd dictionary
+    (either the raw bytes or a path to a file containing them). When a
+    payload's platform has a dictionary it is used for compression and its
+    id is recorded in the header so the matching dictionary can be looked up
+    when decoding.
+
+    >>> codec = NodeCodec(dictionaries={'python': '/srv/dicts/python.zdict'})
+    >>> codec.decode(codec.encode({'platform': 'python'}))
+    {'platform': 'python'}
+    """
+
+    def __init__(self, serializer='json', compressor='zlib', level=3, dictionaries=None):
+        # The defaults must not depend on the installed packages, otherwise
+        # hosts without them could not read what the others have written.
+        self.serializer = {
+            'json': SERIALIZER_JSON,
+            'msgpack': SERIALIZER_MSGPACK,
+        }[serializer]
+        self.compressor = {
+            'none': COMPRESSOR_NONE,
+            'zlib': COMPRESSOR_ZLIB,
+            'zstd': COMPRESSOR_ZSTD,
+        }[compressor]
+        self.level = level
+
+        if self.serializer == SERIALIZER_MSGPACK and msgpack is None:
+            raise ImportError('The msgpack serializer requires the msgpack-python package')
+        if self.compressor == COMPRESSOR_ZSTD and zstandard is None:
+            raise ImportError('The zstd compressor requires the zstandard package')
+
+        self.dictionaries_by_platform = {}
+        self.dictionaries_by_id = {}
+        for platform, value in six.iteritems(dictionaries or {}):
+            if zstandard is None:
+                raise ImportError('Compression dictionaries require the zstandard package')
+            if not isinstance(value, six.binary_type):
+                with open(value, 'rb') as f:
+                    value = f.read()
+            dictionary = zstandard.ZstdCompressionDict(value)
+            self.dictionaries_by_platform[platform] = dictionary
+            self.dictionaries_by_id[dictionary.dict_id()] = dictionary
+
+    def _get_dictionary(self, data):
+        if self.compressor != COMPRESSOR_ZSTD or not isinstance(data, dict):
+            return None
+        return self.dictionaries_by_platform.get(data.get('platform'))
+
+    def encode(self, data):
+        dumps, _ = SERIALIZERS[self.serializer]
+        body = dumps(data)
+
+        dict_id = 0
+        if self.compressor == COMPRESSOR_ZLIB:
+            body = zlib.compress(body, self.level)
+        elif self.compressor == COMPRESSOR_ZSTD:
+            dictionary = self._get_dictionary(data)
+            if dictionary is not None:
+                dict_id = dictionary.dict_id()
+            body = zstandard.ZstdCompressor(
+                level=self.level,
+                dict_data=dictionary,
+            ).compress(body)
+
+        rv = HEADER.pack(MAGIC, VERSION, self.serializer, self.compressor, dict_id) + body
+        metrics.timing('nodestore.codec.bytes', len(rv), tags={
+            'dictionary': dict_id != 0,
+        })
+        return rv
+
+    def decode(self, value):
+        if value is None:
+            return None
+
+        if isinstance(value, six.text_type):
+            value = value.encode('utf-8')
+
+        if not value.startswith(MAGIC):
+            return self._decode_legacy(value)
+
+        _, version, serializer, compressor, dict_id = HEADER.unpack_from(value)
+        if version != VERSION:
+            raise NodeDecodeError('Unsupported node payload version: %r' % (version, ))
+
+        body = value[HEADER.size:]
+        if compressor == COMPRESSOR_ZLIB:
+            body = zlib.decompress(body)
+        elif compressor == COMPRESSOR_ZSTD:
+            if zstandard is None:
+                raise NodeDecodeError('zstd payload found but zstandard is not installed')
+            dictionary = None
+            if dict_id:
+                try:
+                    dictionary = self.dictionaries_by_id[dict_id]
+                except KeyError:
+                    raise NodeDecodeError('Unknown compression dictionary: %r' % (dict_id, ))
+            body = zstandard.ZstdDecompressor(dict_data=dictionary).decompress(body)
+        elif compressor != COMPRESSOR_NONE:
+            raise NodeDecodeError('Unknown node payload compressor: %r' % (compressor, ))
+
+        if serializer == SERIALIZER_MSGPACK and msgpack is None:
+            raise NodeDecodeError('msgpack payload found but msgpack is not installed')
+        try:
+            _, loads = SERIALIZERS[serializer]
+        except KeyError:
+            raise NodeDecodeError('Unknown node payload serializer: %r' % (serializer, ))
+        return loads(body)
+
+    def _decode_legacy(self, value):
+        # JSON as written by the riak backend
+        if value.startswith(b'{') or value.startswith(b'['):
+            return json.loads(value)
+        # zlib + pickle with the base64 layer already removed
+        if value.startswith(b'\x78'):
+            return pickle.loads(zlib.decompress(value))
+        # base64 + zlib + pickle as written by ``GzippedDictField``
+        return pickle.loads(decompress(value))
+
+    def is_current(self, value):
+        """
+        Returns ``True`` if ``value`` was written in the current format with
+        the codec's current settings.
+        """
+        if isinstance(value, six.text_type):
+            value = value.encode('utf-8')
+        if not isinstance(value, six.binary_type) or not value.startswith(MAGIC):
+            return False
+        _, version, serializer, compressor, _ = HEADER.unpack_from(value)
+        return (version, serializer, compressor) == (VERSION, self.serializer, self.compressor)
+
+
+def train_dictionary(samples, size=112640):
+    """
+    Trains a zstd dictionary from a list of node payloads (as dicts),
+    serialized like the default codec does, and returns the raw dictionary
+    bytes.
+    """
+    if zstandard is None:
+        raise ImportError('Training dictionaries requires the zstandard package')
+    dumps, _ = SERIALIZERS[get_default_codec().serializer]
+    return zstandard.train_dictionary(size, [dumps(s) for s in samples]).as_bytes()
+
+
+_default_codec = None
+
+
+def get_default_codec():
+    global _default_codec
+    if _default_codec is None:
+        _default_codec = NodeCodec(**getattr(settings, 'SENTRY_NODESTORE_CODEC_OPTIONS', {}))
+    return _default_codec
@@ -8,22 +8,68 @@ sentry.nodestore.django.models
 
 from __future__ import absolute_import
 
+import logging
+import six
+
+from base64 import b64decode, b64encode
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 
-from sentry.db.models import (BaseModel, GzippedDictField, sane_repr)
+from sentry.db.models import BaseModel, sane_repr
+from sentry.nodestore.codec import get_default_codec
+
+logger = logging.getLogger('sentry')
+
+
+class NodeDataField(models.TextField):
+    """
+    Stores node data encoded with the node codec.
+
+    The column is text, so the binary payload is wrapped in base64. Values
+    written by ``GzippedDictField`` are still readable.
+    """
+
+    def to_python(self, value):
+        if isinstance(value, six.string_types) and value:
+            try:
+                return get_default_codec().decode(b64decode(value))
+            except Exception as e:
+                logger.exception(e)
+                return {}
+        elif not value:
+            return {}
+        return value
+
+    def get_prep_value(self, value):
+        if not value and self.null:
+            # save ourselves some storage
+            return None
+        return b64encode(get_default_codec().encode(value)).decode('utf-8')
+
+    def value_to_string(self, obj):
+        value = self._get_val_from_obj(obj)
+        return self.get_prep_value(value)
+
+
+if hasattr(models, 'SubfieldBase'):
+    NodeDataField = six.add_metaclass(models.SubfieldBase)(NodeDataField)
 
 
 class Node(BaseModel):
     __core__ = False
 
     id = models.CharField(max_length=40, primary_key=True)
-    # TODO(dcramer): this being pickle and not JSON has the ability to cause
-    # hard errors as it accepts other serialization than native JSON
-    data = GzippedDictField()
+    data = NodeDataField()
     timestamp = models.DateTimeField(default=timezone.now, db_index=True)
 
     __repr__ = sane_repr('timestamp')
 
     class Meta:
         app_label = 'nodestore'
+
+
+if 'south' in settings.INSTALLED_APPS:
+    from south.modelsinspector import add_introspection_rules
+
+    add_introspection_rules([], ["^sentry\.nodestore\.django\.models\.NodeDataField"])
@@ -98,7 +98,7 @@ class RiakClient(object):
     def put(self, bucket, key, data, headers=None, **kwargs):
         if headers is None:
             headers = {}
-        headers['content-type'] = 'application/json'
+        headers.setdefault('content-type', 'application/json')
 
         return self.manager.urlopen(
             'PUT',
@@ -59,6 +59,9 @@ register('redis.options', type=Dict, flags=FLAG_NOSTORE)
 
 # symbolizer specifics
 register('dsym.cache-path', type=String, default='/tmp/sentry-dsym-cache')
+# The maximum size of the cache path in bytes (0 for no limit). Least recently
+# used files are removed first.
+register('dsym.cache-max-size', type=Int, default=0)
 
 # Mail
 register('mail.backend', default='smtp', flags=FLAG_NOSTORE)
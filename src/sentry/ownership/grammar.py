@@ -1,11 +1,13 @@
 from __future__ import absolute_import
 
+import re
+
 from collections import namedtuple
-from fnmatch import fnmatch
+from fnmatch import fnmatch, translate
 from parsimonious.grammar import Grammar, NodeVisitor
 from parsimonious.exceptions import ParseError  # noqa
 
-__all__ = ('parse_rules', 'dump_schema', 'load_schema')
+__all__ = ('parse_rules', 'dump_schema', 'load_schema', 'compile_rules')
 
 VERSION = 1
 
@@ -95,22 +97,13 @@ class Matcher(namedtuple('Matcher', 'type pattern')):
         return getattr(self, 'test_%s' % self.type)(data)
 
     def test_url(self, data):
-        try:
-            url = data['request']['url']
-        except KeyError:
-            return False
-        return fnmatch(url, self.pattern)
+        for url in _iter_urls(data):
+            if fnmatch(url, self.pattern):
+                return True
+        return False
 
     def test_path(self, data):
-        for frame in _iter_frames(data):
-            try:
-                filename = frame['filename']
-            except KeyError:
-                try:
-                    filename = frame['abs_path']
-                except KeyError:
-                    continue
-
+        for filename in _iter_filenames(data):
             # fnmatch keeps it's own internal cache, so
             # there isn't any optimization we can do here
             # by using fnmatch.translate before and compiling
@@ -216,6 +209,89 @@ def _iter_frames(data):
             continue
 
 
+def _iter_filenames(data):
+    for frame in _iter_frames(data):
+        try:
+            yield frame['filename']
+        except KeyError:
+            try:
+                yield frame['abs_path']
+            except KeyError:
+                continue
+
+
+def _iter_urls(data):
+    try:
+        yield data['request']['url']
+    except KeyError:
+        pass
+
+
+MATCHER_VALUES = {
+    'path': _iter_filenames,
+    'url': _iter_urls,
+}
+
+
+class CompiledRules(object):
+    """
+    A list of rules compiled for testing all of them against an event at
+    once, rather than calling ``Rule.test`` for every rule.
+
+    The patterns of each matcher type are combined into a single regular
+    expression, which is used to skip the values (e.g. frame filenames)
+    matching none of the rules. Only the remaining values are tested
+    against the individual patterns of rules which have not matched yet.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.matchers = {}
+        # rules with a matcher type we can't compile are tested as usual
+        self.fallback = []
+
+        patterns = {}
+        for idx, rule in enumerate(rules):
+            if rule.matcher.type not in MATCHER_VALUES:
+                self.fallback.append(idx)
+                continue
+            patterns.setdefault(rule.matcher.type, []).append(
+                (idx, translate(rule.matcher.pattern)))
+
+        for type, type_patterns in patterns.items():
+            combined = re.compile('|'.join('(?:%s)' % p for _, p in type_patterns))
+            self.matchers[type] = (combined, [(idx, re.compile(p)) for idx, p in type_patterns])
+
+    def __len__(self):
+        return len(self.rules)
+
+    def test(self, data):
+        """
+        Returns the rules matching ``data``, in the order they were defined.
+        """
+        matched = set(idx for idx in self.fallback if self.rules[idx].test(data))
+
+        for type, (combined, patterns) in self.matchers.items():
+            seen = set()
+            for value in MATCHER_VALUES[type](data):
+                if value in seen:
+                    continue
+                seen.add(value)
+                if not combined.match(value):
+                    continue
+                remaining = []
+                for idx, pattern in patterns:
+                    if pattern.match(value):
+                        matched.add(idx)
+                    else:
+                        remaining.append((idx, pattern))
+                patterns = remaining
+                if not patterns:
+                    break
+
+        return [self.rules[idx] for idx in sorted(matched)]
+
+
 def parse_rules(data):
     """Convert a raw text input into a Rule tree"""
     tree = ownership_grammar.parse(data)
@@ -235,3 +311,8 @@ def load_schema(schema):
     if schema['$version'] != VERSION:
         raise RuntimeError('Invalid schema $version: %r' % schema['$version'])
     return [Rule.load(r) for r in schema['rules']]
+
+
+def compile_rules(schema):
+    """Convert a JSON schema into a ``CompiledRules`` instance"""
+    return CompiledRules(load_schema(schema))
@@ -1,12 +1,13 @@
 from __future__ import absolute_import, print_function
 
 from django.db import IntegrityError, transaction
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.utils import timezone
 
 from sentry import analytics
 from sentry.models import (
-    Activity, Commit, Group, GroupAssignee, GroupLink, GroupSubscription, GroupSubscriptionReason, GroupStatus, Release, Repository, PullRequest, UserOption
+    Activity, Commit, File, Group, GroupAssignee, GroupLink, GroupSubscription,
+    GroupSubscriptionReason, GroupStatus, Release, Repository, PullRequest, UserOption
 )
 from sentry.signals import resolved_with_commit
 from sentry.tasks.clear_expired_resolutions import clear_expired_resolutions
@@ -213,6 +214,14 @@ def resolved_in_pull_request(instance, created, **kwargs):
                 )
 
 
+def delete_sourcemap_index(instance, **kwargs):
+    if instance.type != 'release.file':
+        return
+
+    from sentry.lang.javascript.sourcemapindex import delete_sourcemap_index
+    delete_sourcemap_index(instance)
+
+
 post_save.connect(
     resolve_group_resolutions,
     sender=Release,
@@ -233,3 +242,10 @@ post_save.connect(
     dispatch_uid="resolved_in_pull_request",
     weak=False,
 )
+
+post_delete.connect(
+    delete_sourcemap_index,
+    sender=File,
+    dispatch_uid="delete_sourcemap_index",
+    weak=False,
+)
@@ -101,8 +101,11 @@ class RuleBase(object):
 
 
 class EventState(object):
-    def __init__(self, is_new, is_regression, is_new_group_environment, has_reappeared):
+    def __init__(self, is_new, is_regression, is_new_group_environment, has_reappeared,
+                 frequency_results=None):
         self.is_new = is_new
         self.is_regression = is_regression
         self.is_new_group_environment = is_new_group_environment
         self.has_reappeared = has_reappeared
+        # prefetched values of frequency conditions, keyed by query
+        self.frequency_results = frequency_results
@@ -14,6 +14,7 @@ from django.utils import timezone
 
 from sentry import tsdb
 from sentry.rules.conditions.base import EventCondition
+from sentry.utils import metrics
 
 intervals = {
     '1m': ('one minute', timedelta(minutes=1)),
@@ -66,19 +67,49 @@ class BaseEventFrequencyCondition(EventCondition):
         if not interval:
             return False
 
-        current_value = self.get_rate(
-            event,
-            interval,
-            self.rule.environment_id,
-        )
+        results = getattr(state, 'frequency_results', None)
+        query_key = self.get_query_key()
+        if results is not None and query_key in results:
+            current_value = results[query_key]
+        else:
+            current_value = self.get_rate(
+                event,
+                interval,
+                self.rule.environment_id,
+            )
 
         return current_value > value
 
-    def query(self, event, start, end, environment_id):
+    def get_query_key(self):
         """
+        Returns a ``(method, model, interval, environment_id)`` tuple that
+        identifies the TSDB query made by this condition, or ``None`` if the
+        condition is not configured correctly.
+        """
+        interval = self.get_option('interval')
+        if interval not in intervals:
+            return None
+        method, model = self.get_query_params()
+        environment_id = self.rule.environment_id if self.rule is not None else None
+        return (method, model, interval, environment_id)
+
+    def get_query_params(self):
+        """
+        Returns the ``(method, model)`` of the TSDB query used by
+        ``query``.
         """
         raise NotImplementedError  # subclass must implement
 
+    def query(self, event, start, end, environment_id):
+        method, model = self.get_query_params()
+        return getattr(self.tsdb, method)(
+            model=model,
+            keys=[event.group_id],
+            start=start,
+            end=end,
+            environment_id=environment_id,
+        )[event.group_id]
+
     def get_rate(self, event, interval, environment_id):
         _, duration = intervals[interval]
         end = timezone.now()
@@ -93,24 +124,46 @@ class BaseEventFrequencyCondition(EventCondition):
 class EventFrequencyCondition(BaseEventFrequencyCondition):
     label = 'An issue is seen more than {value} times in {interval}'
 
-    def query(self, event, start, end, environment_id):
-        return self.tsdb.get_sums(
-            model=self.tsdb.models.group,
-            keys=[event.group_id],
-            start=start,
-            end=end,
-            environment_id=environment_id,
-        )[event.group_id]
+    def get_query_params(self):
+        return ('get_sums', self.tsdb.models.group)
 
 
 class EventUniqueUserFrequencyCondition(BaseEventFrequencyCondition):
     label = 'An issue is seen by more than {value} users in {interval}'
 
-    def query(self, event, start, end, environment_id):
-        return self.tsdb.get_distinct_counts_totals(
-            model=self.tsdb.models.users_affected_by_group,
-            keys=[event.group_id],
-            start=start,
-            end=end,
-            environment_id=environment_id,
-        )[event.group_id]
+    def get_query_params(self):
+        return ('get_distinct_counts_totals', self.tsdb.models.users_affected_by_group)
+
+
+def get_frequency_results(event, conditions, tsdb=tsdb):
+    """
+    Runs the TSDB queries of all frequency ``conditions`` for ``event`` as
+    one batch, deduplicated by ``(method, model, interval, environment)``.
+
+    Returns a mapping of query key (see ``get_query_key``) to the current
+    value, suitable for ``EventState.frequency_results``.
+    """
+    query_keys = set()
+    for condition in conditions:
+        if isinstance(condition, BaseEventFrequencyCondition):
+            query_key = condition.get_query_key()
+            if query_key is not None:
+                query_keys.add(query_key)
+
+    if not query_keys:
+        return {}
+
+    query_keys = sorted(query_keys)
+    end = timezone.now()
+    requests = []
+    for method, model, interval, environment_id in query_keys:
+        _, duration = intervals[interval]
+        requests.append((method, model, [event.group_id], end - duration, end, environment_id))
+
+    metrics.timing('rules.frequency.queries', len(requests))
+
+    results = tsdb.get_totals_multi(requests)
+    return {
+        query_key: result[event.group_id]
+        for query_key, result in zip(query_keys, results)
+    }
@@ -3,16 +3,61 @@ from __future__ import absolute_import
 import logging
 import six
 
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 from datetime import timedelta
+from django.db import IntegrityError, transaction
 from django.utils import timezone
+from time import time
 
 from sentry.models import GroupRuleStatus, Rule
 from sentry.rules import EventState, rules
+from sentry.rules.conditions.event_frequency import (
+    BaseEventFrequencyCondition, get_frequency_results
+)
+from sentry.utils import metrics
 from sentry.utils.safe import safe_execute
 
 RuleFuture = namedtuple('RuleFuture', ['rule', 'kwargs'])
 
+CompiledRule = namedtuple('CompiledRule', ['rule', 'match', 'frequency', 'conditions'])
+
+
+class RulePlanCache(object):
+    """
+    A bounded, per-process cache of compiled rule plans keyed by project.
+
+    Entries are tagged with the project's rule version (see
+    ``Rule.get_version_for_project``) and are discarded once the version
+    changes or ``ttl`` seconds have passed.
+    """
+
+    def __init__(self, max_size=1000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+
+    def get(self, project_id, version):
+        try:
+            entry_version, expires, plan = self.entries.pop(project_id)
+        except KeyError:
+            return None
+        if entry_version != version or expires < time():
+            return None
+        self.entries[project_id] = (entry_version, expires, plan)
+        return plan
+
+    def set(self, project_id, version, plan):
+        self.entries.pop(project_id, None)
+        while len(self.entries) >= self.max_size:
+            self.entries.popitem(last=False)
+        self.entries[project_id] = (version, time() + self.ttl, plan)
+
+    def clear(self):
+        self.entries.clear()
+
+
+plan_cache = RulePlanCache()
+
 
 # TODO(dcramer): come up with a clean way to kill this either by renaming
 # the Event.message attribute or updating all plugins (former is better)
@@ -51,10 +96,54 @@ class RuleProcessor(object):
         self.has_reappeared = has_reappeared
 
         self.grouped_futures = {}
+        self.frequency_results = None
 
     def get_rules(self):
         return Rule.get_for_project(self.project.id)
 
+    def compile_condition(self, condition, rule):
+        condition_cls = rules.get(condition['id'])
+        if condition_cls is None:
+            self.logger.warn('Unregistered condition %r', condition['id'])
+            return None
+        return condition_cls(self.project, data=condition, rule=rule)
+
+    def compile_rule(self, rule):
+        condition_list = rule.data.get('conditions', ())
+
+        # XXX(dcramer): if theres no condition should we really skip it,
+        # or should we just apply it blindly?
+        if not condition_list:
+            return None
+
+        conditions = [self.compile_condition(c, rule) for c in condition_list]
+        # frequency conditions hit TSDB, so evaluate everything else first;
+        # the match modes do not depend on condition order
+        conditions.sort(key=lambda c: isinstance(c, BaseEventFrequencyCondition))
+
+        return CompiledRule(
+            rule=rule,
+            match=rule.data.get('action_match') or Rule.DEFAULT_ACTION_MATCH,
+            frequency=rule.data.get('frequency') or Rule.DEFAULT_FREQUENCY,
+            conditions=conditions,
+        )
+
+    def get_plan(self):
+        """
+        Returns the list of ``CompiledRule`` for the project, compiling and
+        caching it in process if needed.
+        """
+        version = Rule.get_version_for_project(self.project.id)
+        plan = plan_cache.get(self.project.id, version)
+        if plan is not None:
+            metrics.incr('rules.plan_cache', tags={'result': 'hit'}, skip_internal=True)
+            return plan
+
+        metrics.incr('rules.plan_cache', tags={'result': 'miss'}, skip_internal=True)
+        plan = [c for c in (self.compile_rule(r) for r in self.get_rules()) if c is not None]
+        plan_cache.set(self.project.id, version, plan)
+        return plan
+
     def get_rule_status(self, rule):
         rule_status, _ = GroupRuleStatus.objects.get_or_create(
             rule=rule,
@@ -66,14 +155,48 @@ class RuleProcessor(object):
 
         return rule_status
 
+    def get_rule_statuses(self, rule_list):
+        """
+        Returns a mapping of rule id to ``GroupRuleStatus`` for this group,
+        creating any missing statuses.
+        """
+        statuses = {
+            s.rule_id: s for s in GroupRuleStatus.objects.filter(
+                group=self.group,
+                rule__in=[r.id for r in rule_list],
+            )
+        }
+
+        missing = [r for r in rule_list if r.id not in statuses]
+        if not missing:
+            return statuses
+
+        try:
+            with transaction.atomic():
+                GroupRuleStatus.objects.bulk_create([
+                    GroupRuleStatus(rule=r, group=self.group, project=self.project)
+                    for r in missing
+                ])
+        except IntegrityError:
+            # another worker created some of them concurrently
+            pass
+
+        # bulk_create does not return primary keys, so fetch them
+        statuses.update({
+            s.rule_id: s for s in GroupRuleStatus.objects.filter(
+                group=self.group,
+                rule__in=[r.id for r in missing],
+            )
+        })
+        for rule in missing:
+            if rule.id not in statuses:
+                statuses[rule.id] = self.get_rule_status(rule)
+        return statuses
+
     def condition_matches(self, condition, state, rule):
-        condition_cls = rules.get(condition['id'])
-        if condition_cls is None:
-            self.logger.warn('Unregistered condition %r', condition['id'])
+        if condition is None:
             return
-
-        condition_inst = condition_cls(self.project, data=condition, rule=rule)
-        return safe_execute(condition_inst.passes, self.event, state, _with_transaction=False)
+        return safe_execute(condition.passes, self.event, state, _with_transaction=False)
 
     def get_state(self):
         return EventState(
@@ -81,33 +204,41 @@ class RuleProcessor(object):
             is_regression=self.is_regression,
             is_new_group_environment=self.is_new_group_environment,
             has_reappeared=self.has_reappeared,
+            frequency_results=self.frequency_results,
         )
 
-    def apply_rule(self, rule):
-        match = rule.data.get('action_match') or Rule.DEFAULT_ACTION_MATCH
-        condition_list = rule.data.get('conditions', ())
-        frequency = rule.data.get('frequency') or Rule.DEFAULT_FREQUENCY
-
-        # XXX(dcramer): if theres no condition should we really skip it,
-        # or should we just apply it blindly?
-        if not condition_list:
-            return
-
-        if rule.environment_id is not None \
-                and self.event.get_environment().id != rule.environment_id:
-            return
-
-        status = self.get_rule_status(rule)
+    def is_rule_throttled(self, compiled, status, now):
+        freq_offset = now - timedelta(minutes=compiled.frequency)
+        return bool(status.last_active and status.last_active > freq_offset)
+
+    def prefetch_frequency_results(self, plan):
+        """
+        Runs the TSDB queries of the frequency conditions in ``plan`` as a
+        single batch when more than one distinct query would be made.
+        """
+        conditions = [
+            c for compiled in plan for c in compiled.conditions
+            if isinstance(c, BaseEventFrequencyCondition)
+        ]
+        query_keys = set(c.get_query_key() for c in conditions)
+        query_keys.discard(None)
+        if len(query_keys) < 2:
+            return None
+        return get_frequency_results(self.event, conditions)
+
+    def apply_rule(self, compiled, status):
+        rule = compiled.rule
+        match = compiled.match
 
         now = timezone.now()
-        freq_offset = now - timedelta(minutes=frequency)
+        freq_offset = now - timedelta(minutes=compiled.frequency)
 
-        if status.last_active and status.last_active > freq_offset:
+        if self.is_rule_throttled(compiled, status, now):
             return
 
         state = self.get_state()
 
-        condition_iter = (self.condition_matches(c, state, rule) for c in condition_list)
+        condition_iter = (self.condition_matches(c, state, rule) for c in compiled.conditions)
 
         if match == 'all':
             passed = all(condition_iter)
@@ -154,6 +285,29 @@ class RuleProcessor(object):
 
     def apply(self):
         self.grouped_futures.clear()
-        for rule in self.get_rules():
-            self.apply_rule(rule)
+        self.frequency_results = None
+
+        environment = None
+        plan = []
+        for compiled in self.get_plan():
+            environment_id = compiled.rule.environment_id
+            if environment_id is not None:
+                if environment is None:
+                    environment = self.event.get_environment()
+                if environment.id != environment_id:
+                    continue
+            plan.append(compiled)
+
+        if not plan:
+            return six.itervalues(self.grouped_futures)
+
+        statuses = self.get_rule_statuses([c.rule for c in plan])
+
+        now = timezone.now()
+        self.frequency_results = self.prefetch_frequency_results([
+            c for c in plan if not self.is_rule_throttled(c, statuses[c.rule.id], now)
+        ])
+
+        for compiled in plan:
+            self.apply_rule(compiled, statuses[compiled.rule.id])
         return six.itervalues(self.grouped_futures)
@@ -7,6 +7,7 @@ sentry.runner.commands.cleanup
 """
 from __future__ import absolute_import, print_function
 
+import time
 from datetime import timedelta
 from uuid import uuid4
 
@@ -44,8 +45,75 @@ def get_project(value):
 # and child proc
 _STOP_WORKER = '91650ec271ae4b3e8a67cdc909d80f8c'
 
+# How long the progress of an interrupted run is kept around to be resumed.
+CHECKPOINT_TTL = 60 * 60 * 24 * 7
 
-def multiprocess_worker(task_queue):
+
+def get_checkpoint_key(model, days, project_id, shard=None):
+    key = u'cleanup:{}:{}:{}'.format(model, days, project_id or '*')
+    if shard is not None:
+        key = u'{}:{}'.format(key, shard)
+    return key
+
+
+def get_shard_plan(query, imp, num_shards):
+    """
+    Returns the id ranges to split the deletion of ``query`` across
+    ``num_shards`` workers. The ranges of an interrupted run are reused, so
+    the per-shard checkpoints stay valid when the run is resumed.
+    """
+    from sentry.cache import default_cache
+
+    key = get_checkpoint_key(imp, query.days, query.project_id)
+    plan = default_cache.get(key)
+    if plan is None or len(plan) > num_shards:
+        plan = query.get_shards(num_shards)
+        default_cache.set(key, plan, CHECKPOINT_TTL)
+    return plan
+
+
+def delete_shard(model, dtfield, days, project_id, min_id, max_id, checkpoint_key,
+                 skip_models=None, chunk_size=100):
+    """
+    Deletes the expired rows of ``model`` within one id range, recording the
+    last processed id after every chunk. Returns the number of rows deleted.
+    """
+    from sentry import deletions
+    from sentry.cache import default_cache
+    from sentry.db.deletion import BulkDeleteQuery
+
+    last_id = default_cache.get(checkpoint_key)
+    if last_id is not None:
+        min_id = last_id
+
+    query = BulkDeleteQuery(
+        model=model,
+        dtfield=dtfield,
+        days=days,
+        project_id=project_id,
+    )
+
+    deleted = 0
+    for chunk in query.iterator_range(chunk_size, min_id=min_id, max_id=max_id):
+        task = deletions.get(
+            model=model,
+            query={'id__in': chunk},
+            skip_models=skip_models,
+            transaction_id=uuid4().hex,
+        )
+
+        while True:
+            if not task.chunk():
+                break
+
+        deleted += len(chunk)
+        default_cache.set(checkpoint_key, chunk[-1], CHECKPOINT_TTL)
+
+    default_cache.delete(checkpoint_key)
+    return deleted
+
+
+def multiprocess_worker(task_queue, result_queue=None):
     # Configure within each Process
     import logging
     from sentry.utils.imports import import_string
@@ -66,7 +134,6 @@ def multiprocess_worker(task_queue):
             configure()
 
             from sentry import models
-            from sentry import deletions
             from sentry import similarity
 
             skip_models = [
@@ -84,23 +151,17 @@ def multiprocess_worker(task_queue):
 
             configured = True
 
-        model, chunk = j
-        model = import_string(model)
+        imp, shard = j
+        model = import_string(imp)
 
+        deleted = 0
         try:
-            task = deletions.get(
-                model=model,
-                query={'id__in': chunk},
-                skip_models=skip_models,
-                transaction_id=uuid4().hex,
-            )
-
-            while True:
-                if not task.chunk():
-                    break
+            deleted = delete_shard(model, skip_models=skip_models, **shard)
         except Exception as e:
             logger.exception(e)
         finally:
+            if result_queue is not None:
+                result_queue.put((imp, deleted))
             task_queue.task_done()
 
 
@@ -124,7 +185,8 @@ def multiprocess_worker(task_queue):
     '-t',
     default=False,
     is_flag=True,
-    help='Send the duration of this command to internal metrics.'
+    help='Send the duration of this command to internal metrics and report the '
+    'deletion rate per model.'
 )
 @log_options()
 def cleanup(days, project, concurrency, silent, model, router, timed):
@@ -142,12 +204,13 @@ def cleanup(days, project, concurrency, silent, model, router, timed):
 
     # Make sure we fork off multiprocessing pool
     # before we import or configure the app
-    from multiprocessing import Process, JoinableQueue as Queue
+    from multiprocessing import Process, JoinableQueue as Queue, Queue as ResultQueue
 
     pool = []
     task_queue = Queue(1000)
+    result_queue = ResultQueue()
     for _ in xrange(concurrency):
-        p = Process(target=multiprocess_worker, args=(task_queue,))
+        p = Process(target=multiprocess_worker, args=(task_queue, result_queue))
         p.daemon = True
         p.start()
         pool.append(p)
@@ -155,15 +218,27 @@ def cleanup(days, project, concurrency, silent, model, router, timed):
     from sentry.runner import configure
     configure()
 
-    from django.db import router as db_router
+    from django.db import connections, router as db_router
     from sentry.app import nodestore
+    from sentry.cache import default_cache
     from sentry.db.deletion import BulkDeleteQuery
     from sentry import models
+    from sentry.utils import metrics
+    from sentry.utils.concurrent import execute
 
-    if timed:
-        import time
-        from sentry.utils import metrics
-        start_time = time.time()
+    start_time = time.time()
+
+    # (model name, rows deleted, duration in seconds) for the `--timed` report
+    report = []
+
+    def record(name, rows, started):
+        duration = time.time() - started
+        report.append((name, rows, duration))
+        if timed:
+            # the row count isn't known for everything (e.g. NodeStore)
+            if rows is not None:
+                metrics.incr('cleanup.rows', amount=rows, instance=name)
+            metrics.timing('cleanup.model.duration', duration, instance=name)
 
     # list of models which this query is restricted to
     model_list = {m.lower() for m in model}
@@ -221,6 +296,7 @@ def cleanup(days, project, concurrency, silent, model, router, timed):
             model.objects.filter(expires_at__lt=timezone.now()).delete()
 
     project_id = None
+    nodestore_cleanup = None
     if project:
         click.echo(
             "Bulk NodeStore deletion not available for project selection", err=True)
@@ -233,11 +309,23 @@ def cleanup(days, project, concurrency, silent, model, router, timed):
             click.echo("Removing old NodeStore values")
 
         cutoff = timezone.now() - timedelta(days=days)
-        try:
-            nodestore.cleanup(cutoff)
-        except NotImplementedError:
-            click.echo(
-                "NodeStore backend does not support cleanup operation", err=True)
+
+        # NodeStore values are independent of the SQL rows removed below, so
+        # they are cleaned up in the background in the meantime.
+        def cleanup_nodestore():
+            started = time.time()
+            try:
+                nodestore.cleanup(cutoff)
+            except NotImplementedError:
+                click.echo(
+                    "NodeStore backend does not support cleanup operation", err=True)
+            else:
+                record('NodeStore', None, started)
+            finally:
+                for connection in connections.all():
+                    connection.close()
+
+        nodestore_cleanup = execute(cleanup_nodestore, daemon=False)
 
     for bqd in BULK_QUERY_DELETES:
         if len(bqd) == 4:
@@ -258,13 +346,15 @@ def cleanup(days, project, concurrency, silent, model, router, timed):
             if not silent:
                 click.echo('>> Skipping %s' % model.__name__)
         else:
-            BulkDeleteQuery(
+            started = time.time()
+            rows = BulkDeleteQuery(
                 model=model,
                 dtfield=dtfield,
                 days=days,
                 project_id=project_id,
                 order_by=order_by,
             ).execute(chunk_size=chunk_size)
+            record(model.__name__, rows, started)
 
     for model, dtfield, order_by in DELETES:
         if not silent:
@@ -280,6 +370,7 @@ def cleanup(days, project, concurrency, silent, model, router, timed):
             if not silent:
                 click.echo('>> Skipping %s' % model.__name__)
         else:
+            started = time.time()
             imp = '.'.join((model.__module__, model.__name__))
 
             q = BulkDeleteQuery(
@@ -290,11 +381,29 @@ def cleanup(days, project, concurrency, silent, model, router, timed):
                 order_by=order_by,
             )
 
-            for chunk in q.iterator(chunk_size=100):
-                task_queue.put((imp, chunk))
+            # Every worker deletes a contiguous id range of the table and
+            # checkpoints its progress, so an interrupted run picks up where
+            # each shard left off.
+            plan = get_shard_plan(q, imp, concurrency)
+            for shard_id, (min_id, max_id) in enumerate(plan):
+                task_queue.put((imp, {
+                    'dtfield': dtfield,
+                    'days': days,
+                    'project_id': project_id,
+                    'min_id': min_id,
+                    'max_id': max_id,
+                    'checkpoint_key': get_checkpoint_key(imp, days, project_id, shard_id),
+                }))
 
             task_queue.join()
 
+            rows = 0
+            for _ in plan:
+                rows += result_queue.get()[1]
+            record(model.__name__, rows, started)
+
+            default_cache.delete(get_checkpoint_key(imp, days, project_id))
+
     # Clean up FileBlob instances which are no longer used and aren't super
     # recent (as there could be a race between blob creation and reference)
     if not silent:
@@ -305,6 +414,9 @@ def cleanup(days, project, concurrency, silent, model, router, timed):
     else:
         cleanup_unused_files(silent)
 
+    if nodestore_cleanup is not None:
+        nodestore_cleanup.result()
+
     # Shut down our pool
     for _ in pool:
         task_queue.put(_STOP_WORKER)
@@ -316,6 +428,13 @@ def cleanup(days, project, concurrency, silent, model, router, timed):
     if timed:
         duration = int(time.time() - start_time)
         metrics.timing('cleanup.duration', duration, instance=router)
+        for name, rows, model_duration in report:
+            if rows is None:
+                click.echo(u"{}: {:.1f} second(s)".format(name, model_duration))
+            else:
+                click.echo(u"{}: {} row(s) in {:.1f} second(s) ({:.1f} rows/s)".format(
+                    name, rows, model_duration, rows / max(model_duration, 0.001),
+                ))
         click.echo("Clean up took %s second(s)." % duration)
 
 
@@ -0,0 +1,68 @@
+from __future__ import absolute_import, print_function
+
+import click
+
+from sentry.runner.decorators import configuration
+
+
+@click.group()
+def nodestore():
+    "Manage node storage."
+
+
+@nodestore.command()
+@click.option('--project', type=click.INT, help='Limit re-encoding to a single project id.')
+@click.option('--chunk-size', default=100, show_default=True, help='Events per nodestore batch.')
+@configuration
+def reencode(project, chunk_size):
+    "Rewrite event payloads using the current node codec."
+    from sentry import nodestore
+    from sentry.models import Event
+    from sentry.utils.canonical import CANONICAL_TYPES
+    from sentry.utils.iterators import chunked
+    from sentry.utils.query import RangeQuerySetWrapper
+
+    queryset = Event.objects.all()
+    if project:
+        queryset = queryset.filter(project_id=project)
+
+    total = 0
+    for events in chunked(RangeQuerySetWrapper(queryset, step=chunk_size), chunk_size):
+        Event.objects.bind_nodes(events, 'data')
+
+        values = {}
+        for event in events:
+            node = event.data
+            if not node.id or not node._node_data:
+                continue
+            # ``bind_data`` strips the reference, it needs to be written back
+            node.bind_ref(event)
+            data = node._node_data
+            if isinstance(data, CANONICAL_TYPES):
+                data = dict(data.items())
+            values[node.id] = data
+
+        if values:
+            nodestore.set_multi(values)
+        total += len(values)
+        click.echo('Re-encoded %d nodes' % (total, ))
+
+
+@nodestore.command('train-dictionary')
+@click.argument('platform')
+@click.argument('output', type=click.File('wb'))
+@click.option('--samples', default=5000, show_default=True, help='Number of recent events to sample.')
+@click.option('--size', default=112640, show_default=True, help='Dictionary size in bytes.')
+@configuration
+def train_dictionary(platform, output, samples, size):
+    "Train a zstd dictionary from recent events of a platform."
+    from sentry.models import Event
+    from sentry.nodestore.codec import train_dictionary
+
+    events = list(Event.objects.filter(platform=platform).order_by('-id')[:samples])
+    if not events:
+        raise click.ClickException('No events found for platform %r.' % (platform, ))
+
+    Event.objects.bind_nodes(events, 'data')
+    output.write(train_dictionary([dict(e.data.items()) for e in events], size=size))
+    click.echo('Trained dictionary from %d events' % (len(events), ))
@@ -264,6 +264,10 @@ def cron(**options):
               help='How many messages to process (may or may not result in an enqueued task) before committing offsets.')
 @click.option('--initial-offset-reset', default='latest', type=click.Choice(['earliest', 'latest']),
               help='Position in the commit log topic to begin reading from when no prior offset has been recorded.')
+@click.option('--worker-count', default=0, type=int,
+              help='Number of threads used to process partitions concurrently. By default messages are processed in the consuming thread.')
+@click.option('--max-in-flight', default=100, type=int,
+              help='Maximum number of unprocessed messages per partition when using worker threads.')
 @log_options()
 @configuration
 def relay(**options):
@@ -276,6 +280,8 @@ def relay(**options):
             synchronize_commit_group=options['synchronize_commit_group'],
             commit_batch_size=options['commit_batch_size'],
             initial_offset_reset=options['initial_offset_reset'],
+            worker_count=options['worker_count'],
+            max_in_flight=options['max_in_flight'],
         )
     except RelayNotRequired:
         sys.stdout.write(
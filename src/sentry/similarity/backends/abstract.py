@@ -19,6 +19,28 @@ class AbstractIndexBackend(object):
     def record(self, scope, key, items, timestamp=None):
         pass
 
+    def classify_multi(self, items, limit=None):
+        """
+        Classifies several sets of features at once. ``items`` is a sequence
+        of ``(scope, items, timestamp)`` tuples, where ``items`` is the same
+        as the ``items`` of ``classify``. Returns the results of each.
+        """
+        return [
+            self.classify(scope, indices, limit=limit, timestamp=timestamp)
+            for scope, indices, timestamp in items
+        ]
+
+    def record_multi(self, items):
+        """
+        Records the features of several keys at once. ``items`` is a sequence
+        of ``(scope, key, items, timestamp)`` tuples, where ``items`` is the
+        same as the ``items`` of ``record``.
+        """
+        return [
+            self.record(scope, key, indices, timestamp=timestamp)
+            for scope, key, indices, timestamp in items
+        ]
+
     @abstractmethod
     def merge(self, scope, destination, items, timestamp=None):
         pass
@@ -1,7 +1,7 @@
 from __future__ import absolute_import
 
 from sentry.similarity.backends.abstract import AbstractIndexBackend
-from sentry.utils.metrics import timer
+from sentry.utils.metrics import timer, timing
 
 
 class MetricsWrapper(AbstractIndexBackend):
@@ -17,6 +17,12 @@ class MetricsWrapper(AbstractIndexBackend):
         with timer(self.template.format(method), tags={self.scope_tag_name: scope}):
             return getattr(self.backend, method)(scope, *args, **kwargs)
 
+    def __instrumented_multi_method_call(self, method, items, *args, **kwargs):
+        # the batch size, so the throughput of backfills can be derived
+        timing(self.template.format(method) + '.items', len(items))
+        with timer(self.template.format(method)):
+            return getattr(self.backend, method)(items, *args, **kwargs)
+
     def record(self, *args, **kwargs):
         return self.__instrumented_method_call('record', *args, **kwargs)
 
@@ -26,6 +32,12 @@ class MetricsWrapper(AbstractIndexBackend):
     def compare(self, *args, **kwargs):
         return self.__instrumented_method_call('compare', *args, **kwargs)
 
+    def record_multi(self, *args, **kwargs):
+        return self.__instrumented_multi_method_call('record_multi', *args, **kwargs)
+
+    def classify_multi(self, *args, **kwargs):
+        return self.__instrumented_multi_method_call('classify_multi', *args, **kwargs)
+
     def merge(self, *args, **kwargs):
         return self.__instrumented_method_call('merge', *args, **kwargs)
 
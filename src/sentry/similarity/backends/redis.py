@@ -3,6 +3,8 @@ from __future__ import absolute_import
 import itertools
 import time
 
+from redis.exceptions import NoScriptError
+
 from sentry.similarity.backends.abstract import AbstractIndexBackend
 from sentry.utils.iterators import chunked
 from sentry.utils.redis import load_script
@@ -47,6 +49,27 @@ class RedisScriptMinHashIndexBackend(AbstractIndexBackend):
         # all redis operations.
         return index(self.cluster, [scope], args)
 
+    def __index_multi(self, requests):
+        # Every request is still a separate script call (the script only
+        # operates on a single scope), but they are all sent in one pipeline.
+        # The cluster client splits the pipeline by node, so this is a single
+        # round trip per host rather than one per request.
+        with self.cluster.pipeline(transaction=False) as pipe:
+            for scope, args in requests:
+                index(pipe, [scope], args)
+            responses = pipe.execute(raise_on_error=False)
+
+        results = []
+        for (scope, args), response in zip(requests, responses):
+            if isinstance(response, NoScriptError):
+                # The script is only loaded on demand when it's called outside
+                # of a pipeline, so retry once it's been loaded on this host.
+                response = self.__index(scope, args)
+            elif isinstance(response, Exception):
+                raise response
+            results.append(response)
+        return results
+
     def _as_search_result(self, results):
         score_replacements = {
             -1.0: None,  # both items don't have the feature (no comparison)
@@ -82,7 +105,7 @@ class RedisScriptMinHashIndexBackend(AbstractIndexBackend):
             key=get_comparison_key,
         )
 
-    def classify(self, scope, items, limit=None, timestamp=None):
+    def __get_classify_arguments(self, scope, items, limit, timestamp):
         if timestamp is None:
             timestamp = int(time.time())
 
@@ -102,7 +125,24 @@ class RedisScriptMinHashIndexBackend(AbstractIndexBackend):
             arguments.extend([idx, threshold])
             arguments.extend(self._build_signature_arguments(features))
 
-        return self._as_search_result(self.__index(scope, arguments))
+        return arguments
+
+    def classify(self, scope, items, limit=None, timestamp=None):
+        return self._as_search_result(
+            self.__index(scope, self.__get_classify_arguments(scope, items, limit, timestamp)),
+        )
+
+    def classify_multi(self, items, limit=None):
+        if not items:
+            return []
+
+        return map(
+            self._as_search_result,
+            self.__index_multi([
+                (scope, self.__get_classify_arguments(scope, indices, limit, timestamp))
+                for scope, indices, timestamp in items
+            ]),
+        )
 
     def compare(self, scope, key, items, limit=None, timestamp=None):
         if timestamp is None:
@@ -126,10 +166,7 @@ class RedisScriptMinHashIndexBackend(AbstractIndexBackend):
 
         return self._as_search_result(self.__index(scope, arguments))
 
-    def record(self, scope, key, items, timestamp=None):
-        if not items:
-            return  # nothing to do
-
+    def __get_record_arguments(self, scope, key, items, timestamp):
         if timestamp is None:
             timestamp = int(time.time())
 
@@ -149,7 +186,23 @@ class RedisScriptMinHashIndexBackend(AbstractIndexBackend):
             arguments.append(idx)
             arguments.extend(self._build_signature_arguments(features))
 
-        return self.__index(scope, arguments)
+        return arguments
+
+    def record(self, scope, key, items, timestamp=None):
+        if not items:
+            return  # nothing to do
+
+        return self.__index(scope, self.__get_record_arguments(scope, key, items, timestamp))
+
+    def record_multi(self, items):
+        requests = [
+            (scope, self.__get_record_arguments(scope, key, indices, timestamp))
+            for scope, key, indices, timestamp in items
+        ]
+        if not requests:
+            return []  # nothing to do
+
+        return self.__index_multi(requests)
 
     def merge(self, scope, destination, items, timestamp=None):
         if timestamp is None:
@@ -5,6 +5,7 @@ import itertools
 import logging
 
 from sentry.utils.dates import to_timestamp
+from sentry.utils.iterators import chunked
 
 logger = logging.getLogger('sentry.similarity')
 
@@ -93,6 +94,29 @@ class FeatureSet(object):
                 )
         return results
 
+    def __extract_encoded(self, event):
+        # Returns ``(label, features)`` for every label with features that
+        # could be extracted from ``event`` and encoded.
+        results = []
+        for label, features in self.extract(event).items():
+            try:
+                features = map(self.encoder.dumps, features)
+            except Exception as error:
+                log = (
+                    logger.debug if isinstance(error, self.expected_encoding_errors) else
+                    functools.partial(logger.warning, exc_info=True)
+                )
+                log(
+                    'Could not encode features from %r for %r due to error: %r',
+                    event,
+                    label,
+                    error,
+                )
+            else:
+                if features:
+                    results.append((label, features))
+        return results
+
     def record(self, events):
         if not events:
             return []
@@ -102,7 +126,7 @@ class FeatureSet(object):
 
         items = []
         for event in events:
-            for label, features in self.extract(event).items():
+            for label, features in self.__extract_encoded(event):
                 if scope is None:
                     scope = self.__get_scope(event.project)
                 else:
@@ -117,22 +141,7 @@ class FeatureSet(object):
                         event.group
                     ) == key, 'all events must be associated with the same group'
 
-                try:
-                    features = map(self.encoder.dumps, features)
-                except Exception as error:
-                    log = (
-                        logger.debug if isinstance(error, self.expected_encoding_errors) else
-                        functools.partial(logger.warning, exc_info=True)
-                    )
-                    log(
-                        'Could not encode features from %r for %r due to error: %r',
-                        event,
-                        label,
-                        error,
-                    )
-                else:
-                    if features:
-                        items.append((self.aliases[label], features, ))
+                items.append((self.aliases[label], features, ))
 
         return self.index.record(
             scope,
@@ -141,6 +150,36 @@ class FeatureSet(object):
             timestamp=int(to_timestamp(event.datetime)),
         )
 
+    def record_multi(self, events, batch_size=100):
+        """
+        Records events of any number of groups (and projects), sending them
+        to the index in batches of ``batch_size`` events. ``events`` may be
+        any iterable, so large backfills can be streamed through this.
+        Returns the number of events that were recorded.
+        """
+        count = 0
+        for batch in chunked(events, batch_size):
+            items = []
+            for event in batch:
+                indices = [
+                    (self.aliases[label], features, )
+                    for label, features in self.__extract_encoded(event)
+                ]
+
+                if indices:
+                    items.append((
+                        self.__get_scope(event.project),
+                        self.__get_key(event.group),
+                        indices,
+                        int(to_timestamp(event.datetime)),
+                    ))
+
+            if items:
+                self.index.record_multi(items)
+                count += len(items)
+
+        return count
+
     def classify(self, events, limit=None, thresholds=None):
         if not events:
             return []
@@ -153,7 +192,7 @@ class FeatureSet(object):
         labels = []
         items = []
         for event in events:
-            for label, features in self.extract(event).items():
+            for label, features in self.__extract_encoded(event):
                 if scope is None:
                     scope = self.__get_scope(event.project)
                 else:
@@ -161,23 +200,8 @@ class FeatureSet(object):
                         event.project
                     ) == scope, 'all events must be associated with the same project'
 
-                try:
-                    features = map(self.encoder.dumps, features)
-                except Exception as error:
-                    log = (
-                        logger.debug if isinstance(error, self.expected_encoding_errors) else
-                        functools.partial(logger.warning, exc_info=True)
-                    )
-                    log(
-                        'Could not encode features from %r for %r due to error: %r',
-                        event,
-                        label,
-                        error,
-                    )
-                else:
-                    if features:
-                        items.append((self.aliases[label], thresholds.get(label, 0), features))
-                        labels.append(label)
+                items.append((self.aliases[label], thresholds.get(label, 0), features))
+                labels.append(label)
 
         return map(
             lambda key__scores: (
@@ -1,23 +1,41 @@
 from __future__ import absolute_import
 
 import mmh3
+from functools32 import lru_cache
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class MinHashSignatureBuilder(object):
-    def __init__(self, columns, rows):
+    """
+    Builds MinHash signatures of ``columns`` values in ``[0, rows)``.
+
+    The value of a column is the minimum of ``mmh3.hash(feature, column)``
+    over all features. Changing how these values are computed would
+    invalidate every signature stored in the index, so instead the hashes
+    of each feature for all columns are computed once and kept in an LRU
+    cache: most features (stack frame pairs, message shingles) repeat across
+    the events of a group, so they rarely need to be hashed again. The
+    minimums are taken over the cached rows with NumPy, when it's installed.
+    """
+
+    def __init__(self, columns, rows, cache_size=10000):
         self.columns = columns
         self.rows = rows
+        self.get_feature_hashes = lru_cache(maxsize=cache_size)(self.__get_feature_hashes)
+
+    def __get_feature_hashes(self, feature):
+        return tuple(mmh3.hash(feature, column) % self.rows for column in range(self.columns))
 
     def __call__(self, features):
-        return map(
-            lambda column: min(
-                map(
-                    lambda feature: mmh3.hash(
-                        feature,
-                        column,
-                    ) % self.rows,
-                    features,
-                ),
-            ),
-            range(self.columns),
-        )
+        hashes = map(self.get_feature_hashes, set(features))
+        if not hashes:
+            raise ValueError('Cannot build a signature without any features.')
+
+        if numpy is None:
+            return map(min, zip(*hashes))
+        # ``tolist`` converts NumPy scalars back into Python integers
+        return numpy.array(hashes, dtype=numpy.int64).min(axis=0).tolist()
@@ -6,10 +6,13 @@ from datetime import datetime
 from django.utils import timezone
 
 from collections import namedtuple
+from django.conf import settings
 
 from sentry.models import Project, Release
+from sentry.utils import json, metrics
 from sentry.utils.cache import cache
 from sentry.utils.hashlib import hash_values
+from sentry.utils.localcache import LocalCache
 from sentry.utils.safe import get_path, safe_execute
 
 
@@ -20,6 +23,26 @@ StacktraceInfo.__hash__ = lambda x: id(x)
 StacktraceInfo.__eq__ = lambda a, b: a is b
 StacktraceInfo.__ne__ = lambda a, b: a is not b
 
+FRAME_CACHE_TIMEOUT = 3600
+
+_local_frame_cache = None
+
+
+def get_local_frame_cache():
+    """
+    Returns the optional in-process cache for processed frames, or ``None``
+    if ``SENTRY_FRAME_CACHE_LOCAL_SIZE`` is not set. Frame cache keys are
+    derived from everything that goes into processing a frame, so entries
+    never need to be invalidated.
+    """
+    global _local_frame_cache
+    max_size = getattr(settings, 'SENTRY_FRAME_CACHE_LOCAL_SIZE', 0)
+    if not max_size:
+        return None
+    if _local_frame_cache is None or _local_frame_cache.max_size != max_size:
+        _local_frame_cache = LocalCache('frames', max_size=max_size, ttl=FRAME_CACHE_TIMEOUT)
+    return _local_frame_cache
+
 
 class ProcessableFrame(object):
     def __init__(self, frame, idx, processor, stacktrace_info, processable_frames):
@@ -30,6 +53,7 @@ class ProcessableFrame(object):
         self.data = None
         self.cache_key = None
         self.cache_value = None
+        self.pending_cache_value = None
         self.processable_frames = processable_frames
 
     def __repr__(self):
@@ -59,8 +83,10 @@ class ProcessableFrame(object):
         return self.processable_frames[last_idx]
 
     def set_cache_value(self, value):
+        # The value is written together with those of all other frames when
+        # the processing task is closed (see ``store_frame_cache``.)
         if self.cache_key is not None:
-            cache.set(self.cache_key, value, 3600)
+            self.pending_cache_value = value
             return True
         return False
 
@@ -80,6 +106,7 @@ class StacktraceProcessingTask(object):
         self.processors = processors
 
     def close(self):
+        store_frame_cache(self.iter_processable_frames())
         for frame in self.iter_processable_frames():
             frame.close()
 
@@ -308,12 +335,63 @@ def process_single_stacktrace(processing_task, stacktrace_info, processable_fram
 
 
 def lookup_frame_cache(keys):
+    """
+    Looks up the cached processing results for ``keys`` with a single
+    round trip to the cache, consulting the local frame cache first if it
+    is enabled.
+    """
+    keys = list(keys)
     rv = {}
-    for key in keys:
-        rv[key] = cache.get(key)
+    if not keys:
+        return rv
+
+    requested = len(keys)
+
+    local_cache = get_local_frame_cache()
+    if local_cache is not None:
+        for key in keys:
+            value = local_cache.get(key)
+            if value is not None:
+                rv[key] = json.loads(value)
+        keys = [k for k in keys if k not in rv]
+
+    if keys:
+        with metrics.timer('stacktraces.frame_cache.get_many'):
+            results = cache.get_many(keys)
+        for key, value in six.iteritems(results):
+            if value is not None:
+                rv[key] = value
+                if local_cache is not None:
+                    local_cache.set(key, json.dumps(value))
+
+    metrics.timing('stacktraces.frame_cache.keys', requested)
+    metrics.timing('stacktraces.frame_cache.hits', len(rv))
     return rv
 
 
+def store_frame_cache(processable_frames):
+    """
+    Writes the values set with ``ProcessableFrame.set_cache_value`` with a
+    single round trip to the cache.
+    """
+    values = {}
+    for processable_frame in processable_frames:
+        if processable_frame.pending_cache_value is not None:
+            values[processable_frame.cache_key] = processable_frame.pending_cache_value
+            processable_frame.pending_cache_value = None
+
+    if not values:
+        return
+
+    with metrics.timer('stacktraces.frame_cache.set_many'):
+        cache.set_many(values, FRAME_CACHE_TIMEOUT)
+
+    local_cache = get_local_frame_cache()
+    if local_cache is not None:
+        for key, value in six.iteritems(values):
+            local_cache.set(key, json.dumps(value))
+
+
 def get_stacktrace_processing_task(infos, processors):
     """Returns a list of all tasks for the processors.  This can skip over
     processors that seem to not handle any frames.
@@ -331,11 +409,13 @@ def get_stacktrace_processing_task(infos, processors):
             by_stacktrace_info.setdefault(processable_frame.stacktrace_info, []) \
                 .append(processable_frame)
             if processable_frame.cache_key is not None:
-                to_lookup[processable_frame.cache_key] = processable_frame
+                to_lookup.setdefault(processable_frame.cache_key, []) \
+                    .append(processable_frame)
 
     frame_cache = lookup_frame_cache(to_lookup)
-    for cache_key, processable_frame in six.iteritems(to_lookup):
-        processable_frame.cache_value = frame_cache.get(cache_key)
+    for cache_key, processable_frames in six.iteritems(to_lookup):
+        for processable_frame in processable_frames:
+            processable_frame.cache_value = frame_cache.get(cache_key)
 
     return StacktraceProcessingTask(
         processable_stacktraces=by_stacktrace_info, processors=by_processor
@@ -287,6 +287,18 @@ class SnubaTagStorage(TagStorage):
         }
 
     def get_group_seen_values_for_environments(self, project_ids, group_id_list, environment_ids):
+        params, callback = self.get_group_seen_values_for_environments_query(
+            project_ids, group_id_list, environment_ids)
+        return callback(snuba.bulk_query([params])[0])
+
+    def get_group_seen_values_for_environments_query(self, project_ids, group_id_list,
+                                                     environment_ids):
+        """
+        Returns the ``SnubaQueryParams`` for
+        ``get_group_seen_values_for_environments`` and a callback turning
+        the query result into its return value, so the query can be sent
+        together with others through ``snuba.bulk_query``.
+        """
         # Get the total times seen, first seen, and last seen across multiple environments
 
         # TODO(jess): this is mostly copy paste from above
@@ -307,12 +319,16 @@ class SnubaTagStorage(TagStorage):
             ['max', SEEN_COLUMN, 'last_seen'],
         ]
 
-        result = snuba.query(start, end, ['issue'], conditions, filters, aggregations,
-                             referrer='tagstore.get_group_seen_values_for_environments')
+        params = snuba.SnubaQueryParams(
+            start, end, ['issue'], conditions, filters, aggregations,
+            referrer='tagstore.get_group_seen_values_for_environments')
 
-        return {
-            issue: fix_tag_value_data(data) for issue, data in six.iteritems(result)
-        }
+        def callback(result):
+            return {
+                issue: fix_tag_value_data(data) for issue, data in six.iteritems(result)
+            }
+
+        return params, callback
 
     def get_group_tag_value_count(self, project_id, group_id, environment_id, key):
         start, end = self.get_time_range()
@@ -497,6 +513,15 @@ class SnubaTagStorage(TagStorage):
         return values
 
     def get_groups_user_counts(self, project_ids, group_ids, environment_ids):
+        params, callback = self.get_groups_user_counts_query(
+            project_ids, group_ids, environment_ids)
+        return callback(snuba.bulk_query([params])[0])
+
+    def get_groups_user_counts_query(self, project_ids, group_ids, environment_ids):
+        """
+        Returns the ``SnubaQueryParams`` for ``get_groups_user_counts`` and a
+        callback turning the query result into its return value.
+        """
         start, end = self.get_time_range()
         filters = {
             'project_id': project_ids,
@@ -506,9 +531,14 @@ class SnubaTagStorage(TagStorage):
             filters['environment'] = environment_ids
         aggregations = [['uniq', 'tags[sentry:user]', 'count']]
 
-        result = snuba.query(start, end, ['issue'], None, filters, aggregations,
-                             referrer='tagstore.get_groups_user_counts')
-        return defaultdict(int, {k: v for k, v in result.items() if v})
+        params = snuba.SnubaQueryParams(
+            start, end, ['issue'], None, filters, aggregations,
+            referrer='tagstore.get_groups_user_counts')
+
+        def callback(result):
+            return defaultdict(int, {k: v for k, v in result.items() if v})
+
+        return params, callback
 
     def get_tag_value_paginator(self, project_id, environment_id, key, query=None,
                                 order_by='-last_seen'):
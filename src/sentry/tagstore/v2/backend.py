@@ -663,6 +663,38 @@ class V2TagStorage(TagStorage):
                         },
                         extra=extra)
 
+    def incr_tag_values_times_seen(self, project_id, group_id, environment_id,
+                                   tags, last_seen, count=1):
+        items = []
+        for env in [environment_id, AGGREGATE_ENVIRONMENT_ID]:
+            for key, value, data in tags:
+                tagkey, _ = self.get_or_create_tag_key(project_id, env, key)
+                tagvalue, _ = self.get_or_create_tag_value(
+                    project_id, env, key, value, key_id=tagkey.id)
+
+                items.append((models.TagValue, {
+                    'times_seen': count,
+                }, {
+                    'project_id': project_id,
+                    '_key_id': tagkey.id,
+                    'value': value,
+                }, {
+                    'last_seen': last_seen,
+                    'data': data,
+                }))
+                items.append((models.GroupTagValue, {
+                    'times_seen': count,
+                }, {
+                    'project_id': project_id,
+                    'group_id': group_id,
+                    '_key_id': tagkey.id,
+                    '_value_id': tagvalue.id,
+                }, {
+                    'project_id': project_id,
+                    'last_seen': last_seen,
+                }))
+        buffer.incr_multi(items)
+
     def get_group_event_filter(self, project_id, group_id, environment_id, tags):
         # NOTE: `environment_id=None` needs to be filtered differently in this method.
         # EventTag never has NULL `environment_id` fields (individual Events always have an environment),
@@ -83,6 +83,20 @@ def assemble_dif(project_id, name, checksum, chunks, **kwargs):
             file.delete()
 
 
+@instrumented_task(name='sentry.tasks.assemble.build_sourcemap_index', queue='assemble')
+def build_sourcemap_index(file_id, **kwargs):
+    from sentry.models import File
+    from sentry.lang.javascript.sourcemapindex import store_sourcemap_index
+
+    try:
+        file = File.objects.get(id=file_id)
+    except File.DoesNotExist:
+        return
+
+    if store_sourcemap_index(file) is None:
+        logger.info('sourcemap.index.skipped', extra={'file_id': file_id})
+
+
 def assemble_file(project, name, checksum, chunks, file_type):
     '''This assembles multiple chunks into on File.'''
     from sentry.models import File, ChunkFileState, AssembleChecksumMismatch, \
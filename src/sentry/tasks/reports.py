@@ -8,7 +8,7 @@ import math
 import operator
 import zlib
 from calendar import Calendar
-from collections import OrderedDict, namedtuple
+from collections import OrderedDict, defaultdict, namedtuple
 from datetime import datetime, timedelta
 
 import pytz
@@ -16,10 +16,11 @@ from django.utils import dateformat, timezone
 
 from sentry.app import tsdb
 from sentry.models import (
-    Activity, GroupStatus, Organization, OrganizationStatus, Project, Team, User, UserOption
+    Activity, Group, GroupStatus, Organization, OrganizationStatus, Project, Team, User,
+    UserOption
 )
 from sentry.tasks.base import instrumented_task
-from sentry.utils import json, redis
+from sentry.utils import json, metrics, redis
 from sentry.utils.dates import floor_to_utc_day, to_datetime, to_timestamp
 from sentry.utils.email import MessageBuilder
 from sentry.utils.math import mean
@@ -159,27 +160,23 @@ def prepare_project_series(start__stop, project, rollup=60 * 60 * 24):
     resolution, series = tsdb.get_optimal_rollup_series(start, stop, rollup)
     assert resolution == rollup, 'resolution does not match requested value'
     clean = functools.partial(clean_series, start, stop, rollup)
-    return merge_series(
-        reduce(
-            merge_series,
-            map(
-                clean,
-                tsdb.get_range(
-                    tsdb.models.group,
-                    list(
-                        project.group_set.filter(
-                            status=GroupStatus.RESOLVED,
-                            resolved_at__gte=start,
-                            resolved_at__lt=stop,
-                        ).values_list('id', flat=True),
-                    ),
-                    start,
-                    stop,
-                    rollup=rollup,
-                ).values(),
-            ),
-            clean([(timestamp, 0) for timestamp in series]),
+    # the resolved group series are summed as one array rather than merged
+    # pairwise, since there can be thousands of them
+    resolved = tsdb.get_range_series(
+        tsdb.models.group,
+        list(
+            project.group_set.filter(
+                status=GroupStatus.RESOLVED,
+                resolved_at__gte=start,
+                resolved_at__lt=stop,
+            ).values_list('id', flat=True),
         ),
+        start,
+        stop,
+        rollup=rollup,
+    ).sum()
+    return merge_series(
+        clean(resolved),
         clean(
             tsdb.get_range(
                 tsdb.models.project,
@@ -372,6 +369,172 @@ def prepare_project_calendar_series(interval, project):
     )
 
 
+def prepare_projects_series(start__stop, projects, rollup=60 * 60 * 24):
+    start, stop = start__stop
+    resolution, series = tsdb.get_optimal_rollup_series(start, stop, rollup)
+    assert resolution == rollup, 'resolution does not match requested value'
+    clean = functools.partial(clean_series, start, stop, rollup)
+    project_ids = [project.id for project in projects]
+
+    resolved_issue_ids = defaultdict(list)
+    for project_id, group_id in Group.objects.filter(
+        project_id__in=project_ids,
+        status=GroupStatus.RESOLVED,
+        resolved_at__gte=start,
+        resolved_at__lt=stop,
+    ).values_list('project_id', 'id'):
+        resolved_issue_ids[project_id].append(group_id)
+
+    resolved = tsdb.get_range_series(
+        tsdb.models.group,
+        [group_id for group_ids in resolved_issue_ids.values() for group_id in group_ids],
+        start,
+        stop,
+        rollup=rollup,
+    )
+    totals = tsdb.get_range(
+        tsdb.models.project,
+        project_ids,
+        start,
+        stop,
+        rollup=rollup,
+    )
+
+    return {
+        project_id: merge_series(
+            clean(resolved.sum(resolved_issue_ids[project_id])),
+            clean(totals[project_id]),
+            lambda resolved, total: (
+                resolved,
+                total - resolved,  # unresolved
+            ),
+        ) for project_id in project_ids
+    }
+
+
+def prepare_projects_aggregates(ignore__stop, projects):
+    _, stop = ignore__stop
+    segments = 4
+    period = timedelta(days=7)
+    start = stop - (period * segments)
+    project_ids = [project.id for project in projects]
+
+    sums = [
+        tsdb.get_sums(
+            tsdb.models.project,
+            project_ids,
+            start + (period * i),
+            start + (period * (i + 1) - timedelta(seconds=1)),
+            rollup=60 * 60 * 24,
+        ) for i in range(segments)
+    ]
+
+    return {project_id: [s[project_id] for s in sums] for project_id in project_ids}
+
+
+def prepare_projects_issue_summaries(interval, projects):
+    start, stop = interval
+    project_ids = [project.id for project in projects]
+
+    queryset = Group.objects.filter(
+        project_id__in=project_ids,
+    ).exclude(status=GroupStatus.IGNORED)
+
+    new_issue_ids = defaultdict(set)
+    for project_id, group_id in queryset.filter(
+        first_seen__gte=start,
+        first_seen__lt=stop,
+    ).values_list('project_id', 'id'):
+        new_issue_ids[project_id].add(group_id)
+
+    # See ``prepare_project_issue_summaries`` for why this uses a subselect.
+    reopened_issue_ids = defaultdict(set)
+    for project_id, group_id in Activity.objects.filter(
+        group__in=queryset.filter(
+            last_seen__gte=start,
+            last_seen__lt=stop,
+            resolved_at__isnull=False,  # signals this has *ever* been resolved
+        ),
+        type__in=(Activity.SET_REGRESSION, Activity.SET_UNRESOLVED, ),
+        datetime__gte=start,
+        datetime__lt=stop,
+    ).distinct().values_list('group__project_id', 'group_id'):
+        reopened_issue_ids[project_id].add(group_id)
+
+    rollup = 60 * 60 * 24
+
+    issue_ids = set()
+    for group_ids in itertools.chain(new_issue_ids.values(), reopened_issue_ids.values()):
+        issue_ids.update(group_ids)
+
+    event_counts = tsdb.get_sums(
+        tsdb.models.group,
+        issue_ids,
+        start,
+        stop,
+        rollup=rollup,
+    )
+    project_counts = tsdb.get_sums(
+        tsdb.models.project,
+        project_ids,
+        start,
+        stop,
+        rollup=rollup,
+    )
+
+    results = {}
+    for project_id in project_ids:
+        new_issue_count = sum(event_counts[id] for id in new_issue_ids[project_id])
+        reopened_issue_count = sum(event_counts[id] for id in reopened_issue_ids[project_id])
+        results[project_id] = [
+            new_issue_count,
+            reopened_issue_count,
+            max(project_counts[project_id] - new_issue_count - reopened_issue_count, 0),
+        ]
+    return results
+
+
+def prepare_projects_usage_summary(start__stop, projects):
+    start, stop = start__stop
+    project_ids = [project.id for project in projects]
+    blacklisted, rejected = [
+        tsdb.get_sums(
+            model,
+            project_ids,
+            start,
+            stop,
+            rollup=60 * 60 * 24,
+        ) for model in (tsdb.models.project_total_blacklisted, tsdb.models.project_total_rejected)
+    ]
+    return {
+        project_id: (blacklisted[project_id], rejected[project_id])
+        for project_id in project_ids
+    }
+
+
+def prepare_projects_calendar_series(interval, projects):
+    start, stop = get_calendar_query_range(interval, 3)
+
+    rollup = 60 * 60 * 24
+    series = tsdb.get_range(
+        tsdb.models.project,
+        [project.id for project in projects],
+        start,
+        stop,
+        rollup=rollup,
+    )
+
+    return {
+        project.id: clean_calendar_data(
+            project,
+            series[project.id],
+            start,
+            stop,
+            rollup,
+        ) for project in projects
+    }
+
+
 def build(name, fields):
     names, prepare_fields, merge_fields = zip(*fields)
 
@@ -413,13 +576,58 @@ Report, prepare_project_report, merge_reports = build(
 )
 
 
+# The batch versions of the ``Report`` field preparation functions, in the
+# same order as the fields. Each returns a mapping of project ID to value.
+prepare_projects_report_fields = [
+    prepare_projects_series,
+    prepare_projects_aggregates,
+    prepare_projects_issue_summaries,
+    prepare_projects_usage_summary,
+    prepare_projects_calendar_series,
+]
+
+assert len(prepare_projects_report_fields) == len(Report._fields)
+
+
+def prepare_projects_reports(interval, projects):
+    """
+    Builds the reports for several projects of the same organization at
+    once, returning a mapping of project ID to ``Report``.
+
+    The reports are the same as the ones of ``prepare_project_report``, but
+    each statistic is fetched with one TSDB call (or SQL query) for all of
+    the projects, rather than one per project.
+    """
+    fields = [prepare(interval, projects) for prepare in prepare_projects_report_fields]
+    return {
+        project.id: Report(*[field[project.id] for field in fields])
+        for project in projects
+    }
+
+
 class ReportBackend(object):
+    # the number of projects for which reports are built at once
+    batch_size = 100
+
     def build(self, timestamp, duration, project):
         return prepare_project_report(
             _to_interval(timestamp, duration),
             project,
         )
 
+    def build_many(self, timestamp, duration, projects):
+        """
+        Builds reports for ``projects``, yielding ``(project, report)``
+        pairs as each batch of projects is completed.
+        """
+        interval = _to_interval(timestamp, duration)
+        projects = list(projects)
+        for i in range(0, len(projects), self.batch_size):
+            batch = projects[i:i + self.batch_size]
+            reports = prepare_projects_reports(interval, batch)
+            for project in batch:
+                yield project, reports[project.id]
+
     def prepare(self, timestamp, duration, organization):
         """
         Build and store reports for all projects in the organization.
@@ -477,20 +685,39 @@ class RedisReportBackend(ReportBackend):
         return Report(*json.loads(zlib.decompress(value)))
 
     def prepare(self, timestamp, duration, organization):
-        reports = {}
-        for project in organization.project_set.all():
-            reports[project.id] = self.__encode(
-                self.build(timestamp, duration, project),
-            )
+        key = self.__make_key(timestamp, duration, organization)
+
+        # Reports are written as each batch of projects completes, so if a
+        # previous attempt failed part of the way through, the projects it
+        # already stored can be skipped.
+        with self.cluster.map() as client:
+            existing = client.hkeys(key)
+        existing = set(int(project_id) for project_id in existing.value)
+
+        projects = [
+            project for project in organization.project_set.all()
+            if project.id not in existing
+        ]
+
+        tags = {'resumed': bool(existing)}
+        metrics.timing('reports.prepare.projects', len(projects), tags=tags)
+
+        with metrics.timer('reports.prepare.duration', tags=tags):
+            reports = {}
+            for project, report in self.build_many(timestamp, duration, projects):
+                reports[project.id] = self.__encode(report)
+                if len(reports) >= self.batch_size:
+                    self.__store(key, reports)
+                    reports = {}
 
-        if not reports:
             # XXX: HMSET requires at least one key/value pair, so we need to
             # protect ourselves here against organizations that were created
             # but haven't set up any projects yet.
-            return
+            if reports:
+                self.__store(key, reports)
 
+    def __store(self, key, reports):
         with self.cluster.map() as client:
-            key = self.__make_key(timestamp, duration, organization)
             client.hmset(key, reports)
             client.expire(key, self.ttl)
 
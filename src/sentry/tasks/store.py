@@ -13,13 +13,14 @@ from datetime import datetime
 import six
 
 from time import time
+from django.conf import settings
 from django.utils import timezone
 
 from sentry import features, reprocessing
 from sentry.attachments import attachment_cache
 from sentry.cache import default_cache
 from sentry.tasks.base import instrumented_task
-from sentry.utils import metrics
+from sentry.utils import json, metrics
 from sentry.utils.safe import safe_execute
 from sentry.stacktraces import process_stacktraces, \
     should_process_for_stacktraces
@@ -82,7 +83,7 @@ def _do_preprocess_event(cache_key, data, start_time, event_id, process_event):
     # so we can jump directly to save_event
     if cache_key:
         data = None
-    save_event.delay(
+    submit_save_event(
         cache_key=cache_key, data=data, start_time=start_time, event_id=event_id,
         project_id=project
     )
@@ -190,7 +191,7 @@ def _do_process_event(cache_key, start_time, event_id, process_task):
             data = dict(data.items())
         default_cache.set(cache_key, data, 3600)
 
-    save_event.delay(
+    submit_save_event(
         cache_key=cache_key, data=None, start_time=start_time, event_id=event_id,
         project_id=project
     )
@@ -343,9 +344,50 @@ def save_attachment(event, attachment):
     )
 
 
-@instrumented_task(name='sentry.tasks.store.save_event', queue='events.save_event')
-def save_event(cache_key=None, data=None, start_time=None, event_id=None,
-               project_id=None, **kwargs):
+def get_save_event_batch_key(project_id):
+    return u'save_event:pending:{}'.format(project_id)
+
+
+def get_save_event_batch_client(project_id):
+    from sentry.utils.redis import clusters
+    return clusters.get(settings.SENTRY_SAVE_EVENT_BATCH_CLUSTER).get_local_client_for_key(
+        get_save_event_batch_key(project_id))
+
+
+def submit_save_event(cache_key=None, data=None, start_time=None, event_id=None,
+                      project_id=None):
+    """
+    Schedules saving an event. If batching is enabled, events that are in the
+    cache are queued per project and saved by ``save_event_batch`` in groups
+    of up to ``SENTRY_SAVE_EVENT_BATCH_SIZE``.
+    """
+    if settings.SENTRY_SAVE_EVENT_BATCH_SIZE > 1 and cache_key:
+        key = get_save_event_batch_key(project_id)
+        try:
+            with get_save_event_batch_client(project_id).pipeline() as pipe:
+                pipe.rpush(key, json.dumps({
+                    'cache_key': cache_key,
+                    'start_time': start_time,
+                    'event_id': event_id,
+                }))
+                pipe.expire(key, 3600)
+                pipe.execute()
+        except Exception:
+            error_logger.warning('save_event_batch.submit-failed', exc_info=True)
+        else:
+            # Every queued event is followed by a task, so nothing is left
+            # behind if an earlier task already drained this event.
+            save_event_batch.delay(project_id=project_id)
+            return
+
+    save_event.delay(
+        cache_key=cache_key, data=data, start_time=start_time, event_id=event_id,
+        project_id=project_id
+    )
+
+
+def _do_save_event(cache_key=None, data=None, start_time=None, event_id=None,
+                   project_id=None, batch=None, **kwargs):
     """
     Saves an event to the database.
     """
@@ -353,7 +395,7 @@ def save_event(cache_key=None, data=None, start_time=None, event_id=None,
     from sentry import quotas, tsdb
     from sentry.models import ProjectKey
 
-    if cache_key:
+    if cache_key and data is None:
         data = default_cache.get(cache_key)
 
     if data is not None:
@@ -394,7 +436,7 @@ def save_event(cache_key=None, data=None, start_time=None, event_id=None,
     event = None
     try:
         manager = EventManager(data)
-        event = manager.save(project_id, assume_normalized=True)
+        event = manager.save(project_id, assume_normalized=True, batch=batch)
 
         # Always load attachments from the cache so we can later prune them.
         # Only save them if the event-attachments feature is active, though.
@@ -439,17 +481,145 @@ def save_event(cache_key=None, data=None, start_time=None, event_id=None,
         )
 
     finally:
-        if cache_key:
-            default_cache.delete(cache_key)
-
-            # For the unlikely case that we did not manage to persist the
-            # event we also delete the key always.
-            if event is None or \
-               features.has('organizations:event-attachments', event.project.organization, actor=None):
-                attachment_cache.delete(cache_key)
+        # Events saved with a batch are only stored once the batch has been
+        # committed, so ``save_event_batch`` cleans up after them.
+        if cache_key and batch is None:
+            _delete_cached_event(cache_key, event)
 
         if start_time:
             metrics.timing(
                 'events.time-to-process',
                 time() - start_time,
                 instance=data['platform'])
+
+    return event
+
+
+def _delete_cached_event(cache_key, event):
+    default_cache.delete(cache_key)
+
+    # For the unlikely case that we did not manage to persist the
+    # event we also delete the key always.
+    if event is None or \
+       features.has('organizations:event-attachments', event.project.organization, actor=None):
+        attachment_cache.delete(cache_key)
+
+
+def _delete_event_attachments(event):
+    for attachment in EventAttachment.objects.filter(
+        project_id=event.project_id,
+        event_id=event.event_id,
+    ).select_related('file'):
+        attachment.delete()
+
+
+@instrumented_task(name='sentry.tasks.store.save_event', queue='events.save_event')
+def save_event(cache_key=None, data=None, start_time=None, event_id=None,
+               project_id=None, **kwargs):
+    _do_save_event(cache_key, data, start_time, event_id, project_id, **kwargs)
+
+
+@instrumented_task(name='sentry.tasks.store.save_event_batch', queue='events.save_event')
+def save_event_batch(project_id, **kwargs):
+    """
+    Saves up to ``SENTRY_SAVE_EVENT_BATCH_SIZE`` events that were queued for
+    the project by ``submit_save_event``.
+
+    Events that are already stored (or repeated in the batch) are skipped,
+    the grouping hashes of all events are resolved with one query, and their
+    rows and node data are written in one transaction (see ``EventBatch``).
+    Every event is still saved in isolation: an event that fails to save is
+    logged and does not affect the others. Like with ``save_event``, events
+    that could not be written are dropped together with their cached data and
+    stored attachments (their counters have already been recorded, so they
+    are not submitted again).
+    """
+    from sentry.event_manager import EventBatch, EventManager
+    from sentry.utils.writebatch import write_batch
+
+    key = get_save_event_batch_key(project_id)
+    with get_save_event_batch_client(project_id).pipeline() as pipe:
+        pipe.lrange(key, 0, settings.SENTRY_SAVE_EVENT_BATCH_SIZE - 1)
+        pipe.ltrim(key, settings.SENTRY_SAVE_EVENT_BATCH_SIZE, -1)
+        payloads = [json.loads(p) for p in pipe.execute()[0]]
+
+    if not payloads:
+        return
+
+    try:
+        project = Project.objects.get_from_cache(id=project_id)
+    except Project.DoesNotExist:
+        for payload in payloads:
+            default_cache.delete(payload['cache_key'])
+        return
+
+    batch = EventBatch(project)
+
+    with metrics.timer('events.save_batch.duration'):
+        events = []
+        for payload in payloads:
+            data = default_cache.get(payload['cache_key'])
+            if data:
+                data = CanonicalKeyDict(data)
+                data.pop('project', None)
+                if payload['event_id'] is None:
+                    payload['event_id'] = data['event_id']
+            events.append((payload, data))
+
+        # Duplicates are only detected by the database when the batch is
+        # committed, after their counters have been recorded, so skip them
+        # up front: both events stored earlier and repeated in this batch.
+        seen = batch.find_existing(payload['event_id'] for payload, data in events if data)
+        unique_events = []
+        for payload, data in events:
+            if data and payload['event_id'] in seen:
+                info_logger.info('duplicate.found', extra={
+                    'event_uuid': payload['event_id'],
+                    'project_id': project_id,
+                })
+                metrics.incr('events.save_batch.duplicate')
+                delete_raw_event(project_id, payload['event_id'], allow_hint_clear=True)
+                _delete_cached_event(payload['cache_key'], None)
+                continue
+            if data:
+                seen.add(payload['event_id'])
+                try:
+                    data['hashes'] = EventManager(data).compute_hashes(project_id)
+                except Exception:
+                    error_logger.exception('save_event_batch.hashes-failed')
+            unique_events.append((payload, data))
+
+        batch.prefetch_hashes([data['hashes'] for _, data in unique_events
+                               if data and data.get('hashes')])
+
+        # the counters of all events are written together when the batch
+        # is published
+        saved = []
+        with write_batch():
+            for payload, data in unique_events:
+                event = None
+                try:
+                    event = _do_save_event(data=data, project_id=project_id, batch=batch,
+                                           **payload)
+                except Exception:
+                    error_logger.exception('save_event_batch.failed', extra={
+                        'event_id': payload['event_id'],
+                    })
+                saved.append((payload, event))
+
+            try:
+                batch.commit()
+            except Exception:
+                for payload, event in saved:
+                    error_logger.exception('save_event_batch.commit-failed', extra={
+                        'event_id': payload['event_id'],
+                    })
+                failed = set(id(event) for _, event in saved)
+            else:
+                failed = set(id(event) for event in batch.failed)
+
+    for payload, event in saved:
+        if event is not None and id(event) in failed:
+            metrics.incr('events.save_batch.dropped')
+            _delete_event_attachments(event)
+        _delete_cached_event(payload['cache_key'], event)
@@ -60,7 +60,7 @@ from sentry.models import (
 )
 from sentry.plugins import plugins
 from sentry.rules import EventState
-from sentry.utils import json
+from sentry.utils import json, localcache
 from sentry.utils.auth import SSO_SESSION_KEY
 
 from .fixtures import Fixtures
@@ -216,6 +216,7 @@ class BaseTestCase(Fixtures, Exam):
         super(BaseTestCase, self)._pre_setup()
 
         cache.clear()
+        localcache.clear_all()
         ProjectOption.objects.clear_local_cache()
         GroupMeta.objects.clear_local_cache()
 
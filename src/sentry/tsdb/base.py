@@ -16,6 +16,7 @@ from django.conf import settings
 from django.utils import timezone
 from enum import Enum
 
+from sentry.tsdb.series import SeriesSet
 from sentry.utils.dates import to_datetime, to_timestamp
 from sentry.utils.services import Service
 
@@ -103,6 +104,7 @@ class TSDBModel(Enum):
 class BaseTSDB(Service):
     __read_methods__ = frozenset([
         'get_range',
+        'get_range_series',
         'get_sums',
         'get_distinct_counts_series',
         'get_distinct_counts_totals',
@@ -111,6 +113,7 @@ class BaseTSDB(Service):
         'get_most_frequent_series',
         'get_frequency_series',
         'get_frequency_totals',
+        'get_totals_multi',
     ])
 
     __write_methods__ = frozenset([
@@ -346,11 +349,63 @@ class BaseTSDB(Service):
         )
         return sum_set
 
+    def get_totals_multi(self, requests, rollup=None):
+        """
+        Run several ``get_sums`` and ``get_distinct_counts_totals`` queries at
+        once. Backends which support it execute all of them in a single round
+        trip per host.
+
+        Each request is a ``(method, model, keys, start, end, environment_id)``
+        tuple where ``method`` is either ``'get_sums'`` or
+        ``'get_distinct_counts_totals'``. Returns a list of results in the
+        same order as the requests.
+
+        >>> get_totals_multi([
+        >>>     ('get_sums', TSDBModel.group, [1], start, end, None),
+        >>>     ('get_distinct_counts_totals', TSDBModel.users_affected_by_group, [1], start, end, None),
+        >>> ])
+        """
+        results = []
+        for method, model, keys, start, end, environment_id in requests:
+            assert method in ('get_sums', 'get_distinct_counts_totals')
+            results.append(getattr(self, method)(
+                model,
+                keys,
+                start,
+                end,
+                rollup=rollup,
+                environment_id=environment_id,
+            ))
+        return results
+
+    def get_range_series(self, model, keys, start, end, rollup=None, environment_ids=None):
+        """
+        Like ``get_range``, but returns a ``SeriesSet`` in which every series
+        is zero-filled to the timestamps of the optimal rollup series.
+        """
+        rollup, series = self.get_optimal_rollup_series(start, end, rollup)
+        return SeriesSet.from_range(
+            self.get_range(model, keys, start, end, rollup, environment_ids),
+            series,
+        )
+
     def rollup(self, values, rollup):
         """
         Given a set of values (as returned from ``get_range``), roll them up
         using the ``rollup`` time (in seconds).
         """
+        try:
+            series = SeriesSet.from_range(values)
+        except ValueError:
+            # series with differing timestamps can't be rolled up as a set
+            pass
+        else:
+            series = series.rollup(rollup)
+            return {
+                key: [[timestamp, value] for timestamp, value in series[key]]
+                for key in series.keys
+            }
+
         normalize_ts_to_epoch = self.normalize_ts_to_epoch
         result = {}
         for key, points in six.iteritems(values):
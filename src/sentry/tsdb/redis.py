@@ -22,9 +22,11 @@ from pkg_resources import resource_string
 from redis.client import Script
 
 from sentry.tsdb.base import BaseTSDB
+from sentry.tsdb.series import SeriesSet
 from sentry.utils.dates import to_datetime, to_timestamp
 from sentry.utils.redis import check_cluster_versions, get_cluster_from_options
 from sentry.utils.versioning import Version
+from sentry.utils.writebatch import get_current_batch
 from six.moves import reduce
 
 logger = logging.getLogger(__name__)
@@ -224,11 +226,15 @@ class RedisTSDB(BaseTSDB):
         if timestamp is None:
             timestamp = timezone.now()
 
+        batch = get_current_batch()
         for (cluster, durable), environment_ids in self.get_cluster_groups(
                 set([None, environment_id])):
-            manager = cluster.map()
-            if not durable:
-                manager = SuppressionWrapper(manager)
+            if batch is not None:
+                manager = batch.get_client(cluster, durable)
+            else:
+                manager = cluster.map()
+                if not durable:
+                    manager = SuppressionWrapper(manager)
 
             with manager as client:
                 for rollup, max_values in six.iteritems(self.rollups):
@@ -251,6 +257,37 @@ class RedisTSDB(BaseTSDB):
         >>>          start=now - timedelta(days=1),
         >>>          end=now)
         """
+        keys = list(keys)
+        series, results = self._get_range_counts(
+            model, keys, start, end, rollup, environment_ids)
+
+        results_by_key = defaultdict(dict)
+        for key, counts in zip(keys, results):
+            for epoch, count in zip(series, counts):
+                results_by_key[key][epoch] = int(count.value or 0)
+
+        for key, points in six.iteritems(results_by_key):
+            results_by_key[key] = sorted(points.items())
+        return dict(results_by_key)
+
+    def get_range_series(self, model, keys, start, end, rollup=None, environment_ids=None):
+        # builds the set straight from the pipeline results, rather than
+        # going through the (timestamp, value) tuples of ``get_range``
+        keys = list(keys)
+        series, results = self._get_range_counts(
+            model, keys, start, end, rollup, environment_ids)
+
+        values = {}
+        for key, counts in zip(keys, results):
+            values[key] = [int(count.value or 0) for count in counts]
+
+        return SeriesSet.from_values(values, series)
+
+    def _get_range_counts(self, model, keys, start, end, rollup=None, environment_ids=None):
+        """
+        Returns the timestamps of the series and, for each key, a list of
+        promises for the counter at each timestamp.
+        """
         # redis backend doesn't support multiple envs
         if environment_ids is not None and len(environment_ids) > 1:
             raise NotImplementedError
@@ -259,26 +296,74 @@ class RedisTSDB(BaseTSDB):
         self.validate_arguments([model], [environment_id])
 
         rollup, series = self.get_optimal_rollup_series(start, end, rollup)
-        series = map(to_datetime, series)
+        timestamps = [to_datetime(timestamp) for timestamp in series]
 
         results = []
         cluster, _ = self.get_cluster(environment_id)
         with cluster.map() as client:
             for key in keys:
-                for timestamp in series:
+                counts = []
+                for timestamp in timestamps:
                     hash_key, hash_field = self.make_counter_key(
                         model, rollup, timestamp, key, environment_id)
-                    results.append(
-                        (to_timestamp(timestamp), key, client.hget(
-                            hash_key, hash_field)))
+                    counts.append(client.hget(hash_key, hash_field))
+                results.append(counts)
 
-        results_by_key = defaultdict(dict)
-        for epoch, key, count in results:
-            results_by_key[key][epoch] = int(count.value or 0)
+        return [to_timestamp(timestamp) for timestamp in timestamps], results
 
-        for key, points in six.iteritems(results_by_key):
-            results_by_key[key] = sorted(points.items())
-        return dict(results_by_key)
+    def get_totals_multi(self, requests, rollup=None):
+        """
+        Run several ``get_sums`` and ``get_distinct_counts_totals`` queries
+        using a single pipeline per host of each cluster.
+        """
+        self.validate_arguments(
+            [model for _, model, _, _, _, _ in requests],
+            [environment_id for _, _, _, _, _, environment_id in requests],
+        )
+
+        requests_by_cluster = defaultdict(list)
+        for index, request in enumerate(requests):
+            environment_id = request[5]
+            cluster, _ = self.get_cluster(environment_id)
+            requests_by_cluster[cluster].append((index, request))
+
+        results = [None] * len(requests)
+        for cluster, cluster_requests in six.iteritems(requests_by_cluster):
+            responses = []
+            with cluster.fanout() as client:
+                for index, (method, model, keys, start, end, environment_id) in cluster_requests:
+                    request_rollup, series = self.get_optimal_rollup_series(start, end, rollup)
+                    promises = {}
+                    for key in keys:
+                        if method == 'get_sums':
+                            promises[key] = []
+                            for timestamp in series:
+                                hash_key, hash_field = self.make_counter_key(
+                                    model, request_rollup, to_datetime(timestamp), key, environment_id)
+                                promises[key].append(
+                                    client.target_key(hash_key).hget(hash_key, hash_field))
+                        elif method == 'get_distinct_counts_totals':
+                            ks = [
+                                self.make_key(model, request_rollup, timestamp, key, environment_id)
+                                for timestamp in series
+                            ]
+                            promises[key] = client.target_key(key).execute_command('PFCOUNT', *ks)
+                        else:
+                            raise ValueError('Unsupported method: %r' % (method, ))
+                    responses.append((index, method, promises))
+
+            for index, method, promises in responses:
+                if method == 'get_sums':
+                    results[index] = {
+                        key: sum(int(p.value or 0) for p in value)
+                        for key, value in six.iteritems(promises)
+                    }
+                else:
+                    results[index] = {
+                        key: value.value for key, value in six.iteritems(promises)
+                    }
+
+        return results
 
     def merge(self, model, destination, sources, timestamp=None, environment_ids=None):
         environment_ids = (
@@ -389,11 +474,15 @@ class RedisTSDB(BaseTSDB):
 
         ts = int(to_timestamp(timestamp))  # ``timestamp`` is not actually a timestamp :(
 
+        batch = get_current_batch()
         for (cluster, durable), environment_ids in self.get_cluster_groups(
                 set([None, environment_id])):
-            manager = cluster.fanout()
-            if not durable:
-                manager = SuppressionWrapper(manager)
+            if batch is not None:
+                manager = batch.get_client(cluster, durable)
+            else:
+                manager = cluster.fanout()
+                if not durable:
+                    manager = SuppressionWrapper(manager)
 
             with manager as client:
                 for model, key, values in items:
@@ -683,6 +772,7 @@ class RedisTSDB(BaseTSDB):
 
         ts = int(to_timestamp(timestamp))  # ``timestamp`` is not actually a timestamp :(
 
+        batch = get_current_batch()
         for (cluster, durable), environment_ids in self.get_cluster_groups(
                 set([None, environment_id])):
             commands = {}
@@ -715,6 +805,10 @@ class RedisTSDB(BaseTSDB):
                     for k, t in expirations.items():
                         cmds.append(('EXPIREAT', k, t))
 
+            if batch is not None:
+                batch.get_client(cluster, durable).execute_commands(commands)
+                continue
+
             try:
                 cluster.execute_commands(commands)
             except Exception:
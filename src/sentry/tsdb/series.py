@@ -0,0 +1,182 @@
+"""
+sentry.tsdb.series
+~~~~~~~~~~~~~~~~~~
+
+Array backed time series.
+
+:copyright: (c) 2010-2018 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import
+
+import operator
+
+from six.moves import zip
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__all__ = ('SeriesSet', )
+
+
+def _make_values(rows, width):
+    if numpy is None:
+        return rows
+    if not rows:
+        return numpy.zeros((0, width), dtype=numpy.int64)
+    return numpy.array(rows)
+
+
+def _to_list(values):
+    if numpy is None:
+        return list(values)
+    # ``tolist`` converts NumPy scalars back into Python numbers
+    return values.tolist()
+
+
+class SeriesSet(object):
+    """
+    The time series of several keys, all sharing the same timestamps.
+
+    Values are stored with one row per key, in a two dimensional NumPy array
+    when NumPy is installed (and as nested lists otherwise), so rollups, sums
+    and merges over many keys don't need a Python loop per point.
+
+    >>> series = tsdb.get_range_series(tsdb.models.project, [1, 2], start, end)
+    >>> series.sum()
+    [(1368889200.0, 15), (1368892800.0, 7)]
+    """
+
+    def __init__(self, keys, timestamps, values):
+        self.keys = list(keys)
+        self.timestamps = list(timestamps)
+        self.values = values
+        self._index = {key: idx for idx, key in enumerate(self.keys)}
+
+    @classmethod
+    def from_range(cls, data, timestamps=None):
+        """
+        Builds a ``SeriesSet`` from the result of ``get_range``.
+
+        If ``timestamps`` are provided, every series is aligned to them and
+        missing points are filled with zero. Otherwise all series must have
+        the same timestamps, or ``ValueError`` is raised.
+        """
+        keys = list(data)
+        if timestamps is None:
+            if not keys:
+                raise ValueError('timestamps are required for an empty set')
+            timestamps = [timestamp for timestamp, _ in data[keys[0]]]
+            zerofill = False
+        else:
+            zerofill = True
+
+        rows = []
+        for key in keys:
+            points = data[key]
+            if len(points) == len(timestamps) and \
+                    all(point[0] == timestamp for point, timestamp in zip(points, timestamps)):
+                rows.append([value for _, value in points])
+            elif zerofill:
+                values = dict(points)
+                rows.append([values.get(timestamp, 0) for timestamp in timestamps])
+            else:
+                raise ValueError('series timestamps must match')
+
+        return cls(keys, timestamps, _make_values(rows, len(timestamps)))
+
+    @classmethod
+    def from_values(cls, data, timestamps):
+        """
+        Builds a ``SeriesSet`` from a mapping of key to the list of values at
+        each of ``timestamps``.
+        """
+        keys = list(data)
+        return cls(keys, timestamps, _make_values([data[key] for key in keys], len(timestamps)))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __getitem__(self, key):
+        return list(zip(self.timestamps, _to_list(self.values[self._index[key]])))
+
+    def to_range(self):
+        """
+        Returns the series in the format returned by ``get_range``.
+        """
+        return {key: self[key] for key in self.keys}
+
+    def totals(self):
+        """
+        Returns a mapping of key to the sum of its series.
+        """
+        if numpy is None:
+            totals = [sum(row) for row in self.values]
+        else:
+            totals = self.values.sum(axis=1).tolist()
+        return dict(zip(self.keys, totals))
+
+    def sum(self, keys=None):
+        """
+        Returns a single series with the sum of all series (or the series of
+        ``keys``) at each timestamp.
+        """
+        values = self.values
+        if keys is not None:
+            rows = [self._index[key] for key in keys]
+            if numpy is None:
+                values = [values[row] for row in rows]
+            else:
+                values = values[rows] if rows else values[:0]
+
+        if numpy is None:
+            totals = [sum(column) for column in zip(*values)] or \
+                [0] * len(self.timestamps)
+        else:
+            totals = values.sum(axis=0).tolist()
+        return list(zip(self.timestamps, totals))
+
+    def rollup(self, seconds):
+        """
+        Returns a new ``SeriesSet`` with the points summed into buckets of
+        ``seconds``, like ``BaseTSDB.rollup``.
+        """
+        timestamps = []
+        starts = []
+        for idx, timestamp in enumerate(self.timestamps):
+            bucket = timestamp - (timestamp % seconds)
+            if not timestamps or timestamps[-1] != bucket:
+                timestamps.append(bucket)
+                starts.append(idx)
+
+        if not timestamps:
+            return SeriesSet(self.keys, timestamps, self.values)
+
+        if numpy is None:
+            bounds = list(zip(starts, starts[1:] + [len(self.timestamps)]))
+            values = [[sum(row[start:stop]) for start, stop in bounds] for row in self.values]
+        else:
+            values = numpy.add.reduceat(self.values, starts, axis=1)
+        return SeriesSet(self.keys, timestamps, values)
+
+    def merge(self, other, function=operator.add):
+        """
+        Merges two sets with the same keys and timestamps point by point.
+        With NumPy ``function`` is called once with both arrays, so it has
+        to work element-wise (like the ``operator`` functions.)
+        """
+        assert self.timestamps == other.timestamps, 'series timestamps must match'
+        assert self.keys == other.keys, 'series keys must match'
+        if numpy is None:
+            values = [
+                [function(x, y) for x, y in zip(row, other_row)]
+                for row, other_row in zip(self.values, other.values)
+            ]
+        else:
+            values = function(self.values, other.values)
+        return SeriesSet(self.keys, self.timestamps, values)
@@ -45,6 +45,19 @@ class SnubaTSDB(BaseTSDB):
         `group_on_time`: whether to add a GROUP BY clause on the 'time' field.
         `group_on_model`: whether to add a GROUP BY clause on the primary model.
         """
+        params, callback = self.get_data_query(
+            model, keys, start, end, rollup, environment_ids, aggregation,
+            group_on_model, group_on_time)
+        return callback(snuba.bulk_query([params])[0] if params is not None else {})
+
+    def get_data_query(self, model, keys, start, end, rollup=None, environment_ids=None,
+                       aggregation='count()', group_on_model=True, group_on_time=False):
+        """
+        Returns the ``SnubaQueryParams`` for ``get_data`` (or ``None`` if
+        there is nothing to query) and a callback turning the query result
+        into its return value, so the query can be sent together with others
+        through ``snuba.bulk_query``.
+        """
         model_columns = self.model_columns.get(model)
 
         if model_columns is None:
@@ -78,19 +91,22 @@ class SnubaTSDB(BaseTSDB):
         end = to_datetime(series[-1] + rollup)
 
         if keys:
-            result = snuba.query(start, end, groupby, None, keys_map,
-                                 aggregations, rollup, referrer='tsdb',
-                                 is_grouprelease=(model == TSDBModel.frequent_releases_by_group))
+            params = snuba.SnubaQueryParams(
+                start, end, groupby, None, dict(keys_map), aggregations, rollup,
+                referrer='tsdb', is_grouprelease=(model == TSDBModel.frequent_releases_by_group))
         else:
-            result = {}
+            params = None
 
-        if group_on_time:
-            keys_map['time'] = series
+        def callback(result):
+            if group_on_time:
+                keys_map['time'] = series
 
-        self.zerofill(result, groupby, keys_map)
-        self.trim(result, groupby, keys)
+            self.zerofill(result, groupby, keys_map)
+            self.trim(result, groupby, keys)
 
-        return result
+            return result
+
+        return params, callback
 
     def zerofill(self, result, groups, flat_keys):
         """
@@ -130,13 +146,26 @@ class SnubaTSDB(BaseTSDB):
                         del result[rk]
 
     def get_range(self, model, keys, start, end, rollup=None, environment_ids=None):
-        result = self.get_data(model, keys, start, end, rollup, environment_ids,
-                               aggregation='count()', group_on_time=True)
-        # convert
-        #    {group:{timestamp:count, ...}}
-        # into
-        #    {group: [(timestamp, count), ...]}
-        return {k: sorted(result[k].items()) for k in result}
+        params, callback = self.get_range_query(model, keys, start, end, rollup, environment_ids)
+        return callback(snuba.bulk_query([params])[0] if params is not None else {})
+
+    def get_range_query(self, model, keys, start, end, rollup=None, environment_ids=None):
+        """
+        Returns the ``SnubaQueryParams`` and result callback for
+        ``get_range``, see ``get_data_query``.
+        """
+        params, callback = self.get_data_query(model, keys, start, end, rollup, environment_ids,
+                                               aggregation='count()', group_on_time=True)
+
+        def range_callback(result):
+            result = callback(result)
+            # convert
+            #    {group:{timestamp:count, ...}}
+            # into
+            #    {group: [(timestamp, count), ...]}
+            return {k: sorted(result[k].items()) for k in result}
+
+        return params, range_callback
 
     def get_distinct_counts_series(self, model, keys, start, end=None,
                                    rollup=None, environment_id=None):
@@ -0,0 +1,229 @@
+"""
+sentry.utils.localcache
+~~~~~~~~~~~~~~~~~~~~~~~
+
+A bounded, in-process LRU cache tier with per-entry TTL.
+
+Local caches sit in front of the shared Django cache for hot lookups made on
+every event (projects, project keys and project options). Entries are
+invalidated across processes through a Redis pub/sub channel, and the TTL
+bounds staleness if an invalidation message is lost.
+
+:copyright: (c) 2010-2018 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import
+
+import logging
+import os
+import threading
+
+from collections import OrderedDict
+from time import time
+
+from django.conf import settings
+
+from sentry.utils import metrics
+
+__all__ = ('LocalCache', 'get_local_cache', 'clear_all')
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'sentry:localcache'
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+class LocalCache(object):
+    """
+    A thread-safe LRU mapping with a maximum number of entries and a TTL.
+
+    If ``max_weight`` is set, entries are also evicted once the sum of their
+    weights (e.g. their size in bytes, as passed to ``set``) exceeds it.
+
+    >>> cache = LocalCache('project', max_size=1000, ttl=30)
+    >>> cache.set('1', project)
+    >>> cache.get('1')
+    """
+
+    def __init__(self, name, max_size=10000, ttl=30, max_weight=None):
+        assert max_size > 0
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self.weight = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._tags = {'cache': name}
+
+    def get(self, key, default=None):
+        hit = False
+        with self._lock:
+            try:
+                expires, weight, value = self._data.pop(key)
+            except KeyError:
+                pass
+            else:
+                if expires > time():
+                    # re-insert to mark as most recently used
+                    self._data[key] = (expires, weight, value)
+                    hit = True
+                else:
+                    self.weight -= weight
+
+        if not hit:
+            metrics.incr('localcache.miss', tags=self._tags)
+            return default
+
+        metrics.incr('localcache.hit', tags=self._tags)
+        return value
+
+    def set(self, key, value, weight=1):
+        if self.max_weight is not None and weight > self.max_weight:
+            self.delete(key)
+            return
+
+        evicted = 0
+        with self._lock:
+            self.__pop(key)
+            while len(self._data) >= self.max_size or (
+                self.max_weight is not None and self._data and
+                self.weight + weight > self.max_weight
+            ):
+                _, (_, evicted_weight, _) = self._data.popitem(last=False)
+                self.weight -= evicted_weight
+                evicted += 1
+            self._data[key] = (time() + self.ttl, weight, value)
+            self.weight += weight
+            resident = self.weight
+
+        if evicted:
+            metrics.incr('localcache.eviction', amount=evicted, tags=self._tags)
+        if self.max_weight is not None:
+            metrics.timing('localcache.weight', resident, tags=self._tags)
+
+    def __pop(self, key):
+        try:
+            _, weight, _ = self._data.pop(key)
+        except KeyError:
+            pass
+        else:
+            self.weight -= weight
+
+    def delete(self, key):
+        with self._lock:
+            self.__pop(key)
+
+    def invalidate(self, key):
+        """
+        Removes ``key`` from this process and from every other process
+        subscribed to the invalidation channel.
+        """
+        self.delete(key)
+        invalidator.publish(self.name, key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.weight = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LocalCacheInvalidator(object):
+    """
+    Publishes and receives invalidation messages for local caches.
+
+    Each process lazily starts a daemon thread subscribed to the channel the
+    first time a local cache is used (after any fork), so this works the same
+    in uWSGI and Celery workers.
+    """
+
+    def __init__(self):
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get_client(self):
+        from sentry.utils.redis import clusters
+        cluster = clusters.get(
+            getattr(settings, 'SENTRY_LOCAL_CACHE_OPTIONS', {}).get('cluster', 'default'))
+        return cluster.get_local_client_for_key(CHANNEL)
+
+    def ensure_subscribed(self):
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            # anything cached before a fork may have missed invalidations
+            for cache in list(_caches.values()):
+                cache.clear()
+            t = threading.Thread(target=self._listen, name='sentry.localcache')
+            t.setDaemon(True)
+            t.start()
+
+    def _listen(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            try:
+                pubsub = self.get_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                for message in pubsub.listen():
+                    self.handle(message['data'])
+            except Exception:
+                logger.warning('localcache.subscribe-failed', exc_info=True)
+                # we may have missed messages, so start over from a clean slate
+                for cache in list(_caches.values()):
+                    cache.clear()
+                threading.Event().wait(5)
+
+    def handle(self, data):
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        name, _, key = data.partition(u'\x00')
+        cache = _caches.get(name)
+        if cache is not None:
+            cache.delete(key)
+
+    def publish(self, name, key):
+        try:
+            self.get_client().publish(CHANNEL, u'{}\x00{}'.format(name, key))
+        except Exception:
+            logger.warning('localcache.publish-failed', exc_info=True)
+
+
+invalidator = LocalCacheInvalidator()
+
+
+def get_local_cache(name, max_size=None, ttl=None, max_weight=None):
+    """
+    Returns the process wide local cache called ``name``, creating it with
+    the configured defaults if needed.
+    """
+    invalidator.ensure_subscribed()
+
+    try:
+        return _caches[name]
+    except KeyError:
+        pass
+
+    options = getattr(settings, 'SENTRY_LOCAL_CACHE_OPTIONS', {})
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = LocalCache(
+                name,
+                max_size=max_size or options.get('max_size', 10000),
+                ttl=ttl if ttl is not None else options.get('ttl', 30),
+                max_weight=max_weight,
+            )
+        return _caches[name]
+
+
+def clear_all():
+    for cache in list(_caches.values()):
+        cache.clear()
@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from datetime import datetime, timedelta
 from dateutil.parser import parse as parse_datetime
@@ -12,6 +13,7 @@ import time
 import urllib3
 
 from django.conf import settings
+from django.core.cache import cache
 
 from sentry import quotas
 from sentry.models import (
@@ -21,11 +23,16 @@ from sentry.models import (
 from sentry.net.http import connection_from_url
 from sentry.utils import metrics, json
 from sentry.utils.dates import to_timestamp
+from sentry.utils.hashlib import md5_text
 
 # TODO remove this when Snuba accepts more than 500 issues
 MAX_ISSUES = 500
 MAX_HASHES = 5000
 
+# The number of queries ``bulk_raw_query`` sends at the same time, this
+# matches the size of the connection pool.
+MAX_CONCURRENT_QUERIES = 10
+
 # Global Snuba request option override dictionary. Only intended
 # to be used with the `options_override` contextmanager below.
 # NOT THREAD SAFE!
@@ -212,7 +219,7 @@ _snuba_pool = connection_from_url(
     settings.SENTRY_SNUBA,
     retries=5,
     timeout=30,
-    maxsize=10,
+    maxsize=MAX_CONCURRENT_QUERIES,
 )
 
 
@@ -354,43 +361,52 @@ def transform_aliases_and_query(**kwargs):
     return result
 
 
-def raw_query(start, end, groupby=None, conditions=None, filter_keys=None,
-              aggregations=None, rollup=None, arrayjoin=None, limit=None, offset=None,
-              orderby=None, having=None, referrer=None, is_grouprelease=False,
-              selected_columns=None, totals=None, limitby=None, turbo=False):
+class SnubaQueryParams(object):
+    """
+    The arguments of a single query, as accepted by ``raw_query``, for use
+    with ``bulk_raw_query`` and ``bulk_query``.
     """
-    Sends a query to snuba.
 
-    `conditions`: A list of (column, operator, literal) conditions to be passed
-    to the query. Conditions that we know will not have to be translated should
-    be passed this way (eg tag[foo] = bar).
+    def __init__(self, start, end, groupby=None, conditions=None, filter_keys=None,
+                 aggregations=None, rollup=None, arrayjoin=None, limit=None, offset=None,
+                 orderby=None, having=None, referrer=None, is_grouprelease=False,
+                 selected_columns=None, totals=None, limitby=None, turbo=False):
+        self.start = start
+        self.end = end
+        self.groupby = groupby or []
+        self.conditions = conditions or []
+        self.filter_keys = filter_keys or {}
+        self.aggregations = aggregations or []
+        self.rollup = rollup
+        self.arrayjoin = arrayjoin
+        self.limit = limit
+        self.offset = offset
+        self.orderby = orderby
+        self.having = having or []
+        self.referrer = referrer
+        self.is_grouprelease = is_grouprelease
+        self.selected_columns = selected_columns or []
+        self.totals = totals
+        self.limitby = limitby
+        self.turbo = turbo
 
-    `filter_keys`: A dictionary of {col: [key, ...]} that will be converted
-    into "col IN (key, ...)" conditions. These are used to restrict the query to
-    known sets of project/issue/environment/release etc. Appropriate
-    translations (eg. from environment model ID to environment name) are
-    performed on the query, and the inverse translation performed on the
-    result. The project_id(s) to restrict the query to will also be
-    automatically inferred from these keys.
 
-    `aggregations` a list of (aggregation_function, column, alias) tuples to be
-    passed to the query.
+def _prepare_query_params(query_params):
+    """
+    Returns the request body for ``query_params`` and the function used
+    to translate the rows of the response back to model ids.
     """
-
     # convert to naive UTC datetimes, as Snuba only deals in UTC
     # and this avoids offset-naive and offset-aware issues
-    start = naiveify_datetime(start)
-    end = naiveify_datetime(end)
+    start = naiveify_datetime(query_params.start)
+    end = naiveify_datetime(query_params.end)
 
-    groupby = groupby or []
-    conditions = conditions or []
-    having = having or []
-    aggregations = aggregations or []
-    filter_keys = filter_keys or {}
-    selected_columns = selected_columns or []
+    filter_keys = query_params.filter_keys
+    conditions = list(query_params.conditions)
 
     with timer('get_snuba_map'):
-        forward, reverse = get_snuba_translators(filter_keys, is_grouprelease=is_grouprelease)
+        forward, reverse = get_snuba_translators(
+            filter_keys, is_grouprelease=query_params.is_grouprelease)
 
     if 'project_id' in filter_keys:
         # If we are given a set of project ids, use those directly.
@@ -436,23 +452,27 @@ def raw_query(start, end, groupby=None, conditions=None, filter_keys=None,
         'from_date': start.isoformat(),
         'to_date': end.isoformat(),
         'conditions': conditions,
-        'having': having,
-        'groupby': groupby,
-        'totals': totals,
+        'having': query_params.having,
+        'groupby': query_params.groupby,
+        'totals': query_params.totals,
         'project': project_ids,
-        'aggregations': aggregations,
-        'granularity': rollup,
-        'arrayjoin': arrayjoin,
-        'limit': limit,
-        'offset': offset,
-        'limitby': limitby,
-        'orderby': orderby,
-        'selected_columns': selected_columns,
-        'turbo': turbo
+        'aggregations': query_params.aggregations,
+        'granularity': query_params.rollup,
+        'arrayjoin': query_params.arrayjoin,
+        'limit': query_params.limit,
+        'offset': query_params.offset,
+        'limitby': query_params.limitby,
+        'orderby': query_params.orderby,
+        'selected_columns': query_params.selected_columns,
+        'turbo': query_params.turbo
     }) if v is not None}
 
     request.update(OVERRIDE_OPTIONS)
 
+    return request, reverse
+
+
+def _snuba_query(request, referrer):
     headers = {}
     if referrer:
         headers['referer'] = referrer
@@ -486,45 +506,168 @@ def raw_query(start, end, groupby=None, conditions=None, filter_keys=None,
         else:
             raise SnubaError(u'HTTP {}'.format(response.status))
 
-    # Forward and reverse translation maps from model ids to snuba keys, per column
-    body['data'] = [reverse(d) for d in body['data']]
     return body
 
 
-def query(start, end, groupby, conditions=None, filter_keys=None,
-          aggregations=None, rollup=None, arrayjoin=None, limit=None, offset=None,
-          orderby=None, having=None, referrer=None, is_grouprelease=False,
-          selected_columns=None, totals=None, limitby=None):
+def _get_cache_key(request, referrer):
+    return u'snuba:query:{}'.format(md5_text(
+        referrer or '',
+        json.dumps(request, sort_keys=True),
+    ).hexdigest())
 
-    aggregations = aggregations or [['count()', '', 'aggregate']]
-    filter_keys = filter_keys or {}
-    selected_columns = selected_columns or []
 
-    try:
-        body = raw_query(
-            start, end, groupby=groupby, conditions=conditions, filter_keys=filter_keys,
-            selected_columns=selected_columns, aggregations=aggregations, rollup=rollup,
-            arrayjoin=arrayjoin, limit=limit, offset=offset, orderby=orderby, having=having,
-            referrer=referrer, is_grouprelease=is_grouprelease, totals=totals, limitby=limitby
-        )
-    except (QueryOutsideRetentionError, QueryOutsideGroupActivityError):
-        if totals:
-            return OrderedDict(), {}
-        else:
-            return OrderedDict()
+def _bulk_raw_query(snuba_param_list, referrer=None, ignore_outside_retention=False):
+    prepared = []
+    # identical queries are only sent once
+    requests = OrderedDict()
+    for query_params in snuba_param_list:
+        try:
+            request, reverse = _prepare_query_params(query_params)
+        except (QueryOutsideRetentionError, QueryOutsideGroupActivityError):
+            if not ignore_outside_retention:
+                raise
+            prepared.append(None)
+            continue
 
-    # Validate and scrub response, and translate snuba keys back to IDs
-    aggregate_cols = [a[2] for a in aggregations]
-    expected_cols = set(groupby + aggregate_cols + selected_columns)
-    got_cols = set(c['name'] for c in body['meta'])
+        query_referrer = query_params.referrer or referrer
+        key = _get_cache_key(request, query_referrer)
+        requests.setdefault(key, (request, query_referrer))
+        prepared.append((key, reverse))
 
-    assert expected_cols == got_cols
+    cache_ttl = settings.SENTRY_SNUBA_CACHE_TTL
+    if cache_ttl and not OVERRIDE_OPTIONS.get('consistent'):
+        bodies = cache.get_many(list(requests.keys()))
+    else:
+        cache_ttl = 0
+        bodies = {}
+
+    pending = [
+        (request_key, item) for request_key, item in six.iteritems(requests)
+        if request_key not in bodies
+    ]
+    if len(pending) == 1:
+        key, (request, query_referrer) = pending[0]
+        bodies[key] = _snuba_query(request, query_referrer)
+    elif pending:
+        with ThreadPoolExecutor(max_workers=min(len(pending), MAX_CONCURRENT_QUERIES)) as executor:
+            futures = [
+                (request_key, executor.submit(_snuba_query, *item))
+                for request_key, item in pending
+            ]
+            for key, future in futures:
+                bodies[key] = future.result()
+
+    if cache_ttl and pending:
+        cache.set_many({key: bodies[key] for key, _ in pending}, cache_ttl)
+
+    metrics.timing('snuba.client.bulk.queries', len(prepared))
+    metrics.timing('snuba.client.bulk.requests', len(pending))
+
+    results = []
+    for item in prepared:
+        if item is None:
+            results.append(None)
+            continue
+        key, reverse = item
+        body = dict(bodies[key])
+        # Forward and reverse translation maps from model ids to snuba keys, per column
+        body['data'] = [reverse(dict(d)) for d in body['data']]
+        results.append(body)
+    return results
 
-    with timer('process_result'):
-        if totals:
-            return nest_groups(body['data'], groupby, aggregate_cols), body['totals']
-        else:
-            return nest_groups(body['data'], groupby, aggregate_cols)
+
+def bulk_raw_query(snuba_param_list, referrer=None):
+    """
+    Sends several queries (``SnubaQueryParams``) to snuba concurrently and
+    returns their results in order, like calling ``raw_query`` for each.
+
+    Identical queries are only sent once. If ``SENTRY_SNUBA_CACHE_TTL`` is
+    set, results are also cached for that many seconds, keyed by the
+    normalized query body. ``referrer`` is used for queries without one.
+    """
+    return _bulk_raw_query(snuba_param_list, referrer)
+
+
+def raw_query(start, end, groupby=None, conditions=None, filter_keys=None,
+              aggregations=None, rollup=None, arrayjoin=None, limit=None, offset=None,
+              orderby=None, having=None, referrer=None, is_grouprelease=False,
+              selected_columns=None, totals=None, limitby=None, turbo=False):
+    """
+    Sends a query to snuba.
+
+    `conditions`: A list of (column, operator, literal) conditions to be passed
+    to the query. Conditions that we know will not have to be translated should
+    be passed this way (eg tag[foo] = bar).
+
+    `filter_keys`: A dictionary of {col: [key, ...]} that will be converted
+    into "col IN (key, ...)" conditions. These are used to restrict the query to
+    known sets of project/issue/environment/release etc. Appropriate
+    translations (eg. from environment model ID to environment name) are
+    performed on the query, and the inverse translation performed on the
+    result. The project_id(s) to restrict the query to will also be
+    automatically inferred from these keys.
+
+    `aggregations` a list of (aggregation_function, column, alias) tuples to be
+    passed to the query.
+    """
+    return bulk_raw_query([SnubaQueryParams(
+        start, end, groupby=groupby, conditions=conditions, filter_keys=filter_keys,
+        aggregations=aggregations, rollup=rollup, arrayjoin=arrayjoin, limit=limit,
+        offset=offset, orderby=orderby, having=having, referrer=referrer,
+        is_grouprelease=is_grouprelease, selected_columns=selected_columns, totals=totals,
+        limitby=limitby, turbo=turbo,
+    )])[0]
+
+
+def bulk_query(snuba_param_list, referrer=None):
+    """
+    Runs several queries (``SnubaQueryParams``) concurrently and returns
+    their results in order, like calling ``query`` for each.
+    """
+    for query_params in snuba_param_list:
+        if not query_params.aggregations:
+            query_params.aggregations = [['count()', '', 'aggregate']]
+
+    bodies = _bulk_raw_query(snuba_param_list, referrer, ignore_outside_retention=True)
+
+    results = []
+    for query_params, body in zip(snuba_param_list, bodies):
+        if body is None:
+            if query_params.totals:
+                results.append((OrderedDict(), {}))
+            else:
+                results.append(OrderedDict())
+            continue
+
+        # Validate and scrub response, and translate snuba keys back to IDs
+        aggregate_cols = [a[2] for a in query_params.aggregations]
+        expected_cols = set(query_params.groupby + aggregate_cols + query_params.selected_columns)
+        got_cols = set(c['name'] for c in body['meta'])
+
+        assert expected_cols == got_cols
+
+        with timer('process_result'):
+            if query_params.totals:
+                results.append((
+                    nest_groups(body['data'], query_params.groupby, aggregate_cols),
+                    body['totals'],
+                ))
+            else:
+                results.append(nest_groups(body['data'], query_params.groupby, aggregate_cols))
+    return results
+
+
+def query(start, end, groupby, conditions=None, filter_keys=None,
+          aggregations=None, rollup=None, arrayjoin=None, limit=None, offset=None,
+          orderby=None, having=None, referrer=None, is_grouprelease=False,
+          selected_columns=None, totals=None, limitby=None):
+    return bulk_query([SnubaQueryParams(
+        start, end, groupby=groupby, conditions=conditions, filter_keys=filter_keys,
+        aggregations=aggregations, rollup=rollup, arrayjoin=arrayjoin, limit=limit,
+        offset=offset, orderby=orderby, having=having, referrer=referrer,
+        is_grouprelease=is_grouprelease, selected_columns=selected_columns, totals=totals,
+        limitby=limitby,
+    )])[0]
 
 
 def nest_groups(data, groups, aggregate_cols):
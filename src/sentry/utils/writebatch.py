@@ -0,0 +1,213 @@
+"""
+sentry.utils.writebatch
+~~~~~~~~~~~~~~~~~~~~~~~
+
+Request scoped batching of Redis writes.
+
+While a write batch is active, backends that support it (TSDB, buffers)
+record their Redis mutations into the batch instead of executing them right
+away. When the outermost batch exits, every recorded command is grouped by
+cluster and host and sent with a single pipeline per host::
+
+    >>> with write_batch():
+    ...     tsdb.incr_multi(...)
+    ...     buffer.incr(...)
+
+:copyright: (c) 2010-2018 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import
+
+import logging
+import sys
+import threading
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import six
+from redis.client import Script
+
+from sentry.utils import metrics
+
+__all__ = ('WriteBatch', 'write_batch', 'get_current_batch', 'flush_current_batch')
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class PendingPipeline(object):
+    def __init__(self):
+        self.commands = []
+        # if any command in the pipeline was written to a durable cluster,
+        # errors executing the pipeline are propagated
+        self.durable = False
+
+    def add(self, durable, command):
+        self.commands.append(command)
+        self.durable = self.durable or durable
+
+    def execute(self, client):
+        with client.pipeline(transaction=False) as pipe:
+            for name, args, kwargs in self.commands:
+                if name is None:
+                    script, keys, arguments = args
+                    script(keys, arguments, client=pipe)
+                else:
+                    getattr(pipe, name)(*args, **kwargs)
+            pipe.execute()
+
+
+class BatchClient(object):
+    """
+    Records commands for a cluster into a ``WriteBatch``.
+
+    The client mimics the parts of the rb client API used for writes: any
+    Redis command is routed to the host of its first key (like
+    ``cluster.map()``), ``target_key`` pins all following commands to the
+    host of a routing key (like ``cluster.fanout()``) and
+    ``execute_commands`` accepts the same mapping as
+    ``cluster.execute_commands``. Commands never return results.
+    """
+
+    def __init__(self, batch, cluster, durable=True, host=None):
+        self.batch = batch
+        self.cluster = cluster
+        self.durable = durable
+        self.host = host
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def _get_host(self, key):
+        if self.host is not None:
+            return self.host
+        return self.cluster.get_router().get_host_for_key(key)
+
+    def _record(self, key, name, args, kwargs):
+        self.batch.add(self.cluster, self._get_host(key), self.durable, (name, args, kwargs))
+
+    def target_key(self, key):
+        return BatchClient(self.batch, self.cluster, self.durable, host=self._get_host(key))
+
+    def execute_command(self, *args, **kwargs):
+        self._record(args[1], 'execute_command', args, kwargs)
+
+    def execute_script(self, script, keys, args):
+        self._record(keys[0], None, (script, keys, args), {})
+
+    def execute_commands(self, mapping):
+        for key, commands in six.iteritems(mapping):
+            client = self.target_key(key)
+            for command in commands:
+                if isinstance(command[0], Script):
+                    client.execute_script(*command)
+                else:
+                    client.execute_command(*command)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def command(*args, **kwargs):
+            self._record(args[0], name, args, kwargs)
+        return command
+
+
+class WriteBatch(object):
+    """
+    Collects Redis commands and flushes them with one pipeline per host.
+
+    Pipelines containing commands for a durable cluster raise the first
+    error encountered once every host has been flushed; failures for
+    non-durable clusters are logged and otherwise ignored, mirroring how the
+    TSDB treats them when writing directly.
+    """
+
+    def __init__(self):
+        self.pipelines = OrderedDict()
+
+    def get_client(self, cluster, durable=True):
+        return BatchClient(self, cluster, durable)
+
+    def add(self, cluster, host, durable, command):
+        try:
+            pipeline = self.pipelines[(cluster, host)]
+        except KeyError:
+            pipeline = self.pipelines[(cluster, host)] = PendingPipeline()
+        pipeline.add(durable, command)
+
+    def __len__(self):
+        return sum(len(p.commands) for p in six.itervalues(self.pipelines))
+
+    def flush(self):
+        pipelines, self.pipelines = self.pipelines, OrderedDict()
+        if not pipelines:
+            return
+
+        error = None
+        commands = 0
+        with metrics.timer('writebatch.flush'):
+            for (cluster, host), pipeline in six.iteritems(pipelines):
+                commands += len(pipeline.commands)
+                try:
+                    pipeline.execute(cluster.get_local_client(host))
+                except Exception:
+                    if not pipeline.durable:
+                        logger.warning('writebatch.flush-failed', exc_info=True)
+                    elif error is None:
+                        error = sys.exc_info()
+
+        metrics.timing('writebatch.flush.pipelines', len(pipelines))
+        metrics.timing('writebatch.flush.commands', commands)
+
+        if error is not None:
+            six.reraise(*error)
+
+
+def get_current_batch():
+    """
+    Returns the active ``WriteBatch`` for this thread, or ``None``.
+    """
+    return getattr(_local, 'batch', None)
+
+
+def flush_current_batch():
+    batch = get_current_batch()
+    if batch is not None:
+        batch.flush()
+
+
+@contextmanager
+def write_batch():
+    """
+    Activates a ``WriteBatch`` for the managed block and flushes it on exit.
+
+    Nested blocks join the outermost batch, so only the outermost block
+    flushes. Writes are flushed even if the block raises, since they would
+    have been executed already without batching.
+    """
+    batch = get_current_batch()
+    if batch is not None:
+        yield batch
+        return
+
+    batch = _local.batch = WriteBatch()
+    try:
+        yield batch
+    except Exception:
+        exc_info = sys.exc_info()
+        _local.batch = None
+        try:
+            batch.flush()
+        except Exception:
+            logger.warning('writebatch.flush-failed', exc_info=True)
+        six.reraise(*exc_info)
+    finally:
+        _local.batch = None
+
+    batch.flush()
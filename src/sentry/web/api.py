@@ -32,7 +32,8 @@ from sentry import features, quotas, tsdb, options
 from sentry.attachments import CachedAttachment
 from sentry.coreapi import (
     Auth, APIError, APIForbidden, APIRateLimited, ClientApiHelper, ClientAuthHelper,
-    SecurityAuthHelper, MinidumpAuthHelper, safely_load_json_string, logger as api_logger
+    SecurityAuthHelper, MinidumpAuthHelper, read_event_payload, safely_load_json_string,
+    logger as api_logger
 )
 from sentry.event_manager import EventManager
 from sentry.interfaces import schemas
@@ -495,7 +496,12 @@ class StoreView(APIView):
 
     def post(self, request, **kwargs):
         try:
-            data = request.body
+            data = read_event_payload(
+                request,
+                content_encoding=request.META.get('HTTP_CONTENT_ENCODING', ''),
+            )
+        except APIError:
+            raise
         except Exception as e:
             logger.exception(e)
             # We were unable to read the body.
@@ -357,6 +357,24 @@ class SentryRemoteTest(TestCase):
 
         assert instance.message == 'hello'
 
+    @override_settings(SENTRY_MAX_EVENT_SIZE=1024)
+    def test_content_encoding_deflate_too_large(self):
+        message = zlib.compress(json.dumps({'message': 'x' * 4096}))
+
+        key = self.projectkey.public_key
+        secret = self.projectkey.secret_key
+
+        resp = self.client.post(
+            self.path,
+            message,
+            content_type='application/octet-stream',
+            HTTP_CONTENT_ENCODING='deflate',
+            HTTP_X_SENTRY_AUTH=get_auth_header('_postWithHeader', key, secret),
+        )
+
+        assert resp.status_code == 413, resp.content
+        assert not Event.objects.exists()
+
     def test_protocol_v2_0_without_secret_key(self):
         kwargs = {'message': 'hello'}
 
@@ -24,6 +24,20 @@ class BufferTest(TestCase):
         kwargs = dict(model=model, columns=columns, filters=filters, extra=None)
         process_incr.apply_async.assert_called_once_with(kwargs=kwargs)
 
+    @mock.patch('sentry.buffer.base.process_incr')
+    def test_incr_multi_delays_tasks(self, process_incr):
+        model = mock.Mock()
+        self.buf.incr_multi([
+            (model, {'times_seen': 1}, {'id': 1}, None),
+            (model, {'times_seen': 2}, {'id': 2}, {'foo': 'bar'}),
+        ])
+        assert process_incr.apply_async.mock_calls == [
+            mock.call(kwargs=dict(model=model, columns={'times_seen': 1},
+                                  filters={'id': 1}, extra=None)),
+            mock.call(kwargs=dict(model=model, columns={'times_seen': 2},
+                                  filters={'id': 2}, extra={'foo': 'bar'})),
+        ]
+
     def test_process_saves_data(self):
         group = Group.objects.create(project=Project(id=1))
         columns = {'times_seen': 1}
@@ -66,3 +80,34 @@ class BufferTest(TestCase):
         self.buf.process(ReleaseProject, columns, filters)
         release_project_ = ReleaseProject.objects.get(id=release_project.id)
         assert release_project_.new_groups == 1
+
+    def test_process_batch_saves_data(self):
+        group = Group.objects.create(project=Project(id=1))
+        other = Group.objects.create(project=Project(id=1))
+        the_date = (timezone.now() + timedelta(days=5)).replace(microsecond=0)
+        self.buf.process_batch(Group, [
+            ({'times_seen': 1}, {'id': group.id}, {'last_seen': the_date}),
+            ({'times_seen': 3}, {'id': other.id}, {'last_seen': the_date}),
+        ])
+        group_ = Group.objects.get(id=group.id)
+        assert group_.times_seen == group.times_seen + 1
+        assert group_.last_seen.replace(microsecond=0) == the_date
+        other_ = Group.objects.get(id=other.id)
+        assert other_.times_seen == other.times_seen + 3
+        assert other_.last_seen.replace(microsecond=0) == the_date
+
+    def test_process_batch_saves_data_without_existing_row(self):
+        group = Group.objects.create(project=Project(id=1))
+        self.buf.process_batch(Group, [
+            ({'times_seen': 1}, {'message': group.message, 'project_id': 1}, None),
+            ({'times_seen': 1}, {'message': 'foo bar', 'project_id': 1}, None),
+        ])
+        assert Group.objects.get(id=group.id).times_seen == group.times_seen + 1
+        assert Group.objects.get(message='foo bar').times_seen == 2
+
+    @mock.patch('sentry.buffer.base.Buffer.process')
+    def test_process_batch_falls_back_for_single_items(self, process):
+        columns = {'times_seen': 1}
+        filters = {'id': 1}
+        self.buf.process_batch(Group, [(columns, filters, None)])
+        process.assert_called_once_with(self.buf, Group, columns, filters, {})
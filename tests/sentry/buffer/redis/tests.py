@@ -9,6 +9,7 @@ from datetime import datetime
 from django.utils import timezone
 from sentry.buffer.redis import RedisBuffer
 from sentry.models import Group, Project
+from sentry.utils.compat import pickle
 from sentry.testutils import TestCase
 
 
@@ -93,6 +94,80 @@ class RedisBufferTest(TestCase):
         self.buf.process('foo')
         process.assert_called_once_with(Group, columns, filters, extra)
 
+    @mock.patch('sentry.buffer.base.Buffer.process_batch')
+    def test_process_batch_keys(self, process_batch):
+        self.buf.batch_process = True
+        client = self.buf.cluster.get_routing_client()
+        client.hmset(
+            'foo', {
+                'f': '{"pk": ["i","1"]}',
+                'i+times_seen': '2',
+                'm': 'sentry.models.Group',
+            }
+        )
+        client.hmset(
+            'bar', {
+                'f': '{"pk": ["i","2"]}',
+                'i+times_seen': '1',
+                'm': 'sentry.models.Group',
+            }
+        )
+        client.zadd('b:p', 1, 'foo')
+        client.zadd('b:p', 2, 'bar')
+        self.buf.process(batch_keys=['foo', 'bar', 'baz'])
+        process_batch.assert_called_once_with(Group, [
+            ({'times_seen': 2}, {'pk': 1}, {}),
+            ({'times_seen': 1}, {'pk': 2}, {}),
+        ])
+        assert client.zrange('b:p', 0, -1) == []
+        assert not client.exists('foo')
+        assert not client.exists('l:foo')
+
+    @mock.patch('sentry.buffer.redis.process_incr', mock.Mock())
+    @mock.patch('sentry.buffer.base.Buffer.process_batch')
+    def test_process_batch_keys_keeps_concurrent_incr(self, process_batch):
+        self.buf.batch_process = True
+        self.buf.incr(Group, {'times_seen': 1}, {'id': 1})
+        self.buf.incr(Group, {'times_seen': 1}, {'id': 2})
+        keys = [self.buf._make_key(Group, {'id': 1}), self.buf._make_key(Group, {'id': 2})]
+
+        cluster = self.buf.cluster
+        get_local_client = cluster.get_local_client
+
+        def get_client(host):
+            client = get_local_client(host)
+            pipeline = client.pipeline
+
+            def get_pipeline(*args, **kwargs):
+                pipe = pipeline(*args, **kwargs)
+                delete = pipe.delete
+
+                def incr_and_delete(key):
+                    # another writer increments the row after it was read,
+                    # but before it is deleted
+                    if key == keys[0]:
+                        self.buf.incr(Group, {'times_seen': 1}, {'id': 1})
+                    return delete(key)
+
+                pipe.delete = incr_and_delete
+                return pipe
+
+            client.pipeline = get_pipeline
+            return client
+
+        with mock.patch.object(cluster, 'get_local_client', side_effect=get_client):
+            self.buf.process(batch_keys=keys)
+
+        # the increment is either flushed with the row or still buffered,
+        # but never deleted without being read
+        flushed = sum(
+            incr_values['times_seen']
+            for incr_values, filters, _ in process_batch.call_args[0][1]
+            if filters == {'id': 1}
+        )
+        buffered = int(cluster.get_routing_client().hget(keys[0], 'i+times_seen') or 0)
+        assert flushed + buffered == 2
+
     # this test should be passing once we no longer serialize using pickle
     @pytest.mark.xfail
     @mock.patch('sentry.buffer.redis.RedisBuffer._make_key', mock.Mock(return_value='foo'))
@@ -127,6 +202,23 @@ class RedisBufferTest(TestCase):
         pending = client.zrange('b:p', 0, -1)
         assert pending == ['foo']
 
+    @mock.patch('sentry.buffer.redis.process_incr', mock.Mock())
+    def test_incr_multi_saves_to_redis(self):
+        client = self.buf.cluster.get_routing_client()
+        group_key = self.buf._make_key(Group, {'id': 1})
+        project_key = self.buf._make_key(Project, {'id': 2})
+        self.buf.incr_multi([
+            (Group, {'times_seen': 1}, {'id': 1}, {'message': 'foo'}),
+            (Project, {'times_seen': 2}, {'id': 2}, None),
+            (Group, {'times_seen': 1}, {'id': 1}, {'message': 'bar'}),
+        ])
+        result = client.hgetall(group_key)
+        assert result['i+times_seen'] == '2'
+        assert result['m'] == 'sentry.models.group.Group'
+        assert pickle.loads(result['e+message']) == 'bar'
+        assert client.hget(project_key, 'i+times_seen') == '2'
+        assert sorted(client.zrange('b:p', 0, -1)) == sorted([group_key, project_key])
+
     @mock.patch('sentry.buffer.redis.RedisBuffer._make_key', mock.Mock(return_value='foo'))
     @mock.patch('sentry.buffer.redis.process_incr')
     @mock.patch('sentry.buffer.redis.process_pending')
@@ -178,3 +270,58 @@ class RedisBufferTest(TestCase):
 
         # Make sure we didn't queue up more
         assert len(process_pending.apply_async.mock_calls) == 2
+
+    @mock.patch('sentry.buffer.redis.process_incr')
+    def test_process_pending_groups_counter_shards(self, process_incr):
+        self.buf.counter_shards = 4
+        self.buf.incr_batch_size = 2
+        with self.buf.cluster.map() as client:
+            client.zadd('b:p', 1, 'b:k:sentry.group:a:0')
+            client.zadd('b:p', 2, 'b:k:sentry.group:b:1')
+            client.zadd('b:p', 3, 'b:k:sentry.group:a:3')
+        self.buf.process_pending()
+        assert len(process_incr.apply_async.mock_calls) == 2
+        process_incr.apply_async.assert_any_call(kwargs={
+            'batch_keys': ['b:k:sentry.group:a:0', 'b:k:sentry.group:a:3'],
+        })
+        process_incr.apply_async.assert_any_call(kwargs={
+            'batch_keys': ['b:k:sentry.group:b:1'],
+        })
+
+    @mock.patch('sentry.buffer.redis.process_incr')
+    def test_process_pending_partitions_counter_shards(self, process_incr):
+        self.buf.counter_shards = 4
+        self.buf.pending_partitions = 4
+        self.buf.incr_batch_size = 4
+        with mock.patch('sentry.buffer.redis.random.randint', side_effect=[0, 1, 2, 3]):
+            for _ in range(4):
+                self.buf.incr(Group, {'times_seen': 1}, {'id': 1})
+
+        key = self.buf._make_key(Group, {'id': 1})
+        shard_keys = ['%s:%d' % (key, i) for i in range(4)]
+        pending_key = self.buf._make_pending_key_from_key(key)
+        client = self.buf.cluster.get_routing_client()
+        assert sorted(client.zrange(pending_key, 0, -1)) == shard_keys
+
+        self.buf.process_pending(partition=int(pending_key.rsplit(':', 1)[1]))
+        process_incr.apply_async.assert_called_once_with(kwargs={
+            'batch_keys': shard_keys,
+        })
+
+    @mock.patch('sentry.buffer.redis.process_incr', mock.Mock())
+    @mock.patch('sentry.buffer.base.Buffer.process')
+    def test_counter_shards_are_folded(self, process):
+        self.buf.counter_shards = 4
+        now = datetime(2017, 5, 3, 6, 6, 6, tzinfo=timezone.utc)
+        later = datetime(2017, 5, 3, 6, 6, 7, tzinfo=timezone.utc)
+        with mock.patch('sentry.buffer.redis.random.randint', side_effect=[0, 1, 1]):
+            self.buf.incr(Group, {'times_seen': 1}, {'id': 1}, {'last_seen': later})
+            self.buf.incr(Group, {'times_seen': 1}, {'id': 1}, {'last_seen': now})
+            self.buf.incr(Group, {'times_seen': 1}, {'id': 1}, {'last_seen': now})
+
+        key = self.buf._make_key(Group, {'id': 1})
+        assert self.buf.get_pending_counts(Group, 'times_seen', [{'id': 1}, {'id': 2}]) == [3, 0]
+
+        self.buf.process(batch_keys=['%s:0' % key, '%s:1' % key])
+        process.assert_called_once_with(Group, {'times_seen': 3}, {'id': 1}, {'last_seen': later})
+        assert self.buf.get_pending_counts(Group, 'times_seen', [{'id': 1}]) == [0]
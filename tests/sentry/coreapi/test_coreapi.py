@@ -2,16 +2,23 @@
 
 from __future__ import absolute_import
 
+import base64
 import six
 import pytest
+import zlib
+
+from gzip import GzipFile
+from six import BytesIO
 
 from sentry.coreapi import (
     APIError,
+    APIPayloadTooLarge,
     APIUnauthorized,
     Auth,
     ClientApiHelper,
     ClientAuthHelper,
     decode_data,
+    read_event_payload,
     safely_load_json_string
 )
 from sentry.interfaces.base import get_interface
@@ -81,6 +88,58 @@ def test_invalid_data():
         decode_data('\x99')
 
 
+PAYLOAD = b'{"message": "hello", "extra": {"foo": "%s"}}' % (b'x' * 1000, )
+
+
+def _gzip(data):
+    fp = BytesIO()
+    f = GzipFile(fileobj=fp, mode='wb')
+    try:
+        f.write(data)
+    finally:
+        f.close()
+    return fp.getvalue()
+
+
+@pytest.mark.parametrize('encoding,body', [
+    ('', PAYLOAD),
+    ('gzip', _gzip(PAYLOAD)),
+    ('deflate', zlib.compress(PAYLOAD)),
+    ('', base64.b64encode(zlib.compress(PAYLOAD))),
+    ('', base64.b64encode(PAYLOAD)),
+])
+def test_read_event_payload(encoding, body):
+    data = read_event_payload(BytesIO(body), content_encoding=encoding, chunk_size=7)
+    assert data['message'] == 'hello'
+    assert data['extra']['foo'] == 'x' * 1000
+
+
+def test_read_event_payload_empty():
+    assert read_event_payload(BytesIO(b'')) is None
+
+
+def test_read_event_payload_invalid():
+    with pytest.raises(APIError):
+        read_event_payload(BytesIO(b'foo bar'), chunk_size=3)
+    with pytest.raises(APIError):
+        read_event_payload(BytesIO(b'xxxx'), content_encoding='gzip')
+
+
+def test_read_event_payload_too_large():
+    with pytest.raises(APIPayloadTooLarge):
+        read_event_payload(BytesIO(PAYLOAD), max_size=100, chunk_size=10)
+
+
+def test_read_event_payload_decoded_too_large():
+    body = zlib.compress(b'{"foo": "%s"}' % (b'x' * 100000, ))
+    with pytest.raises(APIPayloadTooLarge):
+        read_event_payload(
+            BytesIO(body),
+            content_encoding='deflate',
+            max_decoded_size=1000,
+        )
+
+
 def test_get_interface_does_not_let_through_disallowed_name():
     with pytest.raises(ValueError):
         get_interface('subprocess')
@@ -65,3 +65,39 @@ class BulkDeleteQueryIteratorTestCase(TransactionTestCase):
             results.update(chunk)
 
         assert results == expected_group_ids
+
+
+class BulkDeleteQueryRangeTestCase(TestCase):
+    def test_iterator_range(self):
+        groups = sorted(self.create_group().id for i in range(5))
+
+        query = BulkDeleteQuery(model=Group, project_id=self.project.id)
+        chunks = list(query.iterator_range(2))
+        assert chunks == [tuple(groups[0:2]), tuple(groups[2:4]), tuple(groups[4:])]
+
+        chunks = list(query.iterator_range(2, min_id=groups[0], max_id=groups[3]))
+        assert chunks == [tuple(groups[1:3]), (groups[3], )]
+
+    def test_get_shards(self):
+        groups = sorted(self.create_group().id for i in range(10))
+
+        query = BulkDeleteQuery(
+            model=Group,
+            project_id=self.project.id,
+            dtfield='last_seen',
+            days=0,
+        )
+        shards = query.get_shards(3)
+        assert 0 < len(shards) <= 3
+        assert shards[0][0] is None
+        assert shards[-1][1] is None
+
+        results = []
+        for min_id, max_id in shards:
+            for chunk in query.iterator_range(100, min_id=min_id, max_id=max_id):
+                results.extend(chunk)
+        assert results == groups
+
+    def test_get_shards_empty(self):
+        query = BulkDeleteQuery(model=Group, project_id=self.project.id)
+        assert query.get_shards(3) == []
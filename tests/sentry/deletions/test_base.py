@@ -0,0 +1,74 @@
+from __future__ import absolute_import
+
+from django.test.utils import override_settings
+
+from sentry import deletions
+from sentry.deletions.base import ModelDeletionTask, ModelRelation, can_fast_delete
+from sentry.models import Dashboard, GroupMeta, GroupSeen, Project, ProjectDebugFile
+from sentry.testutils import TestCase
+
+
+class CanFastDeleteTest(TestCase):
+    def test_leaf_model(self):
+        assert can_fast_delete(GroupMeta)
+        assert can_fast_delete(GroupSeen)
+
+    def test_model_with_cascades(self):
+        assert not can_fast_delete(Project)
+        assert not can_fast_delete(Dashboard)
+
+    def test_model_with_delete_receivers(self):
+        assert not can_fast_delete(ProjectDebugFile)
+
+
+class SetBasedDeletionTest(TestCase):
+    def test_chunk(self):
+        group = self.create_group()
+        other_group = self.create_group()
+        for i in range(5):
+            GroupMeta.objects.create(group=group, key='foo%d' % i, value='bar')
+        GroupMeta.objects.create(group=other_group, key='foo', value='bar')
+
+        task = deletions.get(
+            model=GroupMeta,
+            query={'group__project': group.project_id, 'group': group.id},
+            transaction_id='abc',
+            bulk_query_limit=2,
+        )
+        assert task.can_delete_set_based()
+
+        assert task.chunk()
+        assert GroupMeta.objects.filter(group=group).count() == 3
+        assert task.chunk()
+        assert task.chunk() is False
+        assert task.chunk() is False
+
+        assert not GroupMeta.objects.filter(group=group).exists()
+        assert GroupMeta.objects.filter(group=other_group).exists()
+
+    def test_overridden_task(self):
+        class CustomDeletionTask(ModelDeletionTask):
+            def get_child_relations(self, instance):
+                return []
+
+        task = CustomDeletionTask(
+            manager=deletions.default_manager,
+            model=GroupMeta,
+            query={'id': 1},
+        )
+        assert not task.can_delete_set_based()
+
+    @override_settings(SENTRY_DELETIONS_CONCURRENCY=1)
+    def test_delete_children(self):
+        group = self.create_group()
+        GroupMeta.objects.create(group=group, key='foo', value='bar')
+        GroupSeen.objects.create(group=group, project=group.project, user=self.user)
+
+        task = deletions.get(model=Project, query={'id': group.project_id})
+        task.delete_children([
+            ModelRelation(GroupMeta, {'group_id': group.id}, ModelDeletionTask),
+            ModelRelation(GroupSeen, {'group_id': group.id}, ModelDeletionTask),
+        ])
+
+        assert not GroupMeta.objects.filter(group=group).exists()
+        assert not GroupSeen.objects.filter(group=group).exists()
@@ -14,7 +14,7 @@ from time import time
 
 from sentry.app import tsdb
 from sentry.constants import VERSION_LENGTH
-from sentry.event_manager import HashDiscarded, EventManager, EventUser
+from sentry.event_manager import HashDiscarded, EventBatch, EventManager, EventUser
 from sentry.event_hashing import md5_from_hash
 from sentry.models import (
     Activity, Environment, Event, ExternalIssue, Group, GroupEnvironment,
@@ -953,6 +953,68 @@ class EventManagerTest(TransactionTestCase):
             skip_consume=False,
         )
 
+    @mock.patch('sentry.event_manager.eventstream.insert')
+    def test_save_batch(self, eventstream_insert):
+        event_ids = [uuid.uuid1().hex, uuid.uuid1().hex]
+        managers = []
+        # the last event is a duplicate of the first one
+        for event_id, message in zip(event_ids + event_ids[:1], ['foo', 'foo', 'foo']):
+            manager = EventManager(make_event(event_id=event_id, message=message))
+            manager.normalize()
+            managers.append(manager)
+
+        batch = EventBatch(self.project)
+        batch.prefetch_hashes([m.compute_hashes(self.project.id) for m in managers])
+        assert batch.group_hashes == {}
+
+        events = [m.save(self.project.id, batch=batch) for m in managers]
+        assert len(batch) == 3
+        assert not Event.objects.filter(project_id=self.project.id).exists()
+        assert eventstream_insert.call_count == 0
+
+        stored = batch.commit()
+        assert stored == events[:2]
+        assert events[0].group_id == events[1].group_id
+        assert sorted(Event.objects.filter(
+            project_id=self.project.id,
+        ).values_list('event_id', flat=True)) == sorted(event_ids)
+        assert eventstream_insert.call_count == 2
+
+        # the stored events have their ids and node data
+        event = Event.objects.get(id=events[1].id)
+        Event.objects.bind_nodes([event], 'data')
+        assert event.data['hashes'] == events[1].data['hashes']
+
+        batch = EventBatch(self.project)
+        batch.prefetch_hashes([events[0].data['hashes']])
+        assert [h.group_id for h in batch.group_hashes.values()] == [events[0].group_id]
+
+    def test_save_batch_find_existing(self):
+        manager = EventManager(make_event(event_id='a' * 32))
+        manager.normalize()
+        manager.save(self.project.id)
+
+        batch = EventBatch(self.project)
+        assert batch.find_existing(['a' * 32, 'b' * 32]) == set(['a' * 32])
+
+    @mock.patch('sentry.event_manager.eventstream.insert')
+    def test_save_batch_node_write_failed(self, eventstream_insert):
+        managers = []
+        for message in ['foo', 'bar']:
+            manager = EventManager(make_event(message=message))
+            manager.normalize()
+            managers.append(manager)
+
+        batch = EventBatch(self.project)
+        events = [m.save(self.project.id, batch=batch) for m in managers]
+        with mock.patch('sentry.db.models.fields.node.nodestore.set_multi',
+                        side_effect=Exception('boom')):
+            assert batch.commit() == []
+
+        assert batch.failed == events
+        assert not Event.objects.filter(project_id=self.project.id).exists()
+        assert eventstream_insert.call_count == 0
+
     def test_default_fingerprint(self):
         manager = EventManager(make_event())
         manager.normalize()
@@ -0,0 +1,141 @@
+from __future__ import absolute_import
+
+import mock
+import pytest
+
+from collections import defaultdict
+
+from sentry.utils import json
+
+try:
+    from confluent_kafka import TopicPartition
+    from sentry.eventstream.kafka.backend import EVENT_PROTOCOL_VERSION, KafkaEventStream
+    has_kafka_client = True
+except ImportError:
+    has_kafka_client = False
+
+requires_kafka_client = pytest.mark.skipif(
+    not has_kafka_client,
+    reason='test requires confluent_kafka which is not installed',
+)
+
+
+class FakeMessage(object):
+    def __init__(self, topic, partition, offset, value):
+        self.__topic = topic
+        self.__partition = partition
+        self.__offset = offset
+        self.__value = value
+
+    def topic(self):
+        return self.__topic
+
+    def partition(self):
+        return self.__partition
+
+    def offset(self):
+        return self.__offset
+
+    def value(self):
+        return self.__value
+
+    def error(self):
+        return None
+
+
+class FakeCommitResult(object):
+    def __init__(self, topic, partition, offset):
+        self.topic = topic
+        self.partition = partition
+        self.offset = offset
+        self.error = None
+
+
+class FakeConsumer(object):
+    """
+    In-memory stand-in for ``SynchronizedConsumer`` that assigns every
+    partition of ``messages`` (a mapping of partition to message values) on
+    subscribe, delivers the messages round robin across partitions and stops
+    the relay once all messages have been delivered.
+    """
+
+    def __init__(self, messages, **kwargs):
+        self.messages = messages
+        self.committed = {}
+        self.closed = False
+
+    def subscribe(self, topics, on_assign=None, on_revoke=None):
+        self.topic = topics[0]
+        self.pending = []
+        queues = {p: list(enumerate(v)) for p, v in self.messages.items()}
+        while any(queues.values()):
+            for partition in sorted(queues):
+                if queues[partition]:
+                    offset, value = queues[partition].pop(0)
+                    self.pending.append(
+                        FakeMessage(self.topic, partition, offset, value))
+
+        on_assign(self, [TopicPartition(self.topic, p) for p in self.messages])
+
+    def poll(self, timeout):
+        if not self.pending:
+            raise KeyboardInterrupt
+        return self.pending.pop(0)
+
+    def commit(self, offsets, asynchronous=True):
+        results = []
+        for i in offsets:
+            self.committed[(i.topic, i.partition)] = i.offset
+            results.append(FakeCommitResult(i.topic, i.partition, i.offset))
+        return results
+
+    def close(self):
+        self.closed = True
+
+
+def get_insert_message(partition, offset):
+    return json.dumps([EVENT_PROTOCOL_VERSION, 'insert', {
+        'project_id': 1,
+        'group_id': partition,
+        'event_id': '%032x' % (offset, ),
+        'primary_hash': 'a' * 32,
+    }, {
+        'is_new': False,
+        'is_sample': False,
+        'is_regression': False,
+        'is_new_group_environment': False,
+    }])
+
+
+@requires_kafka_client
+@pytest.mark.parametrize('worker_count', [0, 3])
+def test_relay(worker_count):
+    messages = {
+        p: [get_insert_message(p, o) for o in range(20)] for p in range(4)
+    }
+    consumer = FakeConsumer(messages)
+    delivered = defaultdict(list)
+
+    def delay(**kwargs):
+        delivered[kwargs['group_id']].append(kwargs['event_id'])
+
+    eventstream = KafkaEventStream(producer_configuration={
+        'bootstrap.servers': 'localhost:9092',
+    })
+    with mock.patch('sentry.eventstream.kafka.backend.SynchronizedConsumer',
+                    return_value=consumer), \
+            mock.patch('sentry.eventstream.kafka.backend.post_process_group') as task:
+        task.delay.side_effect = delay
+        eventstream.relay(
+            consumer_group='relay',
+            commit_log_topic='commit-log',
+            synchronize_commit_group='snuba',
+            commit_batch_size=7,
+            worker_count=worker_count,
+            max_in_flight=5,
+        )
+
+    for p in range(4):
+        assert delivered[p] == ['%032x' % (o, ) for o in range(20)]
+    assert consumer.committed == {(eventstream.publish_topic, p): 20 for p in range(4)}
+    assert consumer.closed
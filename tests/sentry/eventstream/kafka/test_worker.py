@@ -0,0 +1,85 @@
+from __future__ import absolute_import
+
+import threading
+import time
+
+import pytest
+
+from sentry.eventstream.kafka.worker import PartitionWorkerPool
+
+
+def test_preserves_partition_order():
+    processed = []
+
+    def function(value):
+        processed.append(value)
+
+    pool = PartitionWorkerPool(function, worker_count=3, window=5)
+    for offset in range(50):
+        for partition in range(4):
+            pool.submit(('topic', partition), offset, (partition, offset))
+    pool.drain()
+
+    for partition in range(4):
+        assert [o for p, o in processed if p == partition] == list(range(50))
+
+    assert pool.get_offsets() == {('topic', p): 50 for p in range(4)}
+    assert pool.get_stats() == (200, 0)
+    pool.close()
+
+
+def test_window_limits_in_flight_messages():
+    release = threading.Event()
+    pool = PartitionWorkerPool(lambda value: release.wait(), worker_count=1, window=2)
+
+    pool.submit(('topic', 0), 0, None)
+    pool.submit(('topic', 0), 1, None)
+
+    submitted = threading.Event()
+
+    def submit():
+        pool.submit(('topic', 0), 2, None)
+        submitted.set()
+
+    t = threading.Thread(target=submit)
+    t.start()
+    time.sleep(0.3)
+    assert not submitted.is_set()
+    assert pool.get_stats() == (0, 2)
+
+    release.set()
+    t.join()
+    assert submitted.is_set()
+    pool.drain()
+    assert pool.get_offsets() == {('topic', 0): 3}
+    pool.close()
+
+
+def test_does_not_advance_offset_past_failure():
+    def function(value):
+        if value == 3:
+            raise ValueError('boom')
+
+    pool = PartitionWorkerPool(function, worker_count=2, window=10)
+    for offset in range(6):
+        pool.submit(('topic', 0), offset, offset)
+        pool.submit(('topic', 1), offset, None)
+    pool.drain()
+
+    assert pool.get_offsets() == {('topic', 0): 3, ('topic', 1): 6}
+    with pytest.raises(Exception):
+        pool.check()
+    with pytest.raises(Exception):
+        pool.submit(('topic', 0), 6, 6)
+    pool.close()
+
+
+def test_forget():
+    pool = PartitionWorkerPool(lambda value: None, worker_count=1)
+    pool.submit(('topic', 0), 10, None)
+    pool.submit(('topic', 1), 20, None)
+    pool.drain([('topic', 0)])
+    pool.drain([('topic', 1)])
+    pool.forget([('topic', 0)])
+    assert pool.get_offsets() == {('topic', 1): 21}
+    pool.close()
@@ -7,7 +7,7 @@ import six
 from symbolic import SourceMapTokenMatch
 
 from copy import deepcopy
-from mock import patch
+from mock import Mock, patch
 from requests.exceptions import RequestException
 
 from sentry import http
@@ -16,7 +16,11 @@ from sentry.lang.javascript.processor import (
     discover_sourcemap,
     fetch_sourcemap,
     fetch_file,
+    fetch_files,
+    fetch_release_view,
     generate_module,
+    get_artifact_cache,
+    get_view_cache,
     trim_line,
     fetch_release_file,
     UnparseableSourcemap,
@@ -27,6 +31,7 @@ from sentry.lang.javascript.processor import (
 from sentry.lang.javascript.errormapping import (rewrite_exception, REACT_MAPPING_URL)
 from sentry.models import File, Release, ReleaseFile, EventError
 from sentry.testutils import TestCase
+from sentry.utils.cache import cache
 from sentry.utils.strings import truncatechars
 
 base64_sourcemap = 'data:application/json;base64,eyJ2ZXJzaW9uIjozLCJmaWxlIjoiZ2VuZXJhdGVkLmpzIiwic291cmNlcyI6WyIvdGVzdC5qcyJdLCJuYW1lcyI6W10sIm1hcHBpbmdzIjoiO0FBQUEiLCJzb3VyY2VzQ29udGVudCI6WyJjb25zb2xlLmxvZyhcImhlbGxvLCBXb3JsZCFcIikiXX0='
@@ -55,6 +60,45 @@ class JavaScriptStacktraceProcessorTest(TestCase):
         r = JavaScriptStacktraceProcessor({}, None, project)
         assert not r.allow_scraping
 
+    @responses.activate
+    def test_cache_sources(self):
+        sourcemap = (
+            '{"version":3,"file":"a.min.js","sources":["a.js"],"names":[],'
+            '"mappings":"AAAA","sourcesContent":["console.log(1)"]}'
+        )
+        for name in ('a', 'b'):
+            responses.add(
+                responses.GET,
+                'http://example.com/%s.min.js' % name,
+                body='console.log(1)\n//# sourceMappingURL=shared.js.map',
+                content_type='application/javascript',
+            )
+        responses.add(
+            responses.GET,
+            'http://example.com/shared.js.map',
+            body=sourcemap,
+            content_type='application/json',
+        )
+
+        processor = JavaScriptStacktraceProcessor({}, None, self.project)
+        processor.max_fetches = 2
+        processor.cache_sources([
+            'http://example.com/a.min.js',
+            'http://example.com/b.min.js',
+            'http://example.com/c.min.js',
+        ])
+
+        # the shared sourcemap is only fetched once
+        assert len(responses.calls) == 3
+        for name in ('a', 'b'):
+            url = 'http://example.com/%s.min.js' % name
+            assert url in processor.cache
+            assert processor.sourcemaps.get_link(url)[0] == 'http://example.com/shared.js.map'
+        assert 'http://example.com/a.js' in processor.cache
+        assert processor.cache.get_errors('http://example.com/c.min.js') == [{
+            'type': EventError.JS_TOO_MANY_REMOTE_SOURCES,
+        }]
+
 
 class FetchReleaseFileTest(TestCase):
     def test_unicode(self):
@@ -97,6 +141,58 @@ class FetchReleaseFileTest(TestCase):
 
         assert result == new_result
 
+    def test_view_cache(self):
+        project = self.project
+        release = Release.objects.create(
+            organization_id=project.organization_id,
+            version='abc',
+        )
+        release.add_project(project)
+
+        file = File.objects.create(
+            name='file.min.js',
+            type='release.file',
+            headers={'Content-Type': 'application/javascript'},
+        )
+        file.putfile(six.BytesIO(b'console.log(1)'))
+        releasefile = ReleaseFile.objects.create(
+            name='file.min.js',
+            release=release,
+            organization_id=project.organization_id,
+            file=file,
+        )
+
+        get_artifact_cache().clear()
+        get_view_cache().clear()
+        parse = Mock(side_effect=lambda url, result: result.body)
+
+        assert fetch_release_view('source', 'file.min.js', release, None, parse) \
+            == 'console.log(1)'
+        # a hit does not fetch the artifact again
+        with patch('sentry.lang.javascript.processor._get_release_file') as get_release_file:
+            assert fetch_release_view('source', 'file.min.js', release, None, parse) \
+                == 'console.log(1)'
+        assert not get_release_file.called
+        assert parse.call_count == 1
+        assert get_view_cache().weight == len('console.log(1)')
+
+        # a new artifact under the same name gets a new entry
+        file = File.objects.create(
+            name='file.min.js',
+            type='release.file',
+            headers={'Content-Type': 'application/javascript'},
+        )
+        file.putfile(six.BytesIO(b'console.log(2)'))
+        releasefile.update(file=file)
+        cache.clear()
+        get_artifact_cache().clear()
+
+        assert fetch_release_view('source', 'file.min.js', release, None, parse) \
+            == 'console.log(2)'
+        assert parse.call_count == 2
+
+        assert fetch_release_view('source', 'missing.js', release, None, parse) is None
+
     def test_distribution(self):
         project = self.project
         release = Release.objects.create(
@@ -319,6 +415,57 @@ class FetchFileTest(TestCase):
         assert exc.value.data['url'] == url
 
 
+class FetchFilesTest(TestCase):
+    @responses.activate
+    def test_simple(self):
+        release = Release.objects.create(
+            organization_id=self.project.organization_id,
+            version='abc',
+        )
+        release.add_project(self.project)
+
+        file = File.objects.create(
+            name='file.min.js',
+            type='release.file',
+            headers={'Content-Type': 'application/javascript'},
+        )
+        file.putfile(six.BytesIO(b'release'))
+        ReleaseFile.objects.create(
+            name='http://example.com/file.min.js',
+            release=release,
+            organization_id=self.project.organization_id,
+            file=file,
+        )
+
+        for name in ('a', 'b', 'c'):
+            responses.add(
+                responses.GET,
+                'http://example.com/%s.js' % name,
+                body=name,
+                content_type='application/javascript',
+            )
+        responses.add(responses.GET, 'http://example.com/d.js', status=404)
+
+        urls = [
+            'http://example.com/c.js',
+            'http://example.com/file.min.js',
+            'http://example.com/a.js',
+            'http://example.com/d.js',
+            'http://example.com/b.js',
+            '/missing.js',
+        ]
+        results = fetch_files(urls, project=self.project, release=release)
+
+        assert [r.body for r in results[:3]] == ['c', 'release', 'a']
+        assert results[4].body == 'b'
+        assert isinstance(results[3], http.CannotFetch)
+        assert results[3].data['type'] == EventError.FETCH_INVALID_HTTP_CODE
+        assert isinstance(results[5], http.CannotFetch)
+        assert results[5].data['type'] == EventError.JS_MISSING_SOURCE
+        # the release artifact is not scraped
+        assert len(responses.calls) == 4
+
+
 class CacheControlTest(TestCase):
     def test_simple(self):
         headers = {'content-type': 'application/json', 'cache-control': 'max-age=120'}
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+
+import pytest
+
+from six import BytesIO
+from symbolic import SourceMapView
+
+from sentry.lang.javascript.sourcemapindex import (
+    INDEX_FILE_TYPE, SourceMapIndex, build_sourcemap_index, get_sourcemap_index_id,
+    load_sourcemap_index, store_sourcemap_index
+)
+from sentry.models import File
+from sentry.testutils import TestCase
+from sentry.utils import json
+
+sourcemap = json.dumps({
+    'version': 3,
+    'file': 'file.min.js',
+    'sources': ['file1.js', 'file2.js'],
+    'sourcesContent': [u'function add(a, b) {\n  return a + b;\n}', None],
+    'names': ['add', 'a', 'b', 'multiply', 'divide', 'c', 'e', 'Raven', 'captureException'],
+    'mappings': 'AAAA,QAASA,KAAIC,EAAGC,GACf,YACA,OAAOD,GAAIC,ECFZ,QAASC,UAASF,EAAGC,GACpB,YACA,OAAOD,GAAIC,EAEZ,QAASE,QAAOH,EAAGC,GAClB,YACA,KACC,MAAOC,UAASH,IAAIC,EAAGC,GAAID,EAAGC,GAAKG,EAClC,MAAOC,GACRC,MAAMC,iBAAiBF',
+    'sourceRoot': 'foo',
+})
+
+
+class SourceMapIndexTest(TestCase):
+    def setUp(self):
+        self.index = SourceMapIndex(BytesIO(build_sourcemap_index(sourcemap)))
+
+    def test_lookup_matches_sourcemap_view(self):
+        view = SourceMapView.from_json_bytes(sourcemap)
+        tokens = list(self.index.iter_tokens())
+        assert tokens
+        for dst_line, dst_col, _, _, _, _ in tokens:
+            expected = view.lookup(dst_line, dst_col)
+            token = self.index.lookup(dst_line, dst_col)
+            assert (token.src_line, token.src_col, token.dst_line, token.dst_col) == \
+                (expected.src_line, expected.src_col, expected.dst_line, expected.dst_col)
+            assert token.name == expected.name
+            assert token.src == expected.src
+
+    def test_lookup_between_tokens(self):
+        token = self.index.lookup(0, 9)
+        assert (token.dst_line, token.dst_col) == (0, 8)
+        assert token.src == 'foo/file1.js'
+        assert token.name == 'add'
+
+    def test_lookup_across_blocks_and_lines(self):
+        # a line with more tokens than fit into a block, an empty line and
+        # a line with unsorted tokens
+        mappings = ','.join(['AAAA'] + ['CAAC'] * 99) + ';;' + 'EAAA,DAAA'
+        index = SourceMapIndex(BytesIO(build_sourcemap_index(json.dumps({
+            'version': 3, 'sources': ['file.js'], 'names': [], 'mappings': mappings,
+        }))))
+        assert index.block_count == 3
+        assert index.lookup(0, 70).dst_col == 70
+        assert index.lookup(0, 150).dst_col == 99
+        # lookups in the empty line or before the first token of a line
+        # resolve to the last token of the previous line
+        assert (index.lookup(1, 0).dst_line, index.lookup(1, 0).dst_col) == (0, 99)
+        assert (index.lookup(2, 0).dst_line, index.lookup(2, 0).dst_col) == (0, 99)
+        assert (index.lookup(2, 1).dst_line, index.lookup(2, 1).dst_col) == (2, 1)
+        assert [token[:2] for token in index.iter_tokens()][-2:] == [(2, 1), (2, 2)]
+
+    def test_original_function_name(self):
+        minified_source = ['function a(b){return b}']
+        index = SourceMapIndex(BytesIO(build_sourcemap_index(json.dumps({
+            'version': 3, 'sources': ['file.js'], 'names': ['add', 'x'],
+            'mappings': 'AAAA,SAASA,EAACC,QAAQ',
+        }))))
+        token = index.lookup(0, 15, 'a', minified_source)
+        assert token.function_name == 'add'
+        assert index.lookup(0, 15, 'foo', minified_source).function_name is None
+
+    def test_iter_sources(self):
+        assert list(self.index.iter_sources()) == [(0, 'foo/file1.js'), (1, 'foo/file2.js')]
+
+    def test_get_sourceview(self):
+        sourceview = self.index.get_sourceview(0)
+        assert sourceview.get_line(1) == u'  return a + b;'
+        assert self.index.get_sourceview(1) is None
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            build_sourcemap_index('{"foo": 42}')
+        with pytest.raises(ValueError):
+            build_sourcemap_index(json.dumps({'version': 3, 'sections': [], 'mappings': ''}))
+        with pytest.raises(ValueError):
+            build_sourcemap_index(json.dumps({
+                'version': 3, 'sources': [], 'names': [], 'mappings': 'AAAA',
+            }))
+        with pytest.raises(ValueError):
+            build_sourcemap_index(json.dumps({
+                'version': 3, 'sources': ['file.js'], 'names': [], 'mappings': 'D',
+            }))
+        with pytest.raises(ValueError):
+            SourceMapIndex(BytesIO(b'\x00' * 16))
+
+    def test_size(self):
+        # tokens are varint encoded, so the index isn't larger than the map
+        assert len(build_sourcemap_index(sourcemap)) < len(sourcemap)
+
+
+class StoreSourceMapIndexTest(TestCase):
+    def test_store_and_load(self):
+        file = File.objects.create(name='file.min.js.map', type='release.file')
+        file.putfile(BytesIO(sourcemap.encode('utf-8')))
+        checksum = file.checksum
+
+        index_file = store_sourcemap_index(file)
+        assert index_file.checksum != checksum
+        assert get_sourcemap_index_id(File.objects.get(id=file.id).headers) == index_file.id
+        assert store_sourcemap_index(file) == index_file
+        assert File.objects.get(id=file.id).checksum == checksum
+
+        index = load_sourcemap_index(index_file.id)
+        assert index.lookup(0, 9).name == 'add'
+        assert load_sourcemap_index(file.id) is None
+        # only the tables of the index are held in memory
+        assert len(index) < index_file.size
+
+    def test_delete_with_sourcemap(self):
+        file = File.objects.create(name='file.min.js.map', type='release.file')
+        file.putfile(BytesIO(sourcemap.encode('utf-8')))
+        index_file = store_sourcemap_index(file)
+
+        file.delete()
+        assert not File.objects.filter(id=index_file.id, type=INDEX_FILE_TYPE).exists()
@@ -1,5 +1,6 @@
 from __future__ import absolute_import
 
+import mock
 import os
 import time
 import zipfile
@@ -10,6 +11,7 @@ from django.core.urlresolvers import reverse
 
 from symbolic import SYMCACHE_LATEST_VERSION
 
+from sentry.app import locks
 from sentry.testutils import APITestCase, TestCase
 from sentry.models import debugfile, File, ProjectDebugFile, ProjectSymCacheFile, \
     ProjectCfiCacheFile
@@ -323,6 +325,34 @@ class DebugFilesClearTest(APITestCase):
         # But it's gone now
         assert not os.path.isfile(difs[PROGUARD_UUID])
 
+    def test_cache_clear_by_size(self):
+        path = ProjectDebugFile.difcache.get_project_path(self.project)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        now = time.time()
+        files = []
+        for i in range(3):
+            filename = os.path.join(path, 'clear-by-size-%s' % i)
+            with open(filename, 'wb') as f:
+                f.write(b'x' * 100)
+            # The first file is the least recently used one
+            os.utime(filename, (now - 60 * (3 - i), now - 60 * (3 - i)))
+            files.append(filename)
+
+        try:
+            with self.options({'dsym.cache-max-size': 0}):
+                ProjectDebugFile.difcache.clear_old_entries()
+            assert all(os.path.isfile(f) for f in files)
+
+            with self.options({'dsym.cache-max-size': 250}):
+                ProjectDebugFile.difcache.clear_old_entries()
+            assert [os.path.isfile(name) for name in files] == [False, True, True]
+        finally:
+            for filename in files:
+                if os.path.isfile(filename):
+                    os.remove(filename)
+
 
 class SymCacheTest(TestCase):
     def test_get_symcache(self):
@@ -352,6 +382,49 @@ class SymCacheTest(TestCase):
         assert debug_id in symcaches
         assert symcaches[debug_id].id == debug_id
 
+    def test_reuse_symcache(self):
+        debug_id = '67e9247c-814e-392b-a027-dbde6748fcbf'
+        self.create_dif_from_path(
+            path=os.path.join(os.path.dirname(__file__), 'fixtures', 'crash.dsym'),
+            debug_id=debug_id,
+            features=['debug'],
+        )
+
+        # The first call converts the DIF and returns the new cache in memory
+        ProjectDebugFile.difcache.get_symcaches(self.project, [debug_id])
+        symcache = ProjectDebugFile.difcache.get_symcaches(self.project, [debug_id])[debug_id]
+
+        with self.assertNumQueries(0):
+            symcaches = ProjectDebugFile.difcache.get_symcaches(self.project, [debug_id])
+        assert symcaches[debug_id] is symcache
+
+    def test_reuse_symcache_touches_file(self):
+        debug_id = '67e9247c-814e-392b-a027-dbde6748fcbf'
+        self.create_dif_from_path(
+            path=os.path.join(os.path.dirname(__file__), 'fixtures', 'crash.dsym'),
+            debug_id=debug_id,
+            features=['debug'],
+        )
+
+        ProjectDebugFile.difcache.get_symcaches(self.project, [debug_id])
+        ProjectDebugFile.difcache.get_symcaches(self.project, [debug_id])
+
+        path = ProjectDebugFile.difcache.get_project_path(self.project)
+        filename = os.path.join(path, next(
+            f for f in os.listdir(path) if f.endswith('.projectsymcachefile')
+        ))
+        now = int(time.time())
+        os.utime(filename, (now - 7200, now - 7200))
+
+        # the pooled handle was touched when it was opened, so it is only
+        # touched again an hour later
+        ProjectDebugFile.difcache.get_symcaches(self.project, [debug_id])
+        assert os.stat(filename).st_mtime == now - 7200
+
+        with mock.patch('time.time', return_value=now + 3601):
+            ProjectDebugFile.difcache.get_symcaches(self.project, [debug_id])
+        assert os.stat(filename).st_mtime == now + 3601
+
     def test_miss_symcache_without_feature(self):
         debug_id = '67e9247c-814e-392b-a027-dbde6748fcbf'
         self.create_dif_from_path(
@@ -646,3 +719,36 @@ class CfiCacheTest(TestCase):
         cficache.delete()
         assert not File.objects.filter(id=cache_file.id).exists()
         assert not ProjectCfiCacheFile.objects.filter(id=cficache.id).exists()
+
+
+class UpdateCachesTest(TestCase):
+    def test_update_caches_downloads_once(self):
+        debug_id = '67e9247c-814e-392b-a027-dbde6748fcbf'
+        dif = self.create_dif_from_path(
+            path=os.path.join(os.path.dirname(__file__), 'fixtures', 'crash.dsym'),
+            debug_id=debug_id,
+            features=['debug', 'unwind'],
+        )
+
+        with mock.patch.object(File, 'getfile', autospec=True, side_effect=File.getfile) \
+                as getfile:
+            ProjectDebugFile.difcache.update_caches(self.project, [debug_id])
+
+        assert getfile.call_count == 1
+        assert ProjectSymCacheFile.objects.filter(debug_file=dif).exists()
+
+    def test_update_caches_skips_locked(self):
+        debug_id = '67e9247c-814e-392b-a027-dbde6748fcbf'
+        dif = self.create_dif_from_path(
+            path=os.path.join(os.path.dirname(__file__), 'fixtures', 'crash.dsym'),
+            debug_id=debug_id,
+            features=['debug'],
+        )
+
+        lock = locks.get(u'difcache:convert:%s' % dif.id, duration=60)
+        with lock.acquire():
+            ProjectDebugFile.difcache.update_caches(self.project, [debug_id])
+        assert not ProjectSymCacheFile.objects.filter(debug_file=dif).exists()
+
+        ProjectDebugFile.difcache.update_caches(self.project, [debug_id])
+        assert ProjectSymCacheFile.objects.filter(debug_file=dif).exists()
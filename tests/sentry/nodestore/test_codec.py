@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+
+import mock
+import pytest
+
+from base64 import b64encode
+
+from sentry.nodestore.codec import MAGIC, NodeCodec, NodeDecodeError
+from sentry.testutils import TestCase
+from sentry.utils import json
+from sentry.utils.compat import pickle
+from sentry.utils.strings import compress
+
+
+class NodeCodecTest(TestCase):
+    def setUp(self):
+        self.codec = NodeCodec(serializer='json', compressor='zlib')
+
+    def test_roundtrip(self):
+        data = {'foo': 'bar', 'values': [1, 2, 3], 'nested': {u'ü': None}}
+        value = self.codec.encode(data)
+        assert value.startswith(MAGIC)
+        assert self.codec.is_current(value)
+        assert self.codec.decode(value) == data
+
+    def test_roundtrip_msgpack(self):
+        pytest.importorskip('msgpack')
+        codec = NodeCodec(serializer='msgpack', compressor='none')
+        data = {'foo': 'bar', 'values': [1, 2, 3]}
+        assert codec.decode(codec.encode(data)) == data
+
+    def test_msgpack_not_installed(self):
+        pytest.importorskip('msgpack')
+        value = NodeCodec(serializer='msgpack', compressor='none').encode({'foo': 'bar'})
+        with mock.patch('sentry.nodestore.codec.msgpack', None):
+            with pytest.raises(NodeDecodeError):
+                self.codec.decode(value)
+
+    def test_default_settings(self):
+        codec = NodeCodec()
+        assert codec.is_current(self.codec.encode({'foo': 'bar'}))
+
+    def test_decodes_other_settings(self):
+        value = NodeCodec(serializer='json', compressor='none').encode({'foo': 'bar'})
+        assert not self.codec.is_current(value)
+        assert self.codec.decode(value) == {'foo': 'bar'}
+
+    def test_decodes_legacy_pickle(self):
+        value = compress(pickle.dumps({'foo': 'bar'}))
+        assert not self.codec.is_current(value)
+        assert self.codec.decode(value) == {'foo': 'bar'}
+
+    def test_decodes_legacy_json(self):
+        assert self.codec.decode(json.dumps({'foo': 'bar'})) == {'foo': 'bar'}
+
+    def test_rejects_unknown_version(self):
+        value = self.codec.encode({'foo': 'bar'})
+        with pytest.raises(NodeDecodeError):
+            self.codec.decode(value[:2] + b'\xff' + value[3:])
+
+    def test_dictionary(self):
+        zstandard = pytest.importorskip('zstandard')
+        samples = [
+            json.dumps({'platform': 'python', 'message': 'error %d' % i}).encode('utf-8')
+            for i in range(1000)
+        ]
+        dictionary = zstandard.train_dictionary(1024, samples).as_bytes()
+        codec = NodeCodec(serializer='json', compressor='zstd', dictionaries={
+            'python': dictionary,
+        })
+        data = {'platform': 'python', 'message': 'error 1'}
+        value = codec.encode(data)
+        assert codec.decode(value) == data
+        with pytest.raises(NodeDecodeError):
+            NodeCodec(serializer='json', compressor='zstd').decode(value)
+
+    def test_django_field_reads_legacy_values(self):
+        from sentry.nodestore.django.models import Node
+        field = Node._meta.get_field('data')
+        legacy = compress(pickle.dumps({'foo': 'bar'}))
+        assert field.to_python(legacy) == {'foo': 'bar'}
+        assert field.to_python(b64encode(self.codec.encode({'foo': 'baz'}))) == {'foo': 'baz'}
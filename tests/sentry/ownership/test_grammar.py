@@ -2,7 +2,7 @@ from __future__ import absolute_import
 
 from sentry.ownership.grammar import (
     Rule, Matcher, Owner,
-    parse_rules, dump_schema, load_schema,
+    parse_rules, dump_schema, load_schema, compile_rules,
 )
 
 fixture_data = """
@@ -117,3 +117,30 @@ def test_matcher_test_stacktrace():
     assert not Matcher('path', '*.jsx').test(data)
     assert not Matcher('url', '*.py').test(data)
     assert not Matcher('path', '*.py').test({})
+
+
+def test_compile_rules():
+    rules = parse_rules(fixture_data)
+    compiled = compile_rules(dump_schema(rules))
+    assert len(compiled) == 3
+
+    data = {
+        'request': {
+            'url': 'http://google.com/foo',
+        },
+        'exception': {
+            'values': [{
+                'stacktrace': {
+                    'frames': [
+                        {'filename': 'src/sentry/models.py'},
+                        {'abs_path': 'app.js'},
+                        {'filename': 'src/sentry/models.py'},
+                    ]
+                }
+            }]
+        }
+    }
+    assert compiled.test(data) == rules
+    assert compiled.test({'stacktrace': {'frames': [{'filename': 'foo.js'}]}}) == [rules[0]]
+    assert compiled.test({'request': {'url': 'http://example.com/foo.js'}}) == []
+    assert compiled.test({}) == []
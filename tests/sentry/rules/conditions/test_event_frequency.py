@@ -10,7 +10,7 @@ import six
 from sentry import tsdb
 from sentry.models import Rule
 from sentry.rules.conditions.event_frequency import (
-    EventFrequencyCondition, EventUniqueUserFrequencyCondition
+    EventFrequencyCondition, EventUniqueUserFrequencyCondition, get_frequency_results
 )
 from sentry.testutils.cases import RuleTestCase
 from six.moves import xrange
@@ -221,3 +221,33 @@ class EventUniqueUserFrequencyConditionTestCase(FrequencyConditionMixin, RuleTes
             environment_id=environment_id,
             timestamp=timestamp
         )
+
+
+class FrequencyResultsTestCase(RuleTestCase):
+    rule_cls = EventFrequencyCondition
+
+    def test_batches_and_deduplicates_queries(self):
+        event = self.get_event()
+        rule = Rule(environment_id=None)
+        conditions = [
+            EventFrequencyCondition(self.project, data={'interval': '1h', 'value': '1'}, rule=rule),
+            EventFrequencyCondition(self.project, data={'interval': '1h', 'value': '5'}, rule=rule),
+            EventUniqueUserFrequencyCondition(
+                self.project, data={'interval': '1h', 'value': '1'}, rule=rule),
+        ]
+        tsdb.incr(tsdb.models.group, event.group_id, count=3)
+
+        with mock.patch.object(tsdb, 'get_totals_multi', wraps=tsdb.get_totals_multi) as query:
+            results = get_frequency_results(event, conditions)
+        assert len(query.call_args[0][0]) == 2
+
+        assert results == {
+            ('get_sums', tsdb.models.group, '1h', None): 3,
+            ('get_distinct_counts_totals', tsdb.models.users_affected_by_group, '1h', None): 0,
+        }
+
+        state = self.get_state(frequency_results=results)
+        with mock.patch.object(tsdb, 'get_sums') as get_sums:
+            assert conditions[0].passes(event, state) is True
+            assert conditions[1].passes(event, state) is False
+        assert not get_sums.called
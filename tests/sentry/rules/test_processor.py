@@ -8,10 +8,15 @@ from django.utils import timezone
 from sentry.models import GroupRuleStatus, Rule
 from sentry.plugins import plugins
 from sentry.testutils import TestCase
-from sentry.rules.processor import EventCompatibilityProxy, RuleProcessor
+from sentry.rules.conditions.event_frequency import EventFrequencyCondition
+from sentry.rules.conditions.every_event import EveryEventCondition
+from sentry.rules.processor import EventCompatibilityProxy, RuleProcessor, plan_cache
 
 
 class RuleProcessorTest(TestCase):
+    def setUp(self):
+        plan_cache.clear()
+
     # this test relies on a few other tests passing
     def test_integrated(self):
         event = self.create_event()
@@ -59,6 +64,85 @@ class RuleProcessorTest(TestCase):
         results = list(rp.apply())
         assert len(results) == 1
 
+    def get_processor(self, event):
+        return RuleProcessor(
+            event,
+            is_new=True,
+            is_regression=True,
+            is_new_group_environment=True,
+            has_reappeared=True)
+
+    def test_plan_orders_frequency_conditions_last(self):
+        event = self.create_event()
+
+        Rule.objects.filter(project=event.project).delete()
+        Rule.objects.create(
+            project=event.project,
+            data={
+                'conditions': [
+                    {
+                        'id': 'sentry.rules.conditions.event_frequency.EventFrequencyCondition',
+                        'interval': '1h',
+                        'value': 10,
+                    },
+                    {'id': 'sentry.rules.conditions.every_event.EveryEventCondition'},
+                ],
+                'actions': [{'id': 'sentry.rules.actions.notify_event.NotifyEventAction'}],
+            }
+        )
+
+        plan = self.get_processor(event).get_plan()
+        assert len(plan) == 1
+        assert [type(c) for c in plan[0].conditions] == [
+            EveryEventCondition, EventFrequencyCondition,
+        ]
+
+    def test_plan_is_cached_until_rule_saved(self):
+        event = self.create_event()
+
+        Rule.objects.filter(project=event.project).delete()
+        rule = Rule.objects.create(
+            project=event.project,
+            data={
+                'conditions': [{'id': 'sentry.rules.conditions.every_event.EveryEventCondition'}],
+                'actions': [{'id': 'sentry.rules.actions.notify_event.NotifyEventAction'}],
+            }
+        )
+
+        plan = self.get_processor(event).get_plan()
+        assert self.get_processor(event).get_plan() is plan
+
+        rule.data['frequency'] = 5
+        rule.save()
+
+        new_plan = self.get_processor(event).get_plan()
+        assert new_plan is not plan
+        assert new_plan[0].frequency == 5
+
+    def test_rule_statuses_are_fetched_in_bulk(self):
+        event = self.create_event()
+
+        Rule.objects.filter(project=event.project).delete()
+        rule_list = [
+            Rule.objects.create(
+                project=event.project,
+                data={
+                    'conditions': [{'id': 'sentry.rules.conditions.every_event.EveryEventCondition'}],
+                    'actions': [{'id': 'sentry.rules.actions.notify_event.NotifyEventAction'}],
+                }
+            ) for _ in range(3)
+        ]
+        existing = GroupRuleStatus.objects.create(
+            rule=rule_list[0],
+            group=event.group,
+            project=event.project,
+        )
+
+        statuses = self.get_processor(event).get_rule_statuses(rule_list)
+        assert sorted(statuses) == sorted(r.id for r in rule_list)
+        assert statuses[rule_list[0].id] == existing
+        assert GroupRuleStatus.objects.filter(group=event.group).count() == 3
+
 
 class EventCompatibilityProxyTest(TestCase):
     def test_simple(self):
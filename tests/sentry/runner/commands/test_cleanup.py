@@ -0,0 +1,30 @@
+from __future__ import absolute_import
+
+from sentry.cache import default_cache
+from sentry.models import Group
+from sentry.runner.commands.cleanup import delete_shard, get_checkpoint_key
+from sentry.testutils import TestCase
+
+
+class DeleteShardTest(TestCase):
+    def test_resumes_from_checkpoint(self):
+        groups = sorted(self.create_group().id for i in range(4))
+        checkpoint_key = get_checkpoint_key('sentry.models.Group', None, self.project.id, 0)
+
+        # pretend an earlier run was interrupted after the first two groups
+        default_cache.set(checkpoint_key, groups[1], 60)
+
+        deleted = delete_shard(
+            Group,
+            dtfield=None,
+            days=None,
+            project_id=self.project.id,
+            min_id=None,
+            max_id=None,
+            checkpoint_key=checkpoint_key,
+            chunk_size=1,
+        )
+
+        assert deleted == 2
+        assert sorted(Group.objects.values_list('id', flat=True)) == groups[:2]
+        assert default_cache.get(checkpoint_key) is None
@@ -49,3 +49,23 @@ class RedisScriptMinHashIndexBackendTestCase(MinHashIndexBackendTestMixin, TestC
 
         result = self.index.export('example', [('index', 2)], timestamp=timestamp)
         assert len(result) == 1
+
+    def test_record_multi_classify_multi(self):
+        self.index.record_multi([
+            ('example', '1', [('index', 'hello world')], None),
+            ('example', '2', [('index', 'pizza world')], None),
+            ('other', '1', [('index', 'pizza world')], None),
+        ])
+
+        results = self.index.classify_multi([
+            ('example', [('index', self.index.bands, 'hello world')], None),
+            ('example', [('index', self.index.bands, 'pizza world')], None),
+            ('other', [('index', self.index.bands, 'hello world')], None),
+        ])
+        assert results == [
+            self.index.classify('example', [('index', self.index.bands, 'hello world')]),
+            self.index.classify('example', [('index', self.index.bands, 'pizza world')]),
+            [],
+        ]
+        assert results[0] == [('1', [1.0])]
+        assert results[1] == [('2', [1.0])]
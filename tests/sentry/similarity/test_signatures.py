@@ -3,6 +3,8 @@ from __future__ import absolute_import
 from collections import Counter
 from unittest import TestCase
 
+import mmh3
+
 from sentry.similarity.signatures import MinHashSignatureBuilder
 
 
@@ -38,3 +40,22 @@ class MinHashSignatureBuilderTestCase(TestCase):
             estimation,
             delta=0.1,  # totally made up constant, seems reasonable
         )
+
+    def test_signatures_are_stable(self):
+        n = 16
+        r = 0xFFFF
+        get_signature = MinHashSignatureBuilder(n, r)
+        features = ['foo', 'bar', 'baz', 'foo']
+
+        # signatures must not change, or they will no longer match the
+        # signatures already stored in the index
+        expected = [
+            min(mmh3.hash(feature, column) % r for feature in features)
+            for column in range(n)
+        ]
+        assert get_signature(features) == expected
+        assert get_signature(features) == expected
+        assert get_signature.get_feature_hashes.cache_info().hits == 3
+
+        with self.assertRaises(ValueError):
+            get_signature([])
@@ -1,5 +1,6 @@
 from __future__ import absolute_import
 
+import mock
 import os
 import pytest
 
@@ -330,6 +331,50 @@ class TagStorage(TestCase):
         ).count() == 1
         assert models.GroupTagValue.objects.all().count() == 1
 
+    @mock.patch('sentry.tagstore.v2.backend.buffer')
+    def test_incr_tag_values_times_seen(self, buffer):
+        now = datetime(2017, 5, 3, 6, 6, 6)
+        self.ts.incr_tag_values_times_seen(
+            project_id=self.proj1.id,
+            group_id=self.proj1group1.id,
+            environment_id=self.proj1env1.id,
+            tags=[('k1', 'v1', None), ('k2', 'v2', {'foo': 'bar'})],
+            last_seen=now,
+        )
+
+        assert buffer.incr_multi.call_count == 1
+        items = buffer.incr_multi.call_args[0][0]
+        # a tag value and group tag value per tag, for both the environment
+        # and the aggregate environment
+        assert len(items) == 8
+        assert [model for model, _, _, _ in items] == [
+            models.TagValue, models.GroupTagValue,
+        ] * 4
+        assert all(columns == {'times_seen': 1} for _, columns, _, _ in items)
+
+        tv = models.TagValue.objects.get(
+            project_id=self.proj1.id,
+            _key__environment_id=self.proj1env1.id,
+            value='v2',
+        )
+        assert (models.TagValue, {'times_seen': 1}, {
+            'project_id': self.proj1.id,
+            '_key_id': tv._key_id,
+            'value': 'v2',
+        }, {
+            'last_seen': now,
+            'data': {'foo': 'bar'},
+        }) in items
+        assert (models.GroupTagValue, {'times_seen': 1}, {
+            'project_id': self.proj1.id,
+            'group_id': self.proj1group1.id,
+            '_key_id': tv._key_id,
+            '_value_id': tv.id,
+        }, {
+            'project_id': self.proj1.id,
+            'last_seen': now,
+        }) in items
+
     def test_create_event_tags(self):
         v1, _ = self.ts.get_or_create_tag_value(self.proj1.id, self.proj1env1.id, 'k1', 'v1')
         v2, _ = self.ts.get_or_create_tag_value(self.proj1.id, self.proj1env1.id, 'k2', 'v2')
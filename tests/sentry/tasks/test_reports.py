@@ -9,12 +9,12 @@ import pytz
 from django.core import mail
 
 from sentry.app import tsdb
-from sentry.models import Project, UserOption
+from sentry.models import GroupStatus, Project, UserOption
 from sentry.tasks.reports import (
     DISABLED_ORGANIZATIONS_USER_OPTION_KEY, Report, Skipped, change, clean_series, colorize,
     deliver_organization_user_report, get_calendar_range, get_percentile, has_valid_aggregates,
-    index_to_month, merge_mappings, merge_sequences, merge_series, month_to_index, prepare_reports,
-    safe_add, user_subscribed_to_organization_reports
+    index_to_month, merge_mappings, merge_sequences, merge_series, month_to_index,
+    prepare_project_report, prepare_projects_reports, prepare_reports, safe_add, user_subscribed_to_organization_reports
 )
 from sentry.testutils.cases import TestCase
 from sentry.utils.dates import to_datetime, to_timestamp
@@ -298,6 +298,38 @@ class ReportTestCase(TestCase):
             message = mail.outbox[0]
             assert self.organization.name in message.subject
 
+    def test_prepare_projects_reports(self):
+        now = datetime(2016, 9, 12, tzinfo=pytz.utc)
+        interval = (now - timedelta(days=7), now)
+
+        projects = [
+            self.create_project(organization=self.organization, teams=[self.team])
+            for _ in range(3)
+        ]
+        resolved = self.create_group(
+            project=projects[0],
+            status=GroupStatus.RESOLVED,
+            first_seen=now - timedelta(days=2),
+            resolved_at=now - timedelta(days=1),
+        )
+        created = self.create_group(
+            project=projects[1],
+            first_seen=now - timedelta(days=3),
+        )
+
+        for i, project in enumerate(projects):
+            tsdb.incr(tsdb.models.project, project.id, now - timedelta(days=1), count=i + 5)
+        tsdb.incr(tsdb.models.group, resolved.id, now - timedelta(days=1), count=2)
+        tsdb.incr(tsdb.models.group, created.id, now - timedelta(days=1), count=3)
+
+        with mock.patch.object(tsdb, 'get_earliest_timestamp') as get_earliest_timestamp:
+            get_earliest_timestamp.return_value = to_timestamp(now - timedelta(days=60))
+            reports = prepare_projects_reports(interval, projects)
+            assert reports == {
+                project.id: prepare_project_report(interval, project)
+                for project in projects
+            }
+
     def test_deliver_organization_user_report_respects_settings(self):
         user = self.user
         organization = self.organization
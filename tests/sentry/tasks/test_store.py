@@ -5,9 +5,14 @@ import uuid
 from time import time
 
 from sentry import quotas, tsdb
+from sentry.attachments import CachedAttachment, attachment_cache
 from sentry.event_manager import EventManager, HashDiscarded
 from sentry.plugins import Plugin2
-from sentry.tasks.store import preprocess_event, process_event, save_event
+from sentry.cache import default_cache
+from sentry.models import Event, EventAttachment
+from sentry.tasks.store import (
+    preprocess_event, process_event, save_event, save_event_batch, submit_save_event
+)
 from sentry.testutils import PluginTestCase
 from sentry.utils.dates import to_datetime
 
@@ -216,3 +221,132 @@ class StoreTasksTest(PluginTestCase):
             ],
                 timestamp=to_datetime(now),
             )
+
+    @mock.patch('sentry.tasks.store.save_event_batch')
+    @mock.patch('sentry.tasks.store.save_event')
+    def test_save_event_batch(self, mock_save_event, mock_save_event_batch):
+        project = self.create_project()
+
+        with self.settings(SENTRY_SAVE_EVENT_BATCH_SIZE=2):
+            for i in range(3):
+                manager = EventManager({
+                    'event_id': uuid.uuid4().hex,
+                    'message': 'test %d' % (i % 2),
+                    'platform': 'python',
+                })
+                manager.normalize()
+                data = dict(manager.get_data().items())
+                data['project'] = project.id
+                default_cache.set('e:%d' % i, data, 3600)
+                submit_save_event(
+                    cache_key='e:%d' % i, start_time=time(), event_id=data['event_id'],
+                    project_id=project.id,
+                )
+
+            assert mock_save_event.delay.call_count == 0
+            assert mock_save_event_batch.delay.call_count == 3
+            mock_save_event_batch.delay.assert_called_with(project_id=project.id)
+
+            save_event_batch(project.id)
+            events = Event.objects.filter(project_id=project.id)
+            assert len(events) == 2
+            assert len(set(e.group_id for e in events)) == 2
+            assert default_cache.get('e:0') is None
+            assert default_cache.get('e:2') is not None
+
+            save_event_batch(project.id)
+            save_event_batch(project.id)
+            events = Event.objects.filter(project_id=project.id)
+            assert len(events) == 3
+            # events with the same message end up in the same group
+            assert len(set(e.group_id for e in events)) == 2
+
+    @mock.patch('sentry.tasks.store.save_event_batch')
+    def test_save_event_batch_duplicates(self, mock_save_event_batch):
+        project = self.create_project()
+        event_ids = [uuid.uuid4().hex, uuid.uuid4().hex]
+
+        with self.settings(SENTRY_SAVE_EVENT_BATCH_SIZE=10):
+            # the first event is stored before, and the second one is
+            # repeated within the batch
+            for i, event_id in enumerate(event_ids[:1] + event_ids + event_ids[1:]):
+                manager = EventManager({
+                    'event_id': event_id,
+                    'message': 'test',
+                    'platform': 'python',
+                })
+                manager.normalize()
+                if i == 0:
+                    manager.save(project.id)
+                    continue
+                data = dict(manager.get_data().items())
+                data['project'] = project.id
+                default_cache.set('e:%d' % i, data, 3600)
+                submit_save_event(
+                    cache_key='e:%d' % i, start_time=time(), event_id=event_id,
+                    project_id=project.id,
+                )
+
+            with mock.patch.object(EventManager, 'save', autospec=True,
+                                   side_effect=EventManager.save) as save:
+                save_event_batch(project.id)
+
+            # only the new event is saved
+            assert save.call_count == 1
+            assert sorted(Event.objects.filter(
+                project_id=project.id,
+            ).values_list('event_id', flat=True)) == sorted(event_ids)
+            for i in range(1, 4):
+                assert default_cache.get('e:%d' % i) is None
+
+    def submit_events_with_attachments(self, project, count):
+        for i in range(count):
+            manager = EventManager({
+                'event_id': uuid.uuid4().hex,
+                'message': 'test',
+                'platform': 'python',
+            })
+            manager.normalize()
+            data = dict(manager.get_data().items())
+            data['project'] = project.id
+            default_cache.set('e:%d' % i, data, 3600)
+            attachment_cache.set('e:%d' % i, [
+                CachedAttachment(name='log.txt', content_type='text/plain', data='foo'),
+            ])
+            submit_save_event(
+                cache_key='e:%d' % i, start_time=time(), event_id=data['event_id'],
+                project_id=project.id,
+            )
+
+    def assert_events_dropped(self, project, count):
+        assert not Event.objects.filter(project_id=project.id).exists()
+        assert not EventAttachment.objects.filter(project_id=project.id).exists()
+        for i in range(count):
+            assert default_cache.get('e:%d' % i) is None
+            assert attachment_cache.get('e:%d' % i) is None
+
+    @mock.patch('sentry.tasks.store.save_event_batch')
+    def test_save_event_batch_write_failed(self, mock_save_event_batch):
+        project = self.create_project()
+
+        with self.settings(SENTRY_SAVE_EVENT_BATCH_SIZE=10), \
+                self.feature('organizations:event-attachments'):
+            self.submit_events_with_attachments(project, 2)
+            with mock.patch('sentry.db.models.fields.node.nodestore.set_multi',
+                            side_effect=Exception('boom')):
+                save_event_batch(project.id)
+
+            self.assert_events_dropped(project, 2)
+
+    @mock.patch('sentry.tasks.store.save_event_batch')
+    def test_save_event_batch_commit_failed(self, mock_save_event_batch):
+        project = self.create_project()
+
+        with self.settings(SENTRY_SAVE_EVENT_BATCH_SIZE=10), \
+                self.feature('organizations:event-attachments'):
+            self.submit_events_with_attachments(project, 2)
+            with mock.patch('sentry.event_manager.EventBatch.commit',
+                            side_effect=Exception('boom')):
+                save_event_batch(project.id)
+
+            self.assert_events_dropped(project, 2)
@@ -1,7 +1,15 @@
 from __future__ import absolute_import
 
-from sentry.stacktraces import find_stacktraces_in_data, normalize_in_app
+import mock
+
+from django.test.utils import override_settings
+
+from sentry import stacktraces
+from sentry.stacktraces import (
+    StacktraceProcessor, find_stacktraces_in_data, normalize_in_app, process_stacktraces
+)
 from sentry.testutils import TestCase
+from sentry.utils.cache import cache
 
 
 class FindStacktracesTest(TestCase):
@@ -209,3 +217,67 @@ class NormalizeInApptest(TestCase):
         normalize_in_app(data)
         assert data['stacktrace']['frames'][1]['in_app'] is False
         assert data['stacktrace']['frames'][2]['in_app'] is False
+
+
+class CachingProcessor(StacktraceProcessor):
+    calls = 0
+
+    def handles_frame(self, frame, stacktrace_info):
+        return True
+
+    def preprocess_frame(self, processable_frame):
+        processable_frame.set_cache_key_from_values([processable_frame['function']])
+
+    def process_frame(self, processable_frame, processing_task):
+        if processable_frame.cache_value is None:
+            CachingProcessor.calls += 1
+            processable_frame.set_cache_value([processable_frame['function'].upper()])
+            value = processable_frame['function'].upper()
+        else:
+            value = processable_frame.cache_value[0]
+        return [dict(processable_frame.frame, function=value)], None, None
+
+
+class ProcessStacktracesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        stacktraces._local_frame_cache = None
+        CachingProcessor.calls = 0
+
+    def get_data(self):
+        return {
+            'project': self.project.id,
+            'stacktrace': {
+                'frames': [{'function': 'foo'}, {'function': 'bar'}, {'function': 'foo'}],
+            },
+        }
+
+    def process(self, data):
+        return process_stacktraces(
+            data,
+            make_processors=lambda data, infos: [CachingProcessor(data, infos, self.project)],
+        )
+
+    def test_frame_cache(self):
+        with mock.patch.object(cache, 'get_many', wraps=cache.get_many) as get_many, \
+                mock.patch.object(cache, 'set_many', wraps=cache.set_many) as set_many:
+            data = self.process(self.get_data())
+            assert [f['function'] for f in data['stacktrace']['frames']] == ['FOO', 'BAR', 'FOO']
+            assert get_many.call_count == 1
+            assert set_many.call_count == 1
+            assert CachingProcessor.calls == 3
+
+            data = self.process(self.get_data())
+            assert [f['function'] for f in data['stacktrace']['frames']] == ['FOO', 'BAR', 'FOO']
+            assert get_many.call_count == 2
+            assert set_many.call_count == 1
+            assert CachingProcessor.calls == 3
+
+    @override_settings(SENTRY_FRAME_CACHE_LOCAL_SIZE=10)
+    def test_local_frame_cache(self):
+        self.process(self.get_data())
+        with mock.patch.object(cache, 'get_many', wraps=cache.get_many) as get_many:
+            data = self.process(self.get_data())
+            assert [f['function'] for f in data['stacktrace']['frames']] == ['FOO', 'BAR', 'FOO']
+            assert get_many.call_count == 0
+        assert CachingProcessor.calls == 3
@@ -13,6 +13,7 @@ from sentry.testutils import TestCase
 from sentry.tsdb.base import TSDBModel, ONE_MINUTE, ONE_HOUR, ONE_DAY
 from sentry.tsdb.redis import RedisTSDB, CountMinScript, SuppressionWrapper
 from sentry.utils.dates import to_datetime, to_timestamp
+from sentry.utils.writebatch import write_batch
 
 
 def test_suppression_wrapper():
@@ -136,6 +137,15 @@ class RedisTSDBTest(TestCase):
             ],
         }
 
+        results = self.db.get_range_series(TSDBModel.project, [1, 2], dts[0], dts[-1])
+        assert results.to_range() == self.db.get_range(TSDBModel.project, [1, 2], dts[0], dts[-1])
+        assert results.sum() == [
+            (timestamp(dts[0]), 1),
+            (timestamp(dts[1]), 3),
+            (timestamp(dts[2]), 1),
+            (timestamp(dts[3]), 8),
+        ]
+
         results = self.db.get_sums(TSDBModel.project, [1, 2], dts[0], dts[-1])
         assert results == {
             1: 9,
@@ -207,6 +217,59 @@ class RedisTSDBTest(TestCase):
             2: 0,
         }
 
+    def test_get_totals_multi(self):
+        now = datetime.utcnow().replace(tzinfo=pytz.UTC) - timedelta(hours=4)
+        dts = [now + timedelta(hours=i) for i in range(4)]
+
+        for r in range(1, 5):
+            self.db.incr(TSDBModel.group, 1, dts[r - 1], count=r)
+            self.db.incr(TSDBModel.group, 1, dts[r - 1], count=r, environment_id=1)
+        self.db.record(TSDBModel.users_affected_by_group, 1, ('foo', 'bar'), dts[0])
+        self.db.record(TSDBModel.users_affected_by_group, 1, ('baz', ), dts[3])
+
+        requests = [
+            ('get_sums', TSDBModel.group, [1, 2], dts[0], dts[-1], None),
+            ('get_sums', TSDBModel.group, [1], dts[2], dts[-1], 1),
+            ('get_distinct_counts_totals', TSDBModel.users_affected_by_group, [1, 2],
+             dts[0], dts[-1], None),
+        ]
+        results = self.db.get_totals_multi(requests)
+        assert results == [
+            {1: 10, 2: 0},
+            {1: 7},
+            {1: 3, 2: 0},
+        ]
+        assert results == [
+            getattr(self.db, method)(model, keys, start, end, environment_id=environment_id)
+            for method, model, keys, start, end, environment_id in requests
+        ]
+
+    def test_write_batch(self):
+        now = datetime.utcnow().replace(tzinfo=pytz.UTC) - timedelta(hours=1)
+        model = TSDBModel.frequent_environments_by_group
+
+        with write_batch() as batch:
+            self.db.incr_multi(
+                [(TSDBModel.group, 1), (TSDBModel.project, 2)], now, count=2, environment_id=1)
+            self.db.record_multi(
+                ((TSDBModel.users_affected_by_group, 1, ('foo', 'bar')), ), now)
+            self.db.record_frequency_multi(((model, {1: {'env:1': 3}}), ), now)
+
+            # nothing is written until the batch is flushed, with one
+            # pipeline per host of the cluster
+            assert len(batch) > 0
+            assert 0 < len(batch.pipelines) <= len(self.db.cluster.hosts)
+            assert self.db.get_sums(TSDBModel.group, [1], now, now) == {1: 0}
+
+        assert self.db.get_sums(TSDBModel.group, [1], now, now) == {1: 2}
+        assert self.db.get_sums(
+            TSDBModel.project, [2], now, now, environment_id=1) == {2: 2}
+        assert self.db.get_distinct_counts_totals(
+            TSDBModel.users_affected_by_group, [1], now, now) == {1: 2}
+        assert self.db.get_most_frequent(model, [1], now, now) == {
+            1: [('env:1', 3.0)],
+        }
+
     def test_count_distinct(self):
         now = datetime.utcnow().replace(tzinfo=pytz.UTC) - timedelta(hours=4)
         dts = [now + timedelta(hours=i) for i in range(4)]
@@ -0,0 +1,59 @@
+from __future__ import absolute_import
+
+import operator
+import pytest
+
+from sentry.tsdb.series import SeriesSet
+
+
+def test_from_range():
+    series = SeriesSet.from_range({
+        1: [(10, 1), (20, 2), (30, 3)],
+        2: [(10, 4), (20, 5), (30, 6)],
+    })
+    assert len(series) == 2
+    assert series[2] == [(10, 4), (20, 5), (30, 6)]
+    assert series.totals() == {1: 6, 2: 15}
+    assert series.sum() == [(10, 5), (20, 7), (30, 9)]
+    assert series.sum([2]) == [(10, 4), (20, 5), (30, 6)]
+    assert series.sum([]) == [(10, 0), (20, 0), (30, 0)]
+
+    with pytest.raises(ValueError):
+        SeriesSet.from_range({
+            1: [(10, 1), (20, 2)],
+            2: [(10, 4), (30, 5)],
+        })
+
+
+def test_from_range_zerofill():
+    series = SeriesSet.from_range({
+        1: [(20, 2)],
+        2: [],
+    }, [10, 20, 30])
+    assert series.to_range() == {
+        1: [(10, 0), (20, 2), (30, 0)],
+        2: [(10, 0), (20, 0), (30, 0)],
+    }
+
+    empty = SeriesSet.from_range({}, [10, 20])
+    assert empty.sum() == [(10, 0), (20, 0)]
+    assert empty.totals() == {}
+
+
+def test_rollup():
+    series = SeriesSet.from_range({
+        1: [(1368889980, 5), (1368890040, 10), (1368893640, 7)],
+    }).rollup(3600)
+    assert series.to_range() == {
+        1: [(1368889200, 15), (1368892800, 7)],
+    }
+
+
+def test_merge():
+    a = SeriesSet.from_values({1: [1, 2], 2: [3, 4]}, [10, 20])
+    b = SeriesSet.from_values({1: [1, 1], 2: [1, 1]}, [10, 20])
+    assert a.merge(b).to_range() == {
+        1: [(10, 2), (20, 3)],
+        2: [(10, 4), (20, 5)],
+    }
+    assert a.merge(b, operator.sub)[2] == [(10, 2), (20, 3)]
@@ -0,0 +1,115 @@
+from __future__ import absolute_import
+
+import mock
+
+from sentry.models import Project, ProjectKey, ProjectOption
+from sentry.testutils import TestCase
+from sentry.utils.localcache import LocalCache, get_local_cache, invalidator
+
+
+class LocalCacheTest(TestCase):
+    def test_get_set(self):
+        cache = LocalCache('test', max_size=10, ttl=30)
+        assert cache.get('foo') is None
+        cache.set('foo', 'bar')
+        assert cache.get('foo') == 'bar'
+        cache.delete('foo')
+        assert cache.get('foo', 'baz') == 'baz'
+
+    def test_evicts_least_recently_used(self):
+        cache = LocalCache('test', max_size=2, ttl=30)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        assert cache.get('a') == 1
+        cache.set('c', 3)
+        assert len(cache) == 2
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+
+    def test_evicts_by_weight(self):
+        cache = LocalCache('test', max_size=10, ttl=30, max_weight=10)
+        cache.set('a', 1, weight=4)
+        cache.set('b', 2, weight=4)
+        assert cache.get('a') == 1
+        cache.set('c', 3, weight=4)
+        assert cache.weight == 8
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+
+        # too heavy to be cached at all
+        cache.set('d', 4, weight=11)
+        assert cache.get('d') is None
+        assert cache.weight == 8
+
+        cache.set('a', 5, weight=1)
+        assert cache.weight == 5
+        cache.clear()
+        assert cache.weight == 0
+
+    @mock.patch('sentry.utils.localcache.time')
+    def test_expires(self, time):
+        time.return_value = 1000
+        cache = LocalCache('test', max_size=2, ttl=30)
+        cache.set('a', 1)
+        time.return_value = 1029
+        assert cache.get('a') == 1
+        time.return_value = 1031
+        assert cache.get('a') is None
+
+    @mock.patch('sentry.utils.localcache.invalidator.publish')
+    def test_invalidate_publishes(self, publish):
+        cache = get_local_cache('test-invalidate')
+        cache.set('a', 1)
+        cache.invalidate('a')
+        assert cache.get('a') is None
+        publish.assert_called_once_with('test-invalidate', 'a')
+
+    def test_handle_message(self):
+        cache = get_local_cache('test-handle')
+        cache.set('a', 1)
+        invalidator.handle(b'test-handle\x00a')
+        assert cache.get('a') is None
+
+
+class ModelLocalCacheTest(TestCase):
+    def test_project_get_from_cache(self):
+        project = self.create_project()
+        assert Project.objects.get_from_cache(id=project.id) == project
+
+        with self.assertNumQueries(0), \
+                mock.patch('sentry.db.models.manager.cache.get') as cache_get:
+            result = Project.objects.get_from_cache(id=project.id)
+            assert not cache_get.called
+        assert result == project
+        assert result is not Project.objects.get_from_cache(id=project.id)
+
+        project.update(name='foo')
+        assert Project.objects.get_from_cache(id=project.id).name == 'foo'
+
+    def test_project_key_get_from_cache(self):
+        key = self.create_project_key(project=self.project)
+        assert ProjectKey.objects.get_from_cache(public_key=key.public_key) == key
+
+        with self.assertNumQueries(0), \
+                mock.patch('sentry.db.models.manager.cache.get') as cache_get:
+            result = ProjectKey.objects.get_from_cache(public_key=key.public_key)
+            assert not cache_get.called
+        assert result == key
+
+        key.delete()
+        with self.assertRaises(ProjectKey.DoesNotExist):
+            ProjectKey.objects.get_from_cache(public_key=key.public_key)
+
+    def test_project_option_get_value(self):
+        ProjectOption.objects.set_value(self.project, 'foo', 'bar')
+        ProjectOption.objects.clear_local_cache()
+
+        with mock.patch('sentry.models.projectoption.cache.get') as cache_get:
+            assert ProjectOption.objects.get_value(self.project, 'foo') == 'bar'
+            assert not cache_get.called
+
+        ProjectOption.objects.set_value(self.project, 'foo', 'baz')
+        ProjectOption.objects.clear_local_cache()
+        assert ProjectOption.objects.get_value(self.project, 'foo') == 'baz'
@@ -1,11 +1,19 @@
 from __future__ import absolute_import
 
-from datetime import datetime
+from datetime import datetime, timedelta
+import mock
 import pytz
+import threading
+
+from six.moves import BaseHTTPServer
 
 from sentry.models import GroupRelease, Release
+from sentry.net.http import connection_from_url
 from sentry.testutils import TestCase
-from sentry.utils.snuba import get_snuba_translators, zerofill
+from sentry.utils import json
+from sentry.utils.snuba import (
+    SnubaQueryParams, bulk_raw_query, get_snuba_translators, zerofill,
+)
 
 
 class SnubaUtilsTest(TestCase):
@@ -183,3 +191,70 @@ class SnubaUtilsTest(TestCase):
 
         assert results[0]['time'] == 1546387200
         assert results[7]['time'] == 1546992000
+
+
+class StubSnubaHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append(request)
+        body = json.dumps({
+            'data': [{'project_id': request['project'][0], 'count': len(self.server.requests)}],
+            'meta': [{'name': 'project_id'}, {'name': 'count'}],
+        })
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class BulkRawQueryTest(TestCase):
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), StubSnubaHandler)
+        self.server.requests = []
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        pool = connection_from_url(
+            'http://127.0.0.1:%d' % self.server.server_port, retries=0, timeout=5)
+        patcher = mock.patch('sentry.utils.snuba._snuba_pool', pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.server.shutdown)
+
+        self.end = datetime.utcnow().replace(microsecond=0, tzinfo=pytz.UTC)
+        self.start = self.end - timedelta(days=1)
+
+    def get_params(self, project, **kwargs):
+        return SnubaQueryParams(
+            self.start, self.end, ['project_id'],
+            filter_keys={'project_id': [project.id]},
+            aggregations=[['count()', '', 'count']],
+            **kwargs
+        )
+
+    def test_coalesces_identical_queries(self):
+        other = self.create_project()
+        results = bulk_raw_query([
+            self.get_params(self.project),
+            self.get_params(other),
+            self.get_params(self.project),
+        ], referrer='test')
+
+        assert len(self.server.requests) == 2
+        assert [r['data'][0]['project_id'] for r in results] == [
+            self.project.id, other.id, self.project.id,
+        ]
+        assert results[0] == results[2]
+
+    def test_result_cache(self):
+        with self.settings(SENTRY_SNUBA_CACHE_TTL=60):
+            first = bulk_raw_query([self.get_params(self.project)])
+            second = bulk_raw_query([self.get_params(self.project)])
+            bulk_raw_query([self.get_params(self.project, limit=1)])
+
+        assert first == second
+        assert len(self.server.requests) == 2
@@ -0,0 +1,82 @@
+from __future__ import absolute_import
+
+import mock
+import pytest
+
+from sentry.utils.writebatch import get_current_batch, write_batch
+
+
+def make_cluster(fail=()):
+    cluster = mock.Mock()
+    cluster.get_router.return_value.get_host_for_key.side_effect = lambda key: len(key) % 2
+    pipes = {0: mock.MagicMock(), 1: mock.MagicMock()}
+    for host, pipe in pipes.items():
+        pipe.__enter__.return_value = pipe
+        if host in fail:
+            pipe.execute.side_effect = Exception('Boom!')
+    cluster.get_local_client.side_effect = \
+        lambda host: mock.Mock(pipeline=mock.Mock(return_value=pipes[host]))
+    return cluster, pipes
+
+
+def test_flush_one_pipeline_per_host():
+    cluster, pipes = make_cluster()
+
+    with write_batch() as batch:
+        client = batch.get_client(cluster)
+        client.hincrby('a', 'f', 1)
+        client.hincrby('bb', 'f', 1)
+        client.expire('c', 60)
+        # pinned to the host of 'a' even though 'dd' lives elsewhere
+        client.target_key('a').zadd('dd', 1, 'a')
+
+        with write_batch() as nested:
+            assert nested is batch
+            client.hincrby('e', 'f', 2)
+
+        assert not pipes[0].execute.called
+        assert not pipes[1].execute.called
+        assert len(batch) == 5
+
+    assert get_current_batch() is None
+    assert pipes[0].mock_calls[1:] == [
+        mock.call.hincrby('bb', 'f', 1),
+        mock.call.execute(),
+        mock.call.__exit__(None, None, None),
+    ]
+    assert pipes[1].mock_calls[1:] == [
+        mock.call.hincrby('a', 'f', 1),
+        mock.call.expire('c', 60),
+        mock.call.zadd('dd', 1, 'a'),
+        mock.call.hincrby('e', 'f', 2),
+        mock.call.execute(),
+        mock.call.__exit__(None, None, None),
+    ]
+
+
+def test_flush_errors():
+    cluster, pipes = make_cluster(fail=(1, ))
+    with write_batch() as batch:
+        client = batch.get_client(cluster, durable=False)
+        client.set('a', 1)
+        client.set('bb', 1)
+    assert pipes[0].execute.called
+
+    cluster, pipes = make_cluster(fail=(1, ))
+    with pytest.raises(Exception):
+        with write_batch() as batch:
+            client = batch.get_client(cluster)
+            client.set('a', 1)
+            client.set('bb', 1)
+    # the other hosts are still written to
+    assert pipes[0].execute.called
+
+
+def test_flush_on_error():
+    cluster, pipes = make_cluster()
+    with pytest.raises(ValueError):
+        with write_batch() as batch:
+            batch.get_client(cluster).set('bb', 1)
+            raise ValueError()
+    assert pipes[0].execute.called
+    assert get_current_batch() is None